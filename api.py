@@ -1,12 +1,69 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+import asyncio
+import hashlib
+import json
 import sqlite3
-import pandas as pd
-from modules.database import get_connection
+import threading
+from modules.database import (
+    get_connection, DB_NAME, consultar_historico_ia, consultar_curva_equity, consultar_estatisticas, CURVA_TOTAL,
+    registrar_comando, consultar_comando
+)
+import time
+from modules.ao_vivo import TransmissorEstado
 
 # Inicializa o APP
 app = FastAPI()
 
+# --- CACHE DE LEITURA ---
+# Uma conexão de leitura persistente: o PRAGMA data_version dela muda sempre que
+# outra conexão (o bot ou as rotas de escrita) confirma uma transação. Enquanto
+# a versão não muda, as rotas do dashboard respondem do cache, com ETag/304.
+_CONN_LEITURA = None
+_LOCK_LEITURA = threading.Lock()
+_CACHE = {}
+MAX_ITENS_CACHE = 512
+
+def _leitura():
+    global _CONN_LEITURA
+    if _CONN_LEITURA is None:
+        _CONN_LEITURA = sqlite3.connect(DB_NAME, check_same_thread=False)
+        _CONN_LEITURA.execute("PRAGMA journal_mode=WAL;")
+    return _CONN_LEITURA
+
+def _linhas(sql, params=()):
+    """Executa a consulta e devolve lista de dicts (sem passar pelo pandas)"""
+    cursor = _leitura().execute(sql, params)
+    colunas = [c[0] for c in cursor.description]
+    return [dict(zip(colunas, row)) for row in cursor.fetchall()]
+
+def invalidar_cache():
+    """Chamado pelas rotas de escrita da própria API"""
+    with _LOCK_LEITURA:
+        _CACHE.clear()
+
+def resposta_cacheada(request, chave, gerar):
+    """
+    Gera (ou reaproveita) o corpo JSON da rota e responde 304 quando o ETag
+    enviado pelo cliente ainda vale. 'gerar' roda com o lock de leitura.
+    """
+    with _LOCK_LEITURA:
+        versao = _leitura().execute("PRAGMA data_version").fetchone()[0]
+        item = _CACHE.get(chave)
+        if item is None or item[0] != versao:
+            corpo = json.dumps(gerar(), default=str).encode()
+            etag = f'W/"{hashlib.md5(corpo).hexdigest()}"'
+            if len(_CACHE) >= MAX_ITENS_CACHE:
+                _CACHE.clear()
+            item = _CACHE[chave] = (versao, corpo, etag)
+
+    _, corpo, etag = item
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=corpo, media_type="application/json", headers=headers)
+
 # Configuração de CORS (Permite o Dashboard conectar)
 app.add_middleware(
     CORSMiddleware,
@@ -21,76 +78,63 @@ def read_root():
     return {"status": "online", "version": "6.0"}
 
 @app.get("/elite")
-def get_elite():
+def get_elite(request: Request):
     """Retorna a lista de moedas que estão sendo monitoradas (Elite)"""
     try:
-        conn = get_connection()
         # Busca moedas que têm status gravado na tabela da IA
-        df = pd.read_sql_query("SELECT DISTINCT symbol FROM status_ia", conn)
-        conn.close()
-        return df['symbol'].tolist()
+        return resposta_cacheada(request, ("elite",), lambda: [
+            row["symbol"] for row in _linhas("SELECT DISTINCT symbol FROM status_ia")
+        ])
     except Exception as e:
         print(f"Erro Elite: {e}")
         return []
 
 @app.get("/scan-results")
-def get_scan_results():
+def get_scan_results(request: Request):
     """Retorna o placar da IA para o Dashboard"""
     try:
-        conn = get_connection()
-        # Pega o registro mais recente de cada moeda
+        # Uma linha por moeda (symbol é a chave de status_ia), mais recentes primeiro
         query = """
         SELECT symbol, potencial as lucro, decisao 
         FROM status_ia 
-        GROUP BY symbol 
         ORDER BY timestamp DESC
         """
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df.to_dict(orient="records")
+        return resposta_cacheada(request, ("scan-results",), lambda: _linhas(query))
     except:
         return []
 
 @app.get("/stats")
-def get_stats(symbol: str):
+def get_stats(request: Request, symbol: str):
     """Retorna estatísticas de performance da moeda"""
-    try:
-        conn = get_connection()
-        trades = pd.read_sql_query("SELECT * FROM trades WHERE symbol=?", conn, params=(symbol,))
-        conn.close()
-        
-        lucro_total = trades['lucro'].sum() if not trades.empty else 0.0
-        
-        return {
-            "lucro_total": lucro_total,
-            "profit_factor": 1.5, # Placeholder para cálculo futuro
-            "sharpe_ratio": 1.2,
-            "max_drawdown": 5.0,
-            "ultimo_trade": trades.iloc[-1].to_dict() if not trades.empty else {"decisao": "NEUTRO"}
+    def gerar():
+        stats = consultar_estatisticas(symbol, conn=_leitura()) or {
+            "total_trades": 0, "wins": 0, "losses": 0, "win_rate": 0.0,
+            "lucro_total": 0.0, "lucro_medio": 0.0, "desvio_padrao": 0.0,
+            "profit_factor": None, "sharpe_ratio": 0.0, "max_drawdown": 0.0, "drawdown_atual": 0.0
         }
+        ultimo = _linhas("SELECT * FROM trades WHERE symbol=? ORDER BY id DESC LIMIT 1", (symbol,))
+        stats["ultimo_trade"] = ultimo[0] if ultimo else {"decisao": "NEUTRO"}
+        return stats
+    try:
+        return resposta_cacheada(request, ("stats", symbol), gerar)
     except:
         return {"lucro_total": 0.0}
 
 @app.get("/history")
-def get_history(symbol: str):
+def get_history(request: Request, symbol: str):
     """Retorna histórico de trades para o gráfico"""
     try:
-        conn = get_connection()
-        df = pd.read_sql_query("SELECT * FROM trades WHERE symbol=? ORDER BY data_hora DESC LIMIT 50", conn, params=(symbol,))
-        conn.close()
-        return df.to_dict(orient="records")
+        return resposta_cacheada(request, ("history", symbol), lambda: _linhas(
+            "SELECT * FROM trades WHERE symbol=? ORDER BY data_hora DESC LIMIT 50", (symbol,)
+        ))
     except:
         return []
 
 @app.get("/status-bot")
-def get_bot_status(symbol: str):
+def get_bot_status(request: Request, symbol: str):
     """Retorna se o bot está comprado ou vendido"""
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM memoria_bot WHERE symbol=?", (symbol,))
-        row = cursor.fetchone()
-        conn.close()
+    def gerar():
+        row = _leitura().execute("SELECT * FROM memoria_bot WHERE symbol=?", (symbol,)).fetchone()
         
         if row:
             # Índices baseados na criação da tabela em database.py
@@ -101,9 +145,55 @@ def get_bot_status(symbol: str):
                 "qtd": row[4]
             }
         return {"posicionado": False, "saldo_disponivel": 0.0}
+    try:
+        return resposta_cacheada(request, ("status-bot", symbol), gerar)
     except:
         return {"posicionado": False}
 
+@app.get("/score-history")
+def get_score_history(request: Request, symbol: str, inicio: int = None, fim: int = None):
+    """Timeline de score/RSI da IA (epoch em segundos; padrão: últimas 24h)"""
+    def gerar():
+        # "Agora" é resolvido só ao gerar: na chave fica None, senão cada
+        # segundo viraria uma entrada (e um ETag) nova no cache
+        ate = fim if fim is not None else int(time.time())
+        desde = inicio if inicio is not None else ate - 24 * 3600
+        return consultar_historico_ia(symbol, desde, ate, conn=_leitura())
+    try:
+        return resposta_cacheada(request, ("score-history", symbol, inicio, fim), gerar)
+    except Exception as e:
+        print(f"Erro Score History: {e}")
+        return []
+
+@app.get("/equity")
+def get_equity(request: Request, symbol: str = CURVA_TOTAL, inicio: int = None, fim: int = None, pontos: int = 500):
+    """Curva de capital (lucro acumulado e pico) já materializada, reduzida a no máximo 'pontos' pontos"""
+    pontos = max(2, min(pontos, 5000))
+    try:
+        return resposta_cacheada(request, ("equity", symbol, inicio, fim, pontos), lambda: consultar_curva_equity(
+            symbol, inicio, fim, pontos, conn=_leitura()
+        ))
+    except Exception as e:
+        print(f"Erro Equity: {e}")
+        return []
+
+# --- STREAM AO VIVO (SSE) ---
+TRANSMISSOR = TransmissorEstado()
+
+@app.get("/stream")
+async def stream_estado():
+    """
+    Server-Sent Events com o estado do bot: um snapshot ao conectar e depois só
+    diffs de posições, status da IA, trades novos e preços ao vivo.
+    Todos os clientes compartilham um único leitor do banco.
+    """
+    fila = TRANSMISSOR.conectar()
+    return StreamingResponse(
+        TRANSMISSOR.eventos(fila),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/bot-control")
 def bot_control(status: str):
     """Pausa ou Inicia o Bot (status='true' ou 'false')"""
@@ -111,9 +201,10 @@ def bot_control(status: str):
         conn = get_connection()
         cursor = conn.cursor()
         cursor.execute("INSERT OR REPLACE INTO config_global (chave, valor) VALUES ('bot_rodando', ?)", (status,))
-        conn.commit()
+        comando_id = registrar_comando(conn, "bot_rodando", status)
         conn.close()
-        return {"status": "ok"}
+        invalidar_cache()
+        return {"status": "ok", "comando_id": comando_id}
     except:
         return {"status": "error"}
 
@@ -124,9 +215,10 @@ def save_config(chave: str, valor: str):
         conn = get_connection()
         cursor = conn.cursor()
         cursor.execute("INSERT OR REPLACE INTO config_global (chave, valor) VALUES (?, ?)", (chave, valor))
-        conn.commit()
+        comando_id = registrar_comando(conn, "recarregar_configs")
         conn.close()
-        return {"status": "ok"}
+        invalidar_cache()
+        return {"status": "ok", "comando_id": comando_id}
     except:
         return {"status": "error"}
 
@@ -135,14 +227,35 @@ def panic_sell():
     """Aciona o modo de pânico"""
     try:
         conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("INSERT OR REPLACE INTO config_global (chave, valor) VALUES ('comando_venda_total', 'true')")
-        conn.commit()
+        comando_id = registrar_comando(conn, "venda_total")
         conn.close()
-        return {"status": "ok"}
+        invalidar_cache()
+        return {"status": "ok", "comando_id": comando_id}
     except:
         return {"status": "error"}
 
+@app.get("/comandos/{comando_id}")
+async def get_comando(comando_id: int, espera: float = 0.0):
+    """
+    Situação de um comando (pendente, executado, erro, expirado) com o ack do bot.
+    Com espera > 0 segura a resposta até o bot confirmar (long-poll, máx. 10s).
+    """
+    def ler():
+        conn = get_connection()
+        try:
+            return consultar_comando(conn, comando_id)
+        finally:
+            conn.close()
+
+    limite = time.monotonic() + min(max(espera, 0.0), 10.0)
+    while True:
+        comando = await asyncio.to_thread(ler)
+        if comando is None:
+            raise HTTPException(status_code=404, detail="Comando não encontrado")
+        if comando["status"] != "pendente" or time.monotonic() >= limite:
+            return comando
+        await asyncio.sleep(0.02)
+
 @app.get("/ai-simulation")
 def ai_simulation():
     """Simula a análise da IA para o botão de teste"""
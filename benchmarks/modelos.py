@@ -0,0 +1,117 @@
+"""
+Benchmark dos backends de modelo do brain (brain.MODELOS), sem rede.
+
+Repete o que o bot faz a cada candle de 15m fechado: treina (ou atualiza,
+nos backends incrementais) com todo o histórico anterior e prevê o candle
+seguinte, andando pela janela de teste (walk-forward, um modelo por candle).
+Todos os backends usam as mesmas features e os mesmos candles.
+
+Mede por backend:
+- fit e predict (ms por candle, média e p95) em tempo de relógio;
+- CPU (process_time, soma de todas as threads) por candle: é o que cresce com
+  a lista de pares;
+- acurácia fora da amostra (prob > 0.5 vs. o próximo fechamento) e o win rate
+  dos sinais de COMPRA (score >= min_score), como na calibração.
+
+Uso: python -m benchmarks.modelos [--candles 800] [--teste 300] [--threads 1]
+     python -m benchmarks.modelos --gravacao ./gravacoes --ativo BTC/BRL
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import modules.brain as brain
+
+def gerar_candles(n, semente=7):
+    """Passeio aleatório com volatilidade e momentum variando por regime (15m)"""
+    rng = np.random.default_rng(semente)
+    regime = np.repeat(rng.normal(0, 0.0015, n // 50 + 1), 50)[:n]
+    vol = np.repeat(rng.uniform(0.002, 0.008, n // 80 + 1), 80)[:n]
+    retornos = np.zeros(n)
+    for i in range(1, n):
+        retornos[i] = 0.15 * retornos[i - 1] + regime[i] + rng.normal(0, vol[i])
+    close = 100 * np.exp(np.cumsum(retornos))
+    abertura = np.r_[close[0], close[:-1]]
+    high = np.maximum(abertura, close) * (1 + np.abs(rng.normal(0, vol / 2)))
+    low = np.minimum(abertura, close) * (1 - np.abs(rng.normal(0, vol / 2)))
+    return [[i * 900_000, abertura[i], high[i], low[i], close[i], 1.0] for i in range(n)]
+
+def medir_backend(nome, X, y, rsi, linhas_teste, min_score):
+    fits, predicts, probs = [], [], []
+    model = None
+    treinado_ate = 0
+    cpu_inicio = time.process_time()
+    for linha in linhas_teste:
+        inicio = time.perf_counter()
+        model = brain.treinar_modelo(nome, X[:linha], y[:linha], model, X[treinado_ate:linha], y[treinado_ate:linha])
+        treinado_ate = linha
+        meio = time.perf_counter()
+        prob = model.predict_proba(X[linha:linha + 1])[0]
+        fim = time.perf_counter()
+        fits.append(meio - inicio)
+        predicts.append(fim - meio)
+        probs.append(prob[list(model.classes_).index(1)] if 1 in model.classes_ else 0.0)
+    cpu = time.process_time() - cpu_inicio
+
+    probs = np.array(probs)
+    alvo = y[linhas_teste]
+    score = np.round(probs * 10, 1)
+    score = np.where((rsi[linhas_teste] > 75) & (score > 6), score - 2, score)
+    compra = score >= min_score
+    n = len(linhas_teste)
+    return {
+        "backend": nome,
+        "fit_ms": float(np.mean(fits) * 1000),
+        "fit_p95_ms": float(np.percentile(fits, 95) * 1000),
+        "predict_ms": float(np.mean(predicts) * 1000),
+        "cpu_ms_por_candle": cpu / n * 1000,
+        "acuracia": float(((probs > 0.5) == (alvo == 1)).mean()),
+        "sinais": int(compra.sum()),
+        "win_rate_sinais": float(alvo[compra].mean()) if compra.any() else None,
+    }
+
+def rodar(candles, teste, backends, min_score):
+    df = brain.preparar_dados(candles)
+    X = df[brain.FEATURES].to_numpy()
+    rsi = df['RSI'].to_numpy()
+    y = (df['close'].shift(-1) > df['close']).astype(int).to_numpy()
+    # Últimas 'teste' linhas com futuro conhecido, sempre com >= 50 de treino
+    linhas_teste = np.arange(max(50, len(df) - 1 - teste), len(df) - 1)
+
+    resultados = [medir_backend(nome, X, y, rsi, linhas_teste, min_score) for nome in backends]
+    base = next((r for r in resultados if r["backend"] == "floresta"), resultados[0])
+
+    print(f"{len(linhas_teste)} candles de teste | treino de {linhas_teste[0]} a {linhas_teste[-1]} linhas | threads: {brain.N_JOBS_MODELO}")
+    print(f"{'backend':>14} | {'fit ms':>8} | {'fit p95':>8} | {'pred ms':>7} | {'CPU ms':>8} | {'CPU x':>6} | {'acurácia':>8} | {'sinais':>6} | {'win rate':>8}")
+    for r in resultados:
+        r["reducao_cpu"] = base["cpu_ms_por_candle"] / r["cpu_ms_por_candle"] if r["cpu_ms_por_candle"] else None
+        win = f"{r['win_rate_sinais'] * 100:.1f}%" if r["win_rate_sinais"] is not None else "-"
+        print(f"{r['backend']:>14} | {r['fit_ms']:8.2f} | {r['fit_p95_ms']:8.2f} | {r['predict_ms']:7.2f} | "
+              f"{r['cpu_ms_por_candle']:8.2f} | {r['reducao_cpu']:6.1f} | {r['acuracia'] * 100:7.1f}% | {r['sinais']:6d} | {win:>8}")
+    return resultados
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--candles", type=int, default=800, help="candles de 15m sintéticos")
+    parser.add_argument("--teste", type=int, default=300, help="candles da janela walk-forward")
+    parser.add_argument("--gravacao", help="diretório do gravador de ticks (usa os klines de 15m gravados)")
+    parser.add_argument("--ativo", help="com --gravacao: símbolo (ex: BTC/BRL)")
+    parser.add_argument("--backends", default=",".join(brain.MODELOS), help="lista separada por vírgula")
+    parser.add_argument("--threads", type=int, default=1, help="ML_N_JOBS dos backends (-1 = todos os núcleos)")
+    parser.add_argument("--min-score", type=float, default=6)
+    parser.add_argument("--json", help="grava o resultado neste arquivo")
+    args = parser.parse_args()
+
+    brain.N_JOBS_MODELO = args.threads
+    if args.gravacao:
+        from modules.gravador import candles_gravados
+        candles = candles_gravados(args.gravacao, args.ativo, "15m")
+    else:
+        candles = gerar_candles(args.candles)
+
+    resultados = rodar(candles, args.teste, args.backends.split(","), args.min_score)
+    if args.json:
+        with open(args.json, "w") as arquivo:
+            json.dump(resultados, arquivo, indent=2)
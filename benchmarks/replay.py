@@ -0,0 +1,410 @@
+"""
+Benchmark de replay, 100% offline: mede a latência tick -> processamento,
+candle -> decisão da IA, decisões/s, escritas no banco/s e CPU por ativo.
+
+Sobe um servidor websocket local (processo separado) que reproduz uma gravação
+de mensagens miniTicker/kline no formato da Binance, na velocidade pedida, e
+roda o vigilante_multi_preco e o estrategista_cerebro do main.py contra ele.
+A exchange REST é trocada por uma ExchangeFalsa (fetch_ohlcv local) e o banco
+vai para um diretório temporário, então nada toca a Binance nem o trades.db.
+
+Sem --gravacao, gera uma gravação sintética determinística (random walk).
+Uma gravação é um arquivo JSON lines com uma mensagem crua por linha, em ordem
+de "E" (event time em ms), do jeito que chega no websocket, ou um diretório
+do gravador de ticks do bot (GRAVAR_TICKS), convertido na hora.
+
+Uso: python -m benchmarks.replay [--ativos 5] [--minutos 30] [--velocidade 120]
+     python -m benchmarks.replay --gravacao ticks.jsonl --velocidade 1
+     python -m benchmarks.replay --gravacao gravacoes/ --dias 2026-10-01:2026-10-07
+     python -m benchmarks.replay --json resultado.json --max-p99-ms 50   (CI)
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import websockets
+
+import main
+import modules.database as database
+import modules.gravador as gravador
+import modules.stream as stream
+from modules.candles import CandleStore, duracao_ms
+from modules.executor import PoolAnalise
+from modules.metricas import METRICAS, monitor_loop
+
+TIMEFRAMES_HISTORICO = ("1m", "15m")
+# Com REAMOSTRAR_1M o buffer de 1m precisa de HISTORICO_1M candles
+TAMANHO_HISTORICO = max(1000, main.HISTORICO_1M + 60) if main.REAMOSTRAR_1M else 1000
+
+# --- Gravação ---
+
+def gerar_gravacao(caminho, ativos=5, minutos=30, ticks_por_minuto=10, semente=42):
+    """Grava um replay sintético: miniTickers + klines de 1m e 15m (fechados e em formação)"""
+    rng = random.Random(semente)
+    passo_15m = duracao_ms("15m")
+    inicio = (int(time.time() * 1000) // passo_15m) * passo_15m - minutos * 60_000
+    symbols = [f"S{i:03d}/BRL" for i in range(ativos)]
+    precos = {sym: rng.uniform(10, 500) for sym in symbols}
+    abertos = {}  # (sym, tf) -> [t, o, h, l, c, v]
+
+    def kline(sym, tf, candle, fechado, evento):
+        t, o, h, l, c, v = candle
+        raw = stream.simbolo_raw(sym)
+        return {"e": "kline", "E": evento, "s": raw, "k": {
+            "t": t, "T": t + duracao_ms(tf) - 1, "s": raw, "i": tf,
+            "o": f"{o:.8f}", "h": f"{h:.8f}", "l": f"{l:.8f}", "c": f"{c:.8f}", "v": f"{v:.4f}", "x": fechado
+        }}
+
+    with open(caminho, "w") as arquivo:
+        for minuto in range(minutos):
+            base = inicio + minuto * 60_000
+            for passo in range(ticks_por_minuto):
+                evento = base + (passo + 1) * 60_000 // (ticks_por_minuto + 1)
+                for sym in symbols:
+                    preco = precos[sym] = precos[sym] * (1 + rng.gauss(0, 0.0015))
+                    volume = rng.uniform(0.1, 5)
+                    for tf in TIMEFRAMES_HISTORICO:
+                        t = evento // duracao_ms(tf) * duracao_ms(tf)
+                        candle = abertos.get((sym, tf))
+                        if candle is None or candle[0] != t:
+                            candle = abertos[(sym, tf)] = [t, preco, preco, preco, preco, 0.0]
+                        candle[2], candle[3], candle[4] = max(candle[2], preco), min(candle[3], preco), preco
+                        candle[5] += volume
+                    arquivo.write(json.dumps({"e": "24hrMiniTicker", "E": evento, "s": stream.simbolo_raw(sym), "c": f"{preco:.8f}"}) + "\n")
+
+            # Virada do minuto: fecha o 1m e manda o 15m (fechado a cada 15 minutos)
+            fim = base + 60_000
+            for sym in symbols:
+                arquivo.write(json.dumps(kline(sym, "1m", abertos[(sym, "1m")], True, fim - 1)) + "\n")
+                fecha_15m = fim % duracao_ms("15m") == 0
+                arquivo.write(json.dumps(kline(sym, "15m", abertos[(sym, "15m")], fecha_15m, fim - 1)) + "\n")
+    return caminho
+
+def exportar_gravador(diretorio, caminho, inicio=None, fim=None):
+    """Converte os arquivos binários do gravador de ticks em JSON lines de replay"""
+    simbolos = [stream.simbolo_raw(sym) for sym in gravador.carregar_simbolos(diretorio)]
+    ticks = gravador.ler_periodo(diretorio, "ticks", inicio, fim)
+    klines = gravador.ler_periodo(diretorio, "klines", inicio, fim)
+    ticks = np.concatenate(ticks) if ticks else np.empty(0, dtype=gravador.DTYPE_TICK)
+    klines = np.concatenate(klines) if klines else np.empty(0, dtype=gravador.DTYPE_KLINE)
+
+    def tick(t):
+        return {"e": "24hrMiniTicker", "E": int(t['ts']), "s": simbolos[t['symbol']], "c": repr(float(t['preco']))}
+
+    def kline(k):
+        minutos = int(k['minutos'])
+        intervalo = f"{minutos // 60}h" if minutos % 60 == 0 else f"{minutos}m"
+        return {"e": "kline", "E": int(k['ts']), "s": simbolos[k['symbol']], "k": {
+            "t": int(k['abertura']), "i": intervalo, "x": bool(k['fechado']),
+            "o": repr(float(k['open'])), "h": repr(float(k['high'])), "l": repr(float(k['low'])),
+            "c": repr(float(k['close'])), "v": repr(float(k['volume']))
+        }}
+
+    ordem = np.argsort(np.concatenate([ticks['ts'], klines['ts']]), kind="stable")
+    with open(caminho, "w") as arquivo:
+        for i in ordem:
+            msg = tick(ticks[i]) if i < len(ticks) else kline(klines[i - len(ticks)])
+            arquivo.write(json.dumps(msg) + "\n")
+    return caminho
+
+def ler_gravacao(caminho, cotacao="BRL"):
+    """Retorna (symbols, primeiros) onde primeiros[sym] = (primeiro_evento_ms, primeiro_preco)"""
+    primeiros = {}
+    with open(caminho) as arquivo:
+        for linha in arquivo:
+            msg = json.loads(linha)
+            raw = msg["s"]
+            if raw in primeiros:
+                continue
+            preco = float(msg["c"]) if "c" in msg else float(msg["k"]["o"])
+            primeiros[raw] = (msg["E"], preco)
+    symbols = {f"{raw[:-len(cotacao)]}/{cotacao}": dados for raw, dados in primeiros.items()}
+    return sorted(symbols), symbols
+
+class ExchangeFalsa:
+    """
+    Substituta local do ccxt.binance para o CandleStore: fetch_ohlcv devolve um
+    histórico sintético que termina exatamente antes do primeiro kline da
+    gravação, então o websocket continua a série sem buraco.
+    """
+
+    def __init__(self, primeiros, semente=7):
+        self.primeiros = primeiros
+        self.semente = semente
+        self.historicos = {}
+        self.chamadas = 0
+
+    def _historico(self, symbol, timeframe):
+        chave = (symbol, timeframe)
+        if chave not in self.historicos:
+            evento, preco = self.primeiros[symbol]
+            passo = duracao_ms(timeframe)
+            ultimo = evento // passo * passo - passo
+            rng = random.Random(f"{self.semente}:{symbol}:{timeframe}")
+            candles = []
+            # Random walk de trás para frente terminando no primeiro preço da gravação
+            for i in range(TAMANHO_HISTORICO):
+                abertura = preco * (1 + rng.gauss(0, 0.003))
+                alta, baixa = max(abertura, preco) * 1.001, min(abertura, preco) * 0.999
+                candles.append([ultimo - i * passo, abertura, alta, baixa, preco, rng.uniform(1, 50)])
+                preco = abertura
+            self.historicos[chave] = candles[::-1]
+        return self.historicos[chave]
+
+    async def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None):
+        self.chamadas += 1
+        candles = self._historico(symbol, timeframe)
+        if since is not None:
+            # Como na Binance: a página começa em 'since'
+            return [list(c) for c in candles if c[0] >= since][:limit or 500]
+        return [list(c) for c in candles[-(limit or 500):]]
+
+    async def close(self):
+        pass
+
+# --- Servidor websocket local (roda em outro processo) ---
+
+def nome_stream(msg):
+    canal = f"kline_{msg['k']['i']}" if msg.get("e") == "kline" else "miniTicker"
+    return f"{msg['s'].lower()}@{canal}"
+
+async def _servir(caminho, velocidade, streams_esperados, fila_porta, terminou):
+    assinaturas = {}  # stream -> conexões assinantes
+    prontos = asyncio.Event()
+
+    async def atender(ws):
+        try:
+            async for texto in ws:
+                pedido = json.loads(texto)
+                if pedido.get("method") == "SUBSCRIBE":
+                    for nome in pedido["params"]:
+                        assinaturas.setdefault(nome, set()).add(ws)
+                    await ws.send(json.dumps({"result": None, "id": pedido.get("id")}))
+                    if len(assinaturas) >= streams_esperados:
+                        prontos.set()
+        finally:
+            for conexoes in assinaturas.values():
+                conexoes.discard(ws)
+
+    with open(caminho) as arquivo:
+        mensagens = [json.loads(linha) for linha in arquivo]
+
+    async with websockets.serve(atender, "127.0.0.1", 0) as servidor:
+        fila_porta.put(servidor.sockets[0].getsockname()[1])
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(prontos.wait(), timeout=30)
+
+        inicio_real = time.perf_counter()
+        inicio_sim = mensagens[0]["E"] if mensagens else 0
+        for msg in mensagens:
+            if velocidade > 0:
+                atraso = (msg["E"] - inicio_sim) / 1000 / velocidade - (time.perf_counter() - inicio_real)
+                if atraso > 0:
+                    await asyncio.sleep(atraso)
+            conexoes = assinaturas.get(nome_stream(msg))
+            if not conexoes:
+                continue
+            # Marca de envio (relógio de parede, mesmo host) para medir a latência no bot
+            msg["_envio"] = time.time()
+            texto = json.dumps(msg)
+            for ws in list(conexoes):
+                with contextlib.suppress(websockets.ConnectionClosed):
+                    await ws.send(texto)
+        terminou.set()
+        await asyncio.Future()
+
+def servir(caminho, velocidade, streams_esperados, fila_porta, terminou):
+    asyncio.run(_servir(caminho, velocidade, streams_esperados, fila_porta, terminou))
+
+# --- Bot instrumentado ---
+
+def percentis(valores):
+    if not valores:
+        return {"p50": None, "p90": None, "p99": None, "max": None}
+    ms = np.array(valores) * 1000
+    return {"p50": float(np.percentile(ms, 50)), "p90": float(np.percentile(ms, 90)),
+            "p99": float(np.percentile(ms, 99)), "max": float(ms.max())}
+
+async def rodar_bot(symbols, primeiros, url, terminou, workers, espera_final, diretorio):
+    database.DB_NAME = os.path.join(diretorio, "trades.db")
+    # Features também no diretório temporário (os workers herdam a variável)
+    os.environ["FEATURES_DIR"] = os.path.join(diretorio, "features")
+    database.criar_tabelas()
+    database.criar_tabela_configs()
+
+    main.ESTADO.update({
+        "ativos_ativos": symbols,
+        "ativos_data": {sym: {"saldo": 100.0, "posicao": False, "preco_compra": 0, "qtd": 0, "preco_maximo": 0} for sym in symbols},
+        "precos_live": {sym: 0.0 for sym in symbols},
+        "configs_ia": {sym: None for sym in symbols},
+        "bot_rodando": True,
+        "perfil_ativo": "moderado",
+    })
+    stream.WS_URL = url
+    main.EXCHANGE_PRONTA.set()  # a ExchangeFalsa já entra pronta na loja
+
+    medidas = {"ticks": [], "decisoes": [], "n_decisoes": 0, "em_analise": 0, "inicio": None}
+    fechamentos = {}
+
+    processar_tick, processar_kline = main.processar_tick, main.processar_kline
+
+    async def tick_medido(sym, msg):
+        await processar_tick(sym, msg)
+        if "_envio" in msg:
+            medidas["ticks"].append(time.time() - msg["_envio"])
+            if medidas["inicio"] is None:
+                medidas["inicio"] = msg["_envio"]
+
+    def kline_medido(sym, msg, loja):
+        processar_kline(sym, msg, loja)
+        if msg["k"]["x"] and "_envio" in msg and not main.ESTADO["ativos_data"][sym]["posicao"]:
+            # Vários fechamentos antes da análise contam a partir do primeiro
+            # (posicionado, o estrategista não analisa o ativo)
+            fechamentos.setdefault(sym, msg["_envio"])
+
+    main.processar_tick, main.processar_kline = tick_medido, kline_medido
+
+    exchange = ExchangeFalsa(primeiros)
+    loja = CandleStore(exchange, caminho=os.path.join(diretorio, "candles.db"),
+                       tamanhos={'1m': main.HISTORICO_1M} if main.REAMOSTRAR_1M else None)
+    pool = PoolAnalise(workers=workers, timeout=main.ML_TIMEOUT)
+    analisar = pool.analisar
+
+    async def analisar_medido(symbol, candles_1m, candles_15m, config=None, superiores=None):
+        medidas["em_analise"] += 1
+        try:
+            analise = await analisar(symbol, candles_1m, candles_15m, config=config, superiores=superiores)
+        finally:
+            medidas["em_analise"] -= 1
+        if analise is not None:
+            medidas["n_decisoes"] += 1
+            envio = fechamentos.pop(symbol, None)
+            if envio is not None:
+                medidas["decisoes"].append(time.time() - envio)
+        return analise
+
+    pool.analisar = analisar_medido
+
+    lag_antes = METRICAS["loop_lag_total_ms"]
+    escritas_antes = database.conexao().total_changes
+    cpu_antes = time.process_time()
+    tarefas = [
+        asyncio.create_task(main.vigilante_multi_preco(loja)),
+        asyncio.create_task(main.estrategista_cerebro(loja, pool)),
+        asyncio.create_task(database.escritor_adiado()),
+        asyncio.create_task(loja.escritor_adiado()),
+        asyncio.create_task(monitor_loop()),
+    ]
+    try:
+        while not terminou.is_set():
+            await asyncio.sleep(0.05)
+        # Deixa o estrategista terminar os candles que já fecharam
+        limite = time.monotonic() + espera_final
+        while (not main.EVENTOS_CANDLE.empty() or medidas["em_analise"]) and time.monotonic() < limite:
+            await asyncio.sleep(0.05)
+        fim = time.time()
+    finally:
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+        database.descarregar_pendentes()
+        for worker in pool.workers:
+            worker.shutdown(wait=True, cancel_futures=True)
+        loja.fechar()
+
+    duracao = max(fim - (medidas["inicio"] or fim), 1e-9)
+    return {
+        "ativos": len(symbols),
+        "duracao_s": duracao,
+        "ticks": len(medidas["ticks"]),
+        "ticks_por_s": len(medidas["ticks"]) / duracao,
+        "latencia_tick_ms": percentis(medidas["ticks"]),
+        "latencia_decisao_ms": percentis(medidas["decisoes"]),
+        "decisoes": medidas["n_decisoes"],
+        "decisoes_por_s": medidas["n_decisoes"] / duracao,
+        "escritas_banco_por_s": (database.conexao().total_changes - escritas_antes) / duracao,
+        "chamadas_rest": exchange.chamadas,
+        "cpu_bot_s": time.process_time() - cpu_antes,
+        "loop_lag_total_ms": METRICAS["loop_lag_total_ms"] - lag_antes,
+    }
+
+def rodar(args):
+    with tempfile.TemporaryDirectory() as diretorio:
+        if args.gravacao and os.path.isdir(args.gravacao):
+            inicio, _, fim = (args.dias or "").partition(":")
+            caminho = exportar_gravador(args.gravacao, os.path.join(diretorio, "replay.jsonl"), inicio or None, fim or inicio or None)
+        else:
+            caminho = args.gravacao or gerar_gravacao(
+                os.path.join(diretorio, "replay.jsonl"), args.ativos, args.minutos, args.ticks_por_minuto
+            )
+        symbols, primeiros = ler_gravacao(caminho, args.cotacao)
+        canais = ("miniTicker", *(f"kline_{tf}" for tf in main.TIMEFRAMES_KLINE))
+
+        contexto = multiprocessing.get_context("spawn")
+        fila_porta, terminou = contexto.Queue(), contexto.Event()
+        servidor = contexto.Process(
+            target=servir, args=(caminho, args.velocidade, len(symbols) * len(canais), fila_porta, terminou), daemon=True
+        )
+        servidor.start()
+        try:
+            url = f"ws://127.0.0.1:{fila_porta.get(timeout=30)}"
+            cpu_filhos = resource.getrusage(resource.RUSAGE_CHILDREN)
+            with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+                resultado = asyncio.run(rodar_bot(symbols, primeiros, url, terminou, args.workers, args.espera_final, diretorio))
+            # Workers da IA já foram encerrados (e contabilizados); o servidor ainda não
+            depois = resource.getrusage(resource.RUSAGE_CHILDREN)
+            resultado["cpu_workers_s"] = (depois.ru_utime + depois.ru_stime) - (cpu_filhos.ru_utime + cpu_filhos.ru_stime)
+        finally:
+            servidor.terminate()
+            servidor.join()
+            database.fechar_conexao()
+
+    cpu_total = resultado["cpu_bot_s"] + resultado["cpu_workers_s"]
+    resultado["cpu_por_ativo_pct"] = cpu_total / resultado["duracao_s"] / resultado["ativos"] * 100
+    return resultado
+
+def imprimir(r):
+    def linha(nome, p):
+        if p["p50"] is None:
+            return f"{nome:<28} sem amostras"
+        return f"{nome:<28} p50 {p['p50']:8.2f} | p90 {p['p90']:8.2f} | p99 {p['p99']:8.2f} | max {p['max']:8.2f}"
+
+    print(f"Ativos: {r['ativos']} | duração: {r['duracao_s']:.1f}s | ticks: {r['ticks']:,} ({r['ticks_por_s']:,.0f}/s)")
+    print(linha("Latência tick (ms)", r["latencia_tick_ms"]))
+    print(linha("Latência candle->IA (ms)", r["latencia_decisao_ms"]))
+    print(f"Decisões: {r['decisoes']} ({r['decisoes_por_s']:.2f}/s) | escritas no banco: {r['escritas_banco_por_s']:.1f}/s | chamadas REST: {r['chamadas_rest']}")
+    print(f"CPU: bot {r['cpu_bot_s']:.2f}s + workers {r['cpu_workers_s']:.2f}s | {r['cpu_por_ativo_pct']:.1f}% de um núcleo por ativo | loop travado {r['loop_lag_total_ms']:.0f} ms no total")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--gravacao", help="JSON lines com as mensagens do websocket ou diretório do gravador (padrão: sintético)")
+    parser.add_argument("--dias", help="com --gravacao=diretório: AAAA-MM-DD ou AAAA-MM-DD:AAAA-MM-DD")
+    parser.add_argument("--cotacao", default="BRL", help="moeda de cotação dos símbolos da gravação")
+    parser.add_argument("--ativos", type=int, default=5)
+    parser.add_argument("--minutos", type=int, default=30)
+    parser.add_argument("--ticks-por-minuto", type=int, default=10)
+    parser.add_argument("--velocidade", type=float, default=120, help="multiplicador do tempo da gravação (0 = sem pausa)")
+    parser.add_argument("--workers", type=int, default=main.ML_WORKERS)
+    parser.add_argument("--espera-final", type=float, default=30, help="segundos para o estrategista esvaziar a fila no fim")
+    parser.add_argument("--json", help="grava o resultado neste arquivo")
+    parser.add_argument("--max-p99-ms", type=float, help="falha (exit 1) se o p99 da latência de tick passar disso")
+    args = parser.parse_args()
+
+    resultado = rodar(args)
+    imprimir(resultado)
+    if args.json:
+        with open(args.json, "w") as arquivo:
+            json.dump(resultado, arquivo, indent=2)
+    p99 = resultado["latencia_tick_ms"]["p99"]
+    if args.max_p99_ms is not None and (p99 is None or p99 > args.max_p99_ms):
+        print(f"❌ p99 da latência de tick ({p99}) acima do limite de {args.max_p99_ms} ms")
+        sys.exit(1)
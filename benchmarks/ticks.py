@@ -0,0 +1,75 @@
+"""
+Benchmark do roteamento de ticks do vigilante (sem rede).
+
+Injeta mensagens miniTicker já serializadas direto no roteador do main.py e
+mede quantos ticks/s são processados com 10, 100 e 500 ativos, comparando
+com o loop linear antigo (varredura de ESTADO["ativos_ativos"] + print por tick).
+
+Uso: python -m benchmarks.ticks [--ticks 200000]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import time
+
+import main
+import modules.stream as stream
+
+def preparar_estado(n):
+    symbols = [f"S{i:03d}/BRL" for i in range(n)]
+    main.ESTADO["ativos_ativos"] = symbols
+    main.ESTADO["indice_ws"] = stream.montar_indice(symbols)
+    main.ESTADO["bot_rodando"] = True
+    main.ESTADO["precos_live"] = {}
+    # Posição aberta em todos, com preços que não disparam stop nem trailing
+    main.ESTADO["ativos_data"] = {
+        sym: {"saldo": 100.0, "posicao": True, "preco_compra": 100.0, "qtd": 1.0, "preco_maximo": 200.0}
+        for sym in symbols
+    }
+    return symbols
+
+def gerar_mensagens(symbols, total):
+    msgs = []
+    for i in range(total):
+        sym = symbols[i % len(symbols)]
+        msgs.append(json.dumps({"e": "24hrMiniTicker", "s": stream.simbolo_raw(sym), "c": f"{100 + (i % 7) * 0.01:.2f}"}))
+    return msgs
+
+async def roteador_antigo(data):
+    """Cópia do caminho antigo: varre todos os ativos e imprime o status a cada tick"""
+    msg = json.loads(data)
+    symbol_raw = msg['s']
+    for sym in main.ESTADO["ativos_ativos"]:
+        if sym.replace('/', '') == symbol_raw:
+            await main.processar_tick(sym, msg)
+    status_bot = "🟢 RODANDO" if main.ESTADO["bot_rodando"] else "🔴 PAUSADO"
+    print(f"[{status_bot}] Perfil: {main.ESTADO['perfil_ativo'].upper()} | " + " | ".join([f"{k}:{v:.0f}" for k,v in main.ESTADO["precos_live"].items()]), end='\r')
+
+async def medir(rotear, msgs):
+    inicio = time.perf_counter()
+    for data in msgs:
+        await rotear(data)
+    return len(msgs) / (time.perf_counter() - inicio)
+
+async def rodar(total_ticks):
+    canais = ("miniTicker", *(f"kline_{tf}" for tf in main.TIMEFRAMES_KLINE))
+    print(f"{'ativos':>7} | {'shards':>6} | {'antigo (ticks/s)':>17} | {'novo (ticks/s)':>15}")
+    for n in (10, 100, 500):
+        symbols = preparar_estado(n)
+        msgs = gerar_mensagens(symbols, total_ticks)
+        shards = len(stream.dividir_em_shards(symbols, canais))
+
+        with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+            antigo = await medir(roteador_antigo, msgs)
+            preparar_estado(n)
+            novo = await medir(lambda d: main.rotear_mensagem(d, None), msgs)
+
+        print(f"{n:>7} | {shards:>6} | {antigo:>17,.0f} | {novo:>15,.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ticks", type=int, default=200000)
+    args = parser.parse_args()
+    asyncio.run(rodar(args.ticks))
@@ -1,5 +1,5 @@
 "use client";
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import { RefreshCcw, Settings, Star, PieChart, ShieldAlert, Zap, Wallet, ArrowUpRight, ArrowDownRight, BarChart3, History } from "lucide-react";
 
 // Componentes
@@ -54,10 +54,45 @@ export default function Home() {
     } catch (error) { console.error("Sync Error", error); }
   };
 
+  // Estado da IA acumulado a partir do /stream (snapshot + diffs)
+  const statusIaRef = useRef<Record<string, any>>({});
+
+  const aplicarEvento = (evento: any) => {
+    if (evento.tipo === "snapshot") statusIaRef.current = {};
+
+    if (evento.status_ia || evento.status_removidos) {
+      Object.assign(statusIaRef.current, evento.status_ia || {});
+      (evento.status_removidos || []).forEach((sym: string) => delete statusIaRef.current[sym]);
+      const lista = Object.values(statusIaRef.current).sort((a: any, b: any) => String(b.timestamp).localeCompare(String(a.timestamp)));
+      setScanResults(lista.map((s: any) => ({ symbol: s.symbol, lucro: s.potencial, decisao: s.decisao })));
+      setEliteSymbols(Object.keys(statusIaRef.current));
+    }
+
+    if (!selectedSymbol) return;
+
+    const pos = evento.posicoes?.[selectedSymbol];
+    if (pos) {
+      setBotStatus({ saldo_disponivel: pos.saldo, posicionado: Boolean(pos.posicao), preco_compra: pos.preco_compra, qtd: pos.qtd_btc });
+    }
+
+    const preco = evento.precos?.[selectedSymbol];
+    if (preco) setMarketPrice(preco);
+
+    // Trade novo da moeda aberta: recarrega estatísticas e histórico
+    if (evento.trades?.some((t: any) => t.symbol === selectedSymbol)) fetchData();
+  };
+
   useEffect(() => {
     fetchData();
-    const interval = setInterval(fetchData, 2000);
-    return () => clearInterval(interval);
+
+    // Atualizações chegam por push (SSE); o polling fica só como rede de segurança
+    const fonte = new EventSource(`${API_URL}/stream`);
+    fonte.onmessage = (e) => {
+      try { aplicarEvento(JSON.parse(e.data)); } catch (error) { console.error("Stream Error", error); }
+    };
+
+    const interval = setInterval(fetchData, 30000);
+    return () => { clearInterval(interval); fonte.close(); };
   }, [selectedSymbol]);
 
   const handleSaveConfig = async (key: string, val: string) => {
@@ -163,7 +198,7 @@ export default function Home() {
                     {stats?.lucro_total >= 0 ? <ArrowUpRight size={14} /> : <ArrowDownRight size={14} />} R$ {stats?.lucro_total.toFixed(2)} (Lucro Real)
                  </div>
               </div>
-              <EquityChart symbol={selectedSymbol} />
+              <EquityChart symbol={selectedSymbol} trades={history} />
            </div>
         )}
 
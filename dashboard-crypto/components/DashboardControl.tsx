@@ -4,6 +4,14 @@ import { useState } from "react";
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 
+// Espera o bot confirmar o comando (long-poll na API, até 5s)
+const aguardarConfirmacao = async (resposta: Response) => {
+  const { comando_id } = await resposta.json();
+  if (!comando_id) return null;
+  const res = await fetch(`${API_URL}/comandos/${comando_id}?espera=5`);
+  return res.json();
+};
+
 export default function DashboardControl() {
   const [isRunning, setIsRunning] = useState(true);
   const [isPanic, setIsPanic] = useState(false);
@@ -11,7 +19,8 @@ export default function DashboardControl() {
   const toggleBot = async () => {
     const newState = !isRunning;
     try {
-      await fetch(`${API_URL}/bot-control?status=${newState}`);
+      const ack = await aguardarConfirmacao(await fetch(`${API_URL}/bot-control?status=${newState}`));
+      if (ack?.status !== "executado") console.warn("Bot ainda não confirmou o comando", ack);
       setIsRunning(newState);
     } catch (e) {
       console.error("Erro ao alternar bot");
@@ -22,8 +31,12 @@ export default function DashboardControl() {
     if (!confirm("🚨 TEM CERTEZA? ISSO VENDERÁ TUDO AGORA!")) return;
     setIsPanic(true);
     try {
-      await fetch(`${API_URL}/panic-sell`, { method: "POST" });
-      alert("⚠️ PROTOCOLO DE EMERGÊNCIA ATIVADO!");
+      const ack = await aguardarConfirmacao(await fetch(`${API_URL}/panic-sell`, { method: "POST" }));
+      if (ack?.status === "executado") {
+        alert(`⚠️ PROTOCOLO DE EMERGÊNCIA EXECUTADO: ${ack.resultado}`);
+      } else {
+        alert(`⚠️ Comando enviado, mas o bot ainda não confirmou (${ack?.status ?? "sem resposta"}).`);
+      }
     } catch (e) {
       alert("Erro ao enviar comando de pânico.");
     } finally {
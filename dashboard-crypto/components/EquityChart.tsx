@@ -1,11 +1,18 @@
 "use client";
 import { useEffect, useRef } from "react";
-import { createChart, ColorType, AreaSeries } from "lightweight-charts";
+import { createChart, ColorType, AreaSeries, IChartApi, ISeriesApi } from "lightweight-charts";
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 
-export default function EquityChart({ symbol }: { symbol: string }) {
+interface EquityChartProps {
+  symbol: string;
+  trades: any[];
+}
+
+export default function EquityChart({ symbol, trades }: EquityChartProps) {
   const chartContainerRef = useRef<HTMLDivElement>(null);
+  const chartApiRef = useRef<IChartApi | null>(null);
+  const seriesApiRef = useRef<ISeriesApi<"Area"> | null>(null);
 
   useEffect(() => {
     if (!chartContainerRef.current) return;
@@ -39,19 +46,42 @@ export default function EquityChart({ symbol }: { symbol: string }) {
       lineWidth: 2,
     });
 
-    // 2. Busca Dados Filtrados por Símbolo
+    seriesApiRef.current = areaSeries;
+    chartApiRef.current = chart;
+
+    const handleResize = () => {
+        if(chartContainerRef.current) {
+            chart.applyOptions({ width: chartContainerRef.current.clientWidth });
+        }
+    };
+    window.addEventListener("resize", handleResize);
+
+    return () => {
+      window.removeEventListener("resize", handleResize);
+      chart.remove();
+      seriesApiRef.current = null;
+      chartApiRef.current = null;
+    };
+  }, [symbol]); // O gráfico reinicia ao trocar de moeda
+
+  // 2. Busca Dados Filtrados por Símbolo
+  // Sem polling próprio: o page.tsx recarrega `trades` quando o /stream avisa
+  // de um trade novo (ou no polling de segurança de 30s), e a curva vem junto
+  useEffect(() => {
+    let cancelado = false;
+
     const fetchEquity = async () => {
       try {
         // V5: Adiciona o parâmetro de símbolo na requisição
         const res = await fetch(`${API_URL}/equity?symbol=${symbol}`);
         const data = await res.json();
-        
-        if (data && data.length > 0) {
+
+        if (!cancelado && seriesApiRef.current && data && data.length > 0) {
             // Remove duplicatas de tempo para evitar erros no Lightweight Charts
             const uniqueData = Array.from(new Map(data.map((item:any) => [item.time, item])).values());
             // @ts-ignore
-            areaSeries.setData(uniqueData);
-            chart.timeScale().fitContent();
+            seriesApiRef.current.setData(uniqueData);
+            chartApiRef.current?.timeScale().fitContent();
         }
       } catch (error) {
         console.error(`Erro Equity (${symbol}):`, error);
@@ -59,21 +89,8 @@ export default function EquityChart({ symbol }: { symbol: string }) {
     };
 
     fetchEquity();
-    const interval = setInterval(fetchEquity, 5000);
-
-    const handleResize = () => {
-        if(chartContainerRef.current) {
-            chart.applyOptions({ width: chartContainerRef.current.clientWidth });
-        }
-    };
-    window.addEventListener("resize", handleResize);
-
-    return () => {
-      clearInterval(interval);
-      window.removeEventListener("resize", handleResize);
-      chart.remove();
-    };
-  }, [symbol]); // O gráfico reinicia ao trocar de moeda
+    return () => { cancelado = true; };
+  }, [trades, symbol]);
 
   return (
     <div className="w-full bg-zinc-900/50 border border-zinc-800 rounded-2xl p-4 backdrop-blur-sm shadow-xl mt-4">
@@ -1,21 +1,32 @@
 import asyncio
+import importlib
 import json
 import os
 import logging
-from datetime import datetime
-import ccxt.async_support as ccxt 
-import websockets
+import time
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
 # Módulos Locais
 from modules.database import (
     criar_tabelas, salvar_trade, atualizar_status_ia, 
-    salvar_estado, carregar_estado, carregar_configs_globais, 
-    criar_tabela_configs, resetar_comando_venda, obter_ultimo_saldo
+    salvar_estado, marca_estado, carregar_estado, carregar_configs_globais, 
+    criar_tabela_configs, obter_ultimo_saldo, total_pendentes,
+    escritor_adiado, fechar_conexao, compactar_historico_ia,
+    obter_resumo_diario, obter_resumo_semanal, obter_resumo_mensal,
+    versao_banco, comandos_pendentes, confirmar_comando,
+    salvar_calibracao, carregar_calibracao, simbolos_posicionados
 )
-from modules.backtest import otimizar_estrategia 
-import modules.brain as brain
+# ccxt e modules.backtest (pandas, sklearn, ta) são importados em segundo
+# plano depois que o vigilante sobe: o primeiro tick não espera por eles.
+from modules.candles import CandleStore
 import modules.notifier as notifier
+from modules.executor import PoolAnalise
+from modules.metricas import monitor_loop
+import modules.metricas as metricas
+import modules.stream as stream
+from modules.gravador import GravadorTicks, GRAVAR_TICKS
+from modules.perfis import PERFIS, TAXA_TOTAL
 
 # --- CONFIGURAÇÃO ---
 logging.basicConfig(
@@ -25,40 +36,48 @@ logging.basicConfig(
 )
 load_dotenv()
 
-# --- DEFINIÇÃO DE PERFIS DE RISCO ---
-PERFIS = {
-    "conservador": {
-        "STOP_LOSS": 1.0,
-        "TRAILING_DROP": 0.2,
-        "LUCRO_MINIMO": 0.1,
-        "SCORE_MINIMO": 8,
-        "RSI_COMPRA": 30
-    },
-    "moderado": {
-        "STOP_LOSS": 1.5,
-        "TRAILING_DROP": 0.5,
-        "LUCRO_MINIMO": 0.2,
-        "SCORE_MINIMO": 6,
-        "RSI_COMPRA": 35
-    },
-    "agressivo": {
-        "STOP_LOSS": 3.0,
-        "TRAILING_DROP": 1.0,
-        "LUCRO_MINIMO": 0.4,
-        "SCORE_MINIMO": 5,
-        "RSI_COMPRA": 45
-    }
-}
-
 # Parâmetros Iniciais
 CANDIDATOS = os.getenv('TRADING_PAIRS', 'BTC/BRL,ETH/BRL,SOL/BRL,BNB/BRL,ADA/BRL').split(',')
 LIMITE_ELITE = 3  
-TAXA_TOTAL = 0.2
+
+# Reinício a quente: a calibração fica no banco e vale por CALIBRACAO_TTL
+# segundos (padrão 6h). Dentro do prazo o bot volta direto à elite salva (e às
+# posições abertas) e só recalibra, em segundo plano, quando ela vencer.
+CALIBRACAO_TTL = int(os.getenv('CALIBRACAO_TTL', 6 * 3600))
+
+# Pool de processos da IA (0 = roda a análise dentro do event loop)
+ML_WORKERS = int(os.getenv('ML_WORKERS', 2))
+ML_TIMEOUT = float(os.getenv('ML_TIMEOUT', 30))
+
+# Deriva o 15m (e o 1h/4h de contexto) de uma única série de 1m por ativo
+# (modules/reamostragem.py): um stream de kline e um buffer em vez de dois.
+# HISTORICO_1M minutos ficam em memória (padrão: 7 dias = 672 candles de 15m).
+REAMOSTRAR_1M = os.getenv('REAMOSTRAR_1M', 'false') == 'true'
+HISTORICO_1M = int(os.getenv('HISTORICO_1M', 10080))
+TIMEFRAMES_SUPERIORES = ("1h", "4h")
+
+# Streams de kline assinados no websocket. O fechamento de qualquer um deles
+# dispara uma nova análise do ativo (o 15m em formação é reavaliado a cada 1m).
+TIMEFRAMES_KLINE = ("1m",) if REAMOSTRAR_1M else ("1m", "15m")
+ESPERA_MAX_CANDLE = 90  # segundos sem fechamento antes de cair para o REST
+EVENTOS_CANDLE = asyncio.Queue()
+
+# Liberado quando a exchange (REST) está pronta; o websocket não depende dela
+EXCHANGE_PRONTA = asyncio.Event()
+# Pede ao supervisor_vigilante que reabra os websockets com a nova lista de ativos
+TROCA_ATIVOS = asyncio.Event()
+
+# Gravador opcional de ticks/klines (GRAVAR_TICKS=diretório); criado no main()
+GRAVADOR = None
+
+# Intervalo da checagem de comandos vindos da API (latência do panic sell)
+INTERVALO_COMANDOS = float(os.getenv('INTERVALO_COMANDOS', 0.02))
 
 # Estado Global de Operação
 ESTADO = {
     "ativos_ativos": [],
     "ativos_data": {},
+    "indice_ws": {},
     "precos_live": {},
     "configs_ia": {},
     "bot_rodando": True,
@@ -68,47 +87,91 @@ ESTADO = {
 
 # --- FUNÇÃO DE SINCRONIZAÇÃO DE CONFIGURAÇÕES ---
 
+def aplicar_configs(db_configs):
+    ESTADO["bot_rodando"] = db_configs.get('bot_rodando') == 'true'
+    ESTADO["modo_producao"] = db_configs.get('modo_producao') == 'true'
+    ESTADO["perfil_ativo"] = db_configs.get('perfil_risco', 'moderado')
+
 async def sincronizar_configs():
-    """Lê o banco de dados a cada 10s para atualizar o comportamento do bot"""
-    global ESTADO
+    """Rede de segurança: relê config_global a cada 10s (os comandos chegam pelo ouvinte_comandos)"""
     while True:
         try:
-            db_configs = carregar_configs_globais()
-            ESTADO["bot_rodando"] = db_configs.get('bot_rodando') == 'true'
-            ESTADO["modo_producao"] = db_configs.get('modo_producao') == 'true'
-            ESTADO["perfil_ativo"] = db_configs.get('perfil_risco', 'moderado')
-            
-            # Verificar Comando de Venda Total (Botão de Pânico)
-            if db_configs.get('comando_venda_total') == 'true':
-                print("\n🚨 COMANDO DE EMERGÊNCIA: Vendendo todos os ativos!")
-                for sym in ESTADO["ativos_ativos"]:
-                    if ESTADO["ativos_data"][sym]["posicao"]:
-                        await executar_venda(sym, "Venda Manual (Dashboard)")
-                resetar_comando_venda() # Volta o comando para 'false' no banco e evita loop
-                
+            aplicar_configs(await asyncio.to_thread(carregar_configs_globais))
         except Exception as e:
             logging.error(f"Erro ao sincronizar configs: {e}")
         await asyncio.sleep(10)
 
+async def tratar_comando(comando):
+    """Executa um comando vindo da API e devolve o texto do ack"""
+    tipo = comando["tipo"]
+    if tipo == "venda_total":
+        print("\n🚨 COMANDO DE EMERGÊNCIA: Vendendo todos os ativos!")
+        posicionados = [sym for sym in ESTADO["ativos_ativos"] if ESTADO["ativos_data"][sym]["posicao"]]
+        # Quem um tick (trailing/stop) vender antes fica de fora: executar_venda devolve False
+        vendidos = await asyncio.gather(*(executar_venda(sym, "Venda Manual (Dashboard)") for sym in posicionados))
+        return f"{sum(vendidos)} posição(ões) vendida(s)"
+    if tipo == "bot_rodando":
+        ESTADO["bot_rodando"] = comando["valor"] == 'true'
+        return "bot operando" if ESTADO["bot_rodando"] else "bot pausado"
+    if tipo == "recarregar_configs":
+        aplicar_configs(await asyncio.to_thread(carregar_configs_globais))
+        return f"perfil {ESTADO['perfil_ativo']}"
+    raise ValueError(f"Comando desconhecido: {tipo}")
+
+async def ouvinte_comandos():
+    """
+    Canal de comandos API -> bot. Checa o PRAGMA data_version a cada
+    INTERVALO_COMANDOS (custa microssegundos) e só lê a tabela comandos quando
+    alguém fez commit. Cada comando é confirmado (ack) na própria linha.
+    A leitura (e a expiração, que escreve) roda numa thread: os commits do
+    próprio bot também mudam o data_version, e o loop não pode esperar o _LOCK.
+    """
+    versao = None
+    while True:
+        try:
+            atual = versao_banco()
+            if atual != versao:
+                versao = atual
+                for comando in await asyncio.to_thread(comandos_pendentes):
+                    try:
+                        resultado = await tratar_comando(comando)
+                        status = "executado"
+                    except Exception as e:
+                        resultado, status = str(e), "erro"
+                        logging.error(f"Erro ao executar comando {comando['tipo']}: {e}")
+                    latencia_ms = (time.time() - comando["criado_em"]) * 1000
+                    print(f"\n📨 Comando {comando['tipo']} #{comando['id']}: {resultado} ({latencia_ms:.0f} ms)")
+                    await asyncio.to_thread(confirmar_comando, comando["id"], status, resultado)
+        except Exception as e:
+            logging.error(f"Erro no ouvinte de comandos: {e}")
+        await asyncio.sleep(INTERVALO_COMANDOS)
+
 # --- FUNÇÕES DE OPERAÇÃO ---
 
 async def executar_venda(symbol, motivo):
+    """Fecha a posição do ativo; False se ela já tinha sido fechada (ex: tick e panic sell juntos)"""
     dados = ESTADO["ativos_data"][symbol]
     preco = ESTADO["precos_live"][symbol]
+    # Checa e fecha antes do primeiro await: duas vendas do mesmo ativo não se sobrepõem
+    if not dados["posicao"]:
+        return False
     
     valor_bruto = dados["qtd"] * preco
     lucro_reais = (valor_bruto - (dados["qtd"] * dados["preco_compra"])) * (1 - (TAXA_TOTAL/100))
     
     dados["saldo"] = valor_bruto * (1 - (TAXA_TOTAL/100))
     dados["posicao"] = False
+    dados["qtd"] = 0
     
     # Se estivesse em Produção Real, aqui iria a chamada exchange.create_order(...)
     
-    salvar_estado(symbol, dados["saldo"], False, 0, 0, 0)
-    salvar_trade(symbol, "VENDA", preco, 0, lucro_reais)
+    # Transição de posição: gravação durável, mas fora do event loop
+    await asyncio.to_thread(salvar_estado, symbol, dados["saldo"], False, 0, 0, 0, ordem=marca_estado())
+    await asyncio.to_thread(salvar_trade, symbol, "VENDA", preco, 0, lucro_reais, dados["saldo"])
     
     cor = 0x00ff00 if lucro_reais > 0 else 0xff0000
-    notifier.enviar_discord(f"🚨 VENDA: {symbol}", f"Motivo: {motivo}\nLucro: R$ {lucro_reais:.2f}", cor)
+    notifier.notificar(f"🚨 VENDA: {symbol}", f"Motivo: {motivo}\nLucro: R$ {lucro_reais:.2f}", cor)
+    return True
 
 async def executar_compra(symbol, analise):
     dados = ESTADO["ativos_data"][symbol]
@@ -121,84 +184,172 @@ async def executar_compra(symbol, analise):
     
     # Se estivesse em Produção Real, aqui iria a chamada exchange.create_order(...)
     
-    salvar_estado(symbol, dados["saldo"], True, preco, dados["qtd"], preco)
-    salvar_trade(symbol, "COMPRA", preco, dados["qtd"], 0)
+    await asyncio.to_thread(salvar_estado, symbol, dados["saldo"], True, preco, dados["qtd"], preco, ordem=marca_estado())
+    await asyncio.to_thread(salvar_trade, symbol, "COMPRA", preco, dados["qtd"], 0, dados["saldo"])
     
-    notifier.enviar_discord(f"🚀 COMPRA: {symbol}", f"Score IA: {analise['score']}/10\nPerfil: {ESTADO['perfil_ativo'].upper()}", 0x00ff00)
-    atualizar_status_ia(symbol, analise['rsi'], analise['score'], "COMPRA")
+    notifier.notificar(f"🚀 COMPRA: {symbol}", f"Score IA: {analise['score']}/10\nPerfil: {ESTADO['perfil_ativo'].upper()}", 0x00ff00)
+    await asyncio.to_thread(atualizar_status_ia, symbol, analise['rsi'], analise['score'], "COMPRA")
 
 # --- CORE: VIGILANTE E ESTRATEGISTA ---
 
-async def vigilante_multi_preco():
-    if not ESTADO["ativos_ativos"]: return
+async def processar_tick(sym, msg):
+    price = float(msg['c'])
+    ESTADO["precos_live"][sym] = price
     
-    streams = "/".join([f"{s.replace('/', '').lower()}@miniTicker" for s in ESTADO["ativos_ativos"]])
-    url = f"wss://stream.binance.com:9443/ws/{streams}"
+    dados = ESTADO["ativos_data"][sym]
+    if dados["posicao"]:
+        if price > dados["preco_maximo"]: 
+            dados["preco_maximo"] = price
+            # Só o topo mudou: vai para o write-behind (agrupado e gravado em segundo plano)
+            salvar_estado(sym, dados["saldo"], True, dados["preco_compra"], dados["qtd"], price, adiado=True)
+
+        # Carrega as regras do Perfil Ativo Dinamicamente
+        regra = PERFIS[ESTADO["perfil_ativo"]]
+        
+        recuo = ((price - dados["preco_maximo"]) / dados["preco_maximo"]) * 100
+        lucro = ((price - dados["preco_compra"]) / dados["preco_compra"]) * 100
+        
+        if (lucro - TAXA_TOTAL) > regra["LUCRO_MINIMO"] and recuo <= -regra["TRAILING_DROP"]:
+            await executar_venda(sym, "Trailing Stop")
+        elif lucro <= -regra["STOP_LOSS"]:
+            await executar_venda(sym, "Stop Loss")
+
+def processar_kline(sym, msg, loja):
+    """Atualiza a série de candles ao vivo e avisa o estrategista no fechamento"""
+    k = msg['k']
+    candle = [k['t'], float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v'])]
+    loja.atualizar_kline(sym, k['i'], candle, k['x'])
+    if k['x']:
+        EVENTOS_CANDLE.put_nowait(sym)
+
+async def rotear_mensagem(data, loja):
+    """Roteia uma mensagem do websocket para o ativo certo em O(1) pelo índice pré-calculado"""
+    # Se o bot estiver pausado, ele ignora o processamento (o gravador continua)
+    if not ESTADO["bot_rodando"] and GRAVADOR is None:
+        return
+    try:
+        msg = json.loads(data)
+        sym = ESTADO["indice_ws"].get(msg.get('s'))
+        if sym is None:
+            return # Respostas do SUBSCRIBE ou ativos que saíram da elite
+
+        if GRAVADOR is not None:
+            GRAVADOR.registrar(sym, msg)
+        if not ESTADO["bot_rodando"]:
+            return
+
+        if msg.get('e') == 'kline':
+            processar_kline(sym, msg, loja)
+        else:
+            await processar_tick(sym, msg)
+            imprimir_status()
+    except Exception as e:
+        logging.error(f"Erro ao processar tick: {e}")
+
+ESTADO_TELA = {"ultimo_print": 0.0}
+def imprimir_status():
+    """Linha de status no terminal, no máximo uma vez por segundo"""
+    agora = time.monotonic()
+    if agora - ESTADO_TELA["ultimo_print"] < 1:
+        return
+    ESTADO_TELA["ultimo_print"] = agora
+    status_bot = "🟢 RODANDO" if ESTADO["bot_rodando"] else "🔴 PAUSADO"
+    print(f"[{status_bot}] Perfil: {ESTADO['perfil_ativo'].upper()} | " + " | ".join([f"{k}:{v:.0f}" for k,v in ESTADO["precos_live"].items()]), end='\r')
+
+async def supervisor_vigilante(loja):
+    """Roda o vigilante e o reinicia (novos websockets) quando a lista de ativos muda"""
+    while True:
+        TROCA_ATIVOS.clear()
+        tarefa = asyncio.create_task(vigilante_multi_preco(loja))
+        try:
+            await TROCA_ATIVOS.wait()
+        finally:
+            tarefa.cancel()
+            await asyncio.gather(tarefa, return_exceptions=True)
+
+async def vigilante_multi_preco(loja):
+    if not ESTADO["ativos_ativos"]: return
     
-    async with websockets.connect(url) as ws:
-        while True:
-            try:
-                # Se o bot estiver pausado, ele ignora o processamento
-                if not ESTADO["bot_rodando"]:
-                    await asyncio.sleep(1)
-                    continue
+    ESTADO["indice_ws"] = stream.montar_indice(ESTADO["ativos_ativos"])
+    canais = ("miniTicker", *(f"kline_{tf}" for tf in TIMEFRAMES_KLINE))
+    shards = stream.dividir_em_shards(ESTADO["ativos_ativos"], canais)
 
-                data = await ws.recv()
-                msg = json.loads(data)
-                symbol_raw = msg['s'] 
-                
-                for sym in ESTADO["ativos_ativos"]:
-                    if sym.replace('/', '') == symbol_raw:
-                        price = float(msg['c'])
-                        ESTADO["precos_live"][sym] = price
-                        
-                        dados = ESTADO["ativos_data"][sym]
-                        if dados["posicao"]:
-                            if price > dados["preco_maximo"]: 
-                                dados["preco_maximo"] = price
-                                salvar_estado(sym, dados["saldo"], True, dados["preco_compra"], dados["qtd"], price)
-
-                            # Carrega as regras do Perfil Ativo Dinamicamente
-                            regra = PERFIS[ESTADO["perfil_ativo"]]
-                            
-                            recuo = ((price - dados["preco_maximo"]) / dados["preco_maximo"]) * 100
-                            lucro = ((price - dados["preco_compra"]) / dados["preco_compra"]) * 100
-                            
-                            if (lucro - TAXA_TOTAL) > regra["LUCRO_MINIMO"] and recuo <= -regra["TRAILING_DROP"]:
-                                await executar_venda(sym, "Trailing Stop")
-                            elif lucro <= -regra["STOP_LOSS"]:
-                                await executar_venda(sym, "Stop Loss")
-                
-                status_bot = "🟢 RODANDO" if ESTADO["bot_rodando"] else "🔴 PAUSADO"
-                print(f"[{status_bot}] Perfil: {ESTADO['perfil_ativo'].upper()} | " + " | ".join([f"{k}:{v:.0f}" for k,v in ESTADO["precos_live"].items()]), end='\r')
-            except:
-                await asyncio.sleep(5)
+    async def ao_receber(data):
+        if not metricas.HABILITADO:
+            await rotear_mensagem(data, loja)
+            return
+        inicio = time.perf_counter()
+        await rotear_mensagem(data, loja)
+        metricas.observar("bot_ws_mensagem_segundos", time.perf_counter() - inicio)
+
+    # Uma conexão por shard; cada uma reconecta sozinha com backoff.
+    # Quando um shard cai, só os candles dos ativos dele voltam ao REST.
+    await asyncio.gather(*(
+        stream.rodar_shard(
+            stream.nomes_streams(ativos, canais), ao_receber,
+            ao_cair=lambda ativos=ativos: loja.dessincronizar(set(ativos)),
+            nome=f"shard {i + 1}/{len(shards)}"
+        )
+        for i, ativos in enumerate(shards)
+    ))
 
-async def estrategista_cerebro(exchange):
+async def estrategista_cerebro(loja, pool):
+    await EXCHANGE_PRONTA.wait()
+    # Primeira passada analisa todos (faz o backfill REST); depois só quem fechou candle
+    pendentes = set(ESTADO["ativos_ativos"])
     while True:
         try:
             if not ESTADO["bot_rodando"]:
                 await asyncio.sleep(5)
                 continue
 
+            if not pendentes:
+                # Espera o fechamento de um candle no websocket. Sem eventos por
+                # muito tempo (stream caído), faz uma varredura completa via REST.
+                try:
+                    pendentes.add(await asyncio.wait_for(EVENTOS_CANDLE.get(), timeout=ESPERA_MAX_CANDLE))
+                    while not EVENTOS_CANDLE.empty():
+                        pendentes.add(EVENTOS_CANDLE.get_nowait())
+                except asyncio.TimeoutError:
+                    pendentes = set(ESTADO["ativos_ativos"])
+
             for sym in ESTADO["ativos_ativos"]:
+                # Posições retomadas sem calibração só são vigiadas (saída), não compradas
+                if sym not in pendentes or sym not in ESTADO["configs_ia"]:
+                    continue
                 dados = ESTADO["ativos_data"][sym]
                 if not dados["posicao"]:
-                    c1m = await exchange.fetch_ohlcv(sym, timeframe='1m', limit=500)
-                    c15m = await exchange.fetch_ohlcv(sym, timeframe='15m', limit=500)
+                    if REAMOSTRAR_1M:
+                        # 15m, 1h e 4h saem do mesmo buffer de 1m (sem REST extra)
+                        superiores = await loja.fetch_reamostrado(sym, ("15m", *TIMEFRAMES_SUPERIORES), limit=500)
+                        c15m = superiores.pop("15m")
+                    else:
+                        # A IA só lê o 15m; o 1m não é baixado
+                        c15m = await loja.fetch_ohlcv(sym, timeframe='15m', limit=500)
+                        superiores = None
                     
                     config = ESTADO["configs_ia"].get(sym)
-                    analise = brain.analisar_multitimeframe(c1m, c15m, config=config)
-                    atualizar_status_ia(sym, analise['rsi'], analise['score'], analise['decisao'])
+                    analise = await pool.analisar(sym, None, c15m, config=config, superiores=superiores)
+                    if analise is None:
+                        continue
+                    await asyncio.to_thread(atualizar_status_ia, sym, analise['rsi'], analise['score'], analise['decisao'])
                     
                     # Filtro de Perfil de Risco para Compra
                     regra = PERFIS[ESTADO["perfil_ativo"]]
                     
                     if analise['decisao'] == "COMPRA" and analise['score'] >= regra["SCORE_MINIMO"]:
+                        # Durante os awaits o ativo pode ter saído da elite (trocar_ativos)
+                        # ou ainda não ter recebido o primeiro tick depois de entrar
+                        dados = ESTADO["ativos_data"].get(sym)
+                        if dados is None or dados["posicao"] or sym not in ESTADO["configs_ia"]:
+                            continue
+                        if ESTADO["precos_live"].get(sym, 0) <= 0:
+                            logging.info(f"Compra de {sym} ignorada: sem preço ao vivo ainda")
+                            continue
                         await executar_compra(sym, analise)
-            
-            await asyncio.sleep(10)
+            pendentes.clear()
         except Exception as e:
+            pendentes.clear()
             logging.error(f"Erro Estrategista: {e}")
             await asyncio.sleep(5)
 
@@ -215,71 +366,180 @@ async def agendador_relatorio():
             
             if ESTADO_RELATORIO["ultimo_envio"] != hoje:
                 print("\n📊 Gerando relatório de fecho de dia...")
-                from modules.database import obter_resumo_diario
-                resumo = obter_resumo_diario()
+                # Tudo sai do resumo_diario (uma linha por ativo por dia)
+                resumo = await asyncio.to_thread(obter_resumo_diario)
                 notifier.enviar_relatorio_diario(resumo)
+                if agora.weekday() == 6:
+                    notifier.enviar_relatorio_semanal(await asyncio.to_thread(obter_resumo_semanal))
+                if (agora + timedelta(days=1)).day == 1:
+                    notifier.enviar_relatorio_mensal(await asyncio.to_thread(obter_resumo_mensal))
                 
                 ESTADO_RELATORIO["ultimo_envio"] = hoje
         
         await asyncio.sleep(60)
 
-async def main():
-    criar_tabelas()
-    criar_tabela_configs()
-    exchange = ccxt.binance({'enableRateLimit': True})
-    
-    # 1. LOOP DE CALIBRAÇÃO INICIAL
+async def manutencao_historico():
+    """De hora em hora agrega o histórico da IA com mais de 24h em blocos de 15 min"""
     while True:
+        try:
+            await asyncio.to_thread(compactar_historico_ia)
+        except Exception as e:
+            logging.error(f"Erro ao compactar histórico da IA: {e}")
+        await asyncio.sleep(3600)
+
+# --- CALIBRAÇÃO E REINÍCIO A QUENTE ---
+
+async def preparar_exchange(loja):
+    """
+    Importa o ccxt (~0.5 s) numa thread, sem segurar o event loop, e entrega a
+    exchange à loja de candles. Quem precisa de REST espera EXCHANGE_PRONTA.
+    """
+    ccxt = await asyncio.to_thread(importlib.import_module, "ccxt.async_support")
+    loja.exchange = metricas.instrumentar_exchange(ccxt.binance({'enableRateLimit': True}))
+    EXCHANGE_PRONTA.set()
+
+def carregar_ativo(sym):
+    """Carteira do ativo: a memória salva ou, sem ela, o último saldo acumulado"""
+    memoria = carregar_estado(sym)
+    if memoria:
+        return {
+            "saldo": memoria['saldo'], "posicao": memoria['posicao'],
+            "preco_compra": memoria['preco_compra'], "qtd": memoria['qtd_btc'],
+            "preco_maximo": memoria['preco_maximo']
+        }
+    # FIX: Carrega o último saldo acumulado do banco em vez de resetar para 100
+    return {
+        "saldo": obter_ultimo_saldo(sym), 
+        "posicao": False, 
+        "preco_compra": 0, 
+        "qtd": 0, 
+        "preco_maximo": 0
+    }
+
+def trocar_ativos(elite, configs, posicionados=()):
+    """
+    Passa a operar a 'elite' com as 'configs' calibradas. Ativos com posição
+    aberta continuam vigiados até a venda, mesmo fora da elite. Quem sai some
+    do índice do websocket na hora; o supervisor_vigilante reabre as conexões.
+    """
+    abertos = [sym for sym in ESTADO["ativos_ativos"] if ESTADO["ativos_data"][sym]["posicao"]]
+    ativos = list(dict.fromkeys([*elite, *posicionados, *abertos]))
+
+    for sym in ativos:
+        if sym not in ESTADO["ativos_data"]:
+            ESTADO["ativos_data"][sym] = carregar_ativo(sym)
+            ESTADO["precos_live"][sym] = 0.0
+    for sym in set(ESTADO["ativos_data"]) - set(ativos):
+        ESTADO["ativos_data"].pop(sym)
+        ESTADO["precos_live"].pop(sym, None)
+
+    novos = [sym for sym in ativos if sym not in ESTADO["ativos_ativos"]]
+    mudou = set(ativos) != set(ESTADO["ativos_ativos"])
+    ESTADO["configs_ia"] = dict(configs)
+    ESTADO["ativos_ativos"] = ativos
+    ESTADO["indice_ws"] = stream.montar_indice(ativos)
+    if mudou:
+        TROCA_ATIVOS.set()
+    # Os que entraram são analisados já, sem esperar o próximo candle
+    for sym in novos:
+        EVENTOS_CANDLE.put_nowait(sym)
+
+async def calibrador(loja, calibrado_em=None):
+    """
+    Calibra os candidatos em segundo plano sempre que a última calibração
+    vence (CALIBRACAO_TTL), grava o resultado e troca os ativos pela nova
+    elite. Vigilante e estrategista seguem rodando enquanto isso.
+    """
+    backtest = await asyncio.to_thread(importlib.import_module, "modules.backtest")
+    await EXCHANGE_PRONTA.wait()
+    while True:
+        if calibrado_em is not None:
+            await asyncio.sleep(max(0.0, calibrado_em + CALIBRACAO_TTL - time.time()))
+
         ranking = []
         print(f"\n🔍 [CALIBRAÇÃO] Analisando {len(CANDIDATOS)} candidatos...")
-        for sym in CANDIDATOS:
-            config, lucro = await otimizar_estrategia(exchange, sym)
-            atualizar_status_ia(sym, 0, lucro, "OBSERVAÇÃO" if lucro <= 0 else "ELITE")
+        inicio_calibracao = datetime.now()
+        resultados = await backtest.calibrar_candidatos(loja, CANDIDATOS, perfil=ESTADO["perfil_ativo"], reamostrar=REAMOSTRAR_1M)
+        print(f"⏱️ Calibração concluída em {(datetime.now() - inicio_calibracao).total_seconds():.1f}s")
+        for sym, config, lucro in resultados:
+            await asyncio.to_thread(atualizar_status_ia, sym, 0, lucro, "OBSERVAÇÃO" if lucro <= 0 else "ELITE")
             if lucro > 0:
                 ranking.append({'symbol': sym, 'config': config, 'lucro': lucro})
         
         elite_data = sorted(ranking, key=lambda x: x['lucro'], reverse=True)[:LIMITE_ELITE]
-        ESTADO["ativos_ativos"] = [item['symbol'] for item in elite_data]
+        elite = [item['symbol'] for item in elite_data]
+        await asyncio.to_thread(salvar_calibracao, resultados, elite)
+        calibrado_em = time.time()
 
-        if not ESTADO["ativos_ativos"]:
+        if not elite:
+            # Mantém os ativos atuais (se houver) e tenta de novo mais cedo
             print("⚠️ Nenhuma moeda lucrativa. Aguardando 15 min...")
-            await asyncio.sleep(900)
+            calibrado_em -= CALIBRACAO_TTL - 900
             continue
-        break
 
-    # 2. INICIALIZAÇÃO DOS DADOS (CARTEIRA REAL)
-    for sym in ESTADO["ativos_ativos"]:
-        memoria = carregar_estado(sym)
-        ESTADO["configs_ia"][sym] = next(item['config'] for item in elite_data if item['symbol'] == sym)
-        ESTADO["precos_live"][sym] = 0.0
-        
-        if memoria:
-            ESTADO["ativos_data"][sym] = {
-                "saldo": memoria['saldo'], "posicao": memoria['posicao'],
-                "preco_compra": memoria['preco_compra'], "qtd": memoria['qtd_btc'],
-                "preco_maximo": memoria['preco_maximo']
-            }
-        else:
-            # FIX: Carrega o último saldo acumulado do banco em vez de resetar para 100
-            ultimo_saldo = obter_ultimo_saldo(sym)
-            ESTADO["ativos_data"][sym] = {
-                "saldo": ultimo_saldo, 
-                "posicao": False, 
-                "preco_compra": 0, 
-                "qtd": 0, 
-                "preco_maximo": 0
-            }
-
-    notifier.enviar_discord("✅ SISTEMA V6.0 ONLINE", f"Perfil: {ESTADO['perfil_ativo'].upper()}\nAtivos: {', '.join(ESTADO['ativos_ativos'])}", 0x00ff00)
+        trocar_ativos(elite, {item['symbol']: item['config'] for item in elite_data})
+        notifier.notificar("🔍 CALIBRAÇÃO CONCLUÍDA", f"Perfil: {ESTADO['perfil_ativo'].upper()}\nAtivos: {', '.join(ESTADO['ativos_ativos'])}", 0x00ff00)
+
+async def main():
+    global GRAVADOR
+    criar_tabelas()
+    criar_tabela_configs()
+    # Cache local de candles (só baixa o que é novo); a exchange chega via preparar_exchange
+    loja = CandleStore(None, tamanhos={'1m': HISTORICO_1M} if REAMOSTRAR_1M else None)
+    
+    # Perfil de risco antes da calibração: o simulador escolhe a config desse perfil
+    aplicar_configs(carregar_configs_globais())
+
+    # 1. REINÍCIO A QUENTE: elite da última calibração (se ainda válida) +
+    # posições abertas, vigiadas desde o primeiro tick
+    elite_salva, calibrado_em = carregar_calibracao(CALIBRACAO_TTL)
+    if elite_salva:
+        idade_min = (time.time() - calibrado_em) / 60
+        print(f"♻️ Calibração de {idade_min:.0f} min atrás reaproveitada: {', '.join(sym for sym, _, _ in elite_salva)}")
+    else:
+        calibrado_em = None
+    trocar_ativos([sym for sym, _, _ in elite_salva], {sym: config for sym, config, _ in elite_salva}, simbolos_posicionados())
+    if not ESTADO["ativos_ativos"]:
+        print("⏳ Sem calibração válida nem posições abertas: aguardando a calibração...")
+
+    notifier.notificar("✅ SISTEMA V6.0 ONLINE", f"Perfil: {ESTADO['perfil_ativo'].upper()}\nAtivos: {', '.join(ESTADO['ativos_ativos']) or 'calibrando...'}", 0x00ff00)
     
     # 3. MOTORES
-    await asyncio.gather(
-        vigilante_multi_preco(), 
-        estrategista_cerebro(exchange),
-        sincronizar_configs(), # Monitoramento de Comandos (Pause/Panic)
-        agendador_relatorio()  # Relatório Diário
-    )
-    await exchange.close()
+    pool = PoolAnalise(workers=ML_WORKERS, timeout=ML_TIMEOUT)
+    motores = [
+        supervisor_vigilante(loja), 
+        preparar_exchange(loja),
+        calibrador(loja, calibrado_em), # Recalibra em segundo plano
+        estrategista_cerebro(loja, pool),
+        ouvinte_comandos(), # Comandos do Dashboard (Pause/Panic) em milissegundos
+        sincronizar_configs(),
+        agendador_relatorio(), # Relatório Diário
+        manutencao_historico(), # Retenção do histórico da IA
+        monitor_loop(),        # Métrica de travamento do event loop
+        escritor_adiado(),     # Write-behind do estado (preço máximo)
+        loja.escritor_adiado(), # Write-behind dos klines fechados (candles.db)
+        notifier.despachante() # Fila de notificações do Discord
+    ]
+    if GRAVAR_TICKS:
+        GRAVADOR = GravadorTicks(GRAVAR_TICKS)
+        motores.append(GRAVADOR.descarregar_periodicamente())
+    if metricas.HABILITADO:
+        # GET http://localhost:METRICAS_PORTA/metrics (formato Prometheus)
+        metricas.registrar_medidor("bot_notificacoes_fila", notifier.tamanho_fila, "Notificações esperando envio ao Discord")
+        metricas.registrar_medidor("bot_eventos_candle_fila", EVENTOS_CANDLE.qsize, "Fechamentos de candle esperando o estrategista")
+        metricas.registrar_medidor("bot_estados_pendentes", total_pendentes, "Ativos com estado aguardando o write-behind")
+        metricas.registrar_medidor("bot_ativos_monitorados", lambda: len(ESTADO["ativos_ativos"]))
+        motores.append(metricas.servidor_metricas())
+    try:
+        await asyncio.gather(*motores)
+    finally:
+        if GRAVADOR is not None:
+            GRAVADOR.fechar()
+        pool.fechar()
+        fechar_conexao()
+        loja.fechar()
+        if loja.exchange is not None:
+            await loja.exchange.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import sqlite3
+
+import modules.stream as stream
+from modules.database import DB_NAME
+
+# Intervalo do leitor único (checagem do PRAGMA data_version + envio de preços)
+INTERVALO_LEITOR = 0.25
+# Mensagens acumuladas por cliente antes de considerá-lo lento e desconectar
+FILA_POR_CLIENTE = 100
+
+class TransmissorEstado:
+    """
+    Leitor único do estado do bot com fan-out para todos os clientes conectados.
+
+    Uma única tarefa consulta o banco só quando o PRAGMA data_version muda
+    (houve commit de outra conexão) e calcula diffs de memoria_bot, status_ia
+    e dos trades novos. Os preços ao vivo vêm de uma assinatura miniTicker
+    própria na Binance para as moedas de status_ia. Cada cliente recebe um
+    snapshot ao conectar e depois só os diffs.
+    """
+
+    def __init__(self, caminho=DB_NAME):
+        self.caminho = caminho
+        self.conn = None
+        self.clientes = set()
+        self.tarefa = None
+        self.tarefa_precos = None
+        self.symbols_precos = set()
+        self.versao = None
+        self.posicoes = {}
+        self.status_ia = {}
+        self.ultimo_trade_id = None
+        self.precos = {}
+        self.precos_alterados = {}
+
+    # --- Leitura do banco (roda numa thread) ---
+
+    def _linhas(self, sql, params=()):
+        cursor = self.conn.execute(sql, params)
+        colunas = [c[0] for c in cursor.description]
+        return [dict(zip(colunas, row)) for row in cursor.fetchall()]
+
+    def _ler_banco(self):
+        """Retorna (posicoes, status_ia, trades_novos) ou None se nada mudou"""
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.caminho, check_same_thread=False)
+        versao = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if versao == self.versao:
+            return None
+        self.versao = versao
+
+        posicoes = {r["symbol"]: r for r in self._linhas("SELECT * FROM memoria_bot")}
+        status = {r["symbol"]: r for r in self._linhas("SELECT symbol, rsi, potencial, decisao, timestamp FROM status_ia")}
+        if self.ultimo_trade_id is None:
+            # Primeira leitura: só marca onde o histórico termina
+            row = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM trades").fetchone()
+            self.ultimo_trade_id = row[0]
+            trades = []
+        else:
+            trades = self._linhas("SELECT * FROM trades WHERE id > ? ORDER BY id", (self.ultimo_trade_id,))
+            if trades:
+                self.ultimo_trade_id = trades[-1]["id"]
+        return posicoes, status, trades
+
+    # --- Diffs e fan-out ---
+
+    @staticmethod
+    def _diff(antigo, novo):
+        alterados = {k: v for k, v in novo.items() if antigo.get(k) != v}
+        removidos = [k for k in antigo if k not in novo]
+        return alterados, removidos
+
+    def snapshot(self):
+        return {
+            "tipo": "snapshot",
+            "posicoes": self.posicoes,
+            "status_ia": self.status_ia,
+            "precos": self.precos,
+        }
+
+    def _publicar(self, mensagem):
+        texto = json.dumps(mensagem, default=str)
+        for fila in list(self.clientes):
+            try:
+                fila.put_nowait(texto)
+            except asyncio.QueueFull:
+                # Cliente lento: desconecta; ao reconectar ele recebe um snapshot novo
+                self.clientes.discard(fila)
+                logging.error("Cliente do /stream lento demais: desconectado")
+
+    async def _leitor(self):
+        # Roda enquanto houver cliente conectado; o próximo cliente o reinicia
+        self._atualizar_precos(set(self.status_ia))
+        while self.clientes:
+            try:
+                lido = await asyncio.to_thread(self._ler_banco)
+                diff = {"tipo": "diff"}
+                if lido:
+                    posicoes, status, trades = lido
+                    alt, rem = self._diff(self.posicoes, posicoes)
+                    if alt or rem:
+                        diff["posicoes"], diff["posicoes_removidas"] = alt, rem
+                    alt, rem = self._diff(self.status_ia, status)
+                    if alt or rem:
+                        diff["status_ia"], diff["status_removidos"] = alt, rem
+                        self._atualizar_precos(set(status))
+                    if trades:
+                        diff["trades"] = trades
+                    self.posicoes, self.status_ia = posicoes, status
+
+                if self.precos_alterados:
+                    diff["precos"], self.precos_alterados = self.precos_alterados, {}
+
+                if len(diff) > 1:
+                    self._publicar(diff)
+            except Exception as e:
+                logging.error(f"Erro no leitor do /stream: {e}")
+            await asyncio.sleep(INTERVALO_LEITOR)
+        self._atualizar_precos(set())
+
+    # --- Preços ao vivo ---
+
+    def _atualizar_precos(self, symbols):
+        """(Re)assina o miniTicker quando muda o conjunto de moedas monitoradas"""
+        if self.tarefa_precos is not None and self.symbols_precos == symbols:
+            return
+        if self.tarefa_precos is not None:
+            self.tarefa_precos.cancel()
+            self.tarefa_precos = None
+        self.symbols_precos = symbols
+        if not symbols:
+            return
+
+        indice = stream.montar_indice(sorted(symbols))
+
+        async def ao_receber(data):
+            msg = json.loads(data)
+            sym = indice.get(msg.get("s"))
+            if sym is not None:
+                preco = float(msg["c"])
+                self.precos[sym] = preco
+                self.precos_alterados[sym] = preco
+
+        self.tarefa_precos = asyncio.create_task(
+            stream.rodar_shard(stream.nomes_streams(sorted(symbols), ("miniTicker",)), ao_receber, nome="api-precos")
+        )
+
+    # --- Clientes ---
+
+    def conectar(self):
+        """Registra um cliente e devolve sua fila (já com o snapshot atual)"""
+        fila = asyncio.Queue(maxsize=FILA_POR_CLIENTE)
+        fila.put_nowait(json.dumps(self.snapshot(), default=str))
+        self.clientes.add(fila)
+        if self.tarefa is None or self.tarefa.done():
+            self.tarefa = asyncio.create_task(self._leitor())
+        return fila
+
+    def desconectar(self, fila):
+        self.clientes.discard(fila)
+
+    async def eventos(self, fila):
+        """Gerador SSE de um cliente: snapshot, diffs e um keep-alive a cada 15s"""
+        try:
+            while True:
+                if fila not in self.clientes and fila.empty():
+                    return
+                try:
+                    texto = await asyncio.wait_for(fila.get(), timeout=15)
+                    yield f"data: {texto}\n\n"
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            self.desconectar(fila)
@@ -1,6 +1,193 @@
-import pandas as pd
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import modules.brain as brain
-import random
+import modules.reamostragem as reamostragem
+import modules.simulador as simulador
+from modules.executor import iniciar_worker
+from sklearn.ensemble import RandomForestClassifier
+
+# Agenda de re-treino do walk-forward:
+# - BACKTEST_REFIT_CADA: re-treina a cada N candles (1 = um modelo por candle, como antes)
+# - BACKTEST_WARM_START: em vez de um modelo novo, acrescenta árvores ao anterior
+#   treinadas sobre a janela expandida
+BACKTEST_REFIT_CADA = int(os.getenv('BACKTEST_REFIT_CADA', 10))
+BACKTEST_WARM_START = os.getenv('BACKTEST_WARM_START', 'false') == 'true'
+ARVORES_POR_REFIT = 10
+
+# Calibração paralela: processos para os backtests e downloads simultâneos
+CALIBRACAO_WORKERS = int(os.getenv('CALIBRACAO_WORKERS', os.cpu_count() or 1))
+CALIBRACAO_DOWNLOADS = int(os.getenv('CALIBRACAO_DOWNLOADS', 5))
+# Simulação da estratégia completa sobre candles de 1m da janela de teste
+# (false = volta ao win rate do walk-forward, sem baixar o 1m)
+CALIBRACAO_SIMULADOR = os.getenv('CALIBRACAO_SIMULADOR', 'true') == 'true'
+MIN_SCORES_CALIBRACAO = (5, 6, 7, 8)
+
+def scores_walk_forward(candles_15m, janela_teste=100, refit_cada=None, warm_start=None, modelo=None, symbol=None):
+    """
+    Scores walk-forward vetorizados.
+
+    Calcula as features uma única vez sobre toda a série (os indicadores são
+    causais, então a linha i é a mesma que seria obtida recortando candles[:i+1])
+    e treina um modelo por bloco de 'refit_cada' candles, prevendo o bloco
+    inteiro de uma vez. Só usa dados anteriores ao início do bloco no treino.
+
+    Com 'symbol', as features vêm do FeatureStore do brain (as mesmas do
+    estrategista ao vivo, reaproveitadas entre calibrações).
+
+    'modelo' escolhe o backend de brain.MODELOS. Backends incrementais
+    continuam do modelo do bloco anterior com as linhas novas; o warm start
+    (árvores extras) só vale para a floresta.
+
+    Retorna (posicoes, scores): a posição de cada candle testado na lista de
+    candles e o score da IA (mesma regra do brain) no fechamento dele.
+    """
+    modelo = modelo or brain.MODELO_PADRAO
+    if refit_cada is None:
+        refit_cada = BACKTEST_REFIT_CADA
+    if warm_start is None:
+        warm_start = BACKTEST_WARM_START
+    refit_cada = max(1, refit_cada)
+
+    if symbol:
+        df = brain.preparar_dados_incremental(symbol, candles_15m)
+    else:
+        df = brain.preparar_dados(candles_15m)
+
+    X_total = df[brain.FEATURES].to_numpy()
+    rsi_total = df['RSI'].to_numpy()
+    indices = df.index.to_numpy()  # posição de cada linha na lista de candles
+
+    # Alvo: o próximo fechamento é maior que o atual?
+    y_total = (df['close'].shift(-1) > df['close']).astype(int).to_numpy()
+
+    # Candles testados: os últimos 'janela_teste', exceto o último (sem futuro)
+    inicio = len(candles_15m) - janela_teste
+    linhas_teste = np.nonzero((indices >= inicio) & (indices < len(candles_15m) - 1))[0]
+
+    posicoes = []
+    scores = []
+    model = None
+    treinado_ate = 0
+
+    for b in range(0, len(linhas_teste), refit_cada):
+        bloco = linhas_teste[b:b + refit_cada]
+        primeira = bloco[0]
+
+        # Mesmo mínimo de treino de brain.treinar_e_prever
+        if primeira < 50:
+            continue
+
+        X_treino, y_treino = X_total[:primeira], y_total[:primeira]
+        if modelo == "floresta" and warm_start:
+            if model is None:
+                model = RandomForestClassifier(
+                    n_estimators=100, min_samples_split=5, random_state=42,
+                    n_jobs=brain.N_JOBS_MODELO, warm_start=True
+                )
+            else:
+                model.n_estimators += ARVORES_POR_REFIT
+            model.fit(X_treino, y_treino)
+        else:
+            model = brain.treinar_modelo(
+                modelo, X_treino, y_treino, model,
+                X_total[treinado_ate:primeira], y_total[treinado_ate:primeira]
+            )
+        treinado_ate = primeira
+
+        # --- Previsão do bloco inteiro ---
+        prob = model.predict_proba(X_total[bloco])
+        prob_alta = prob[:, list(model.classes_).index(1)] if 1 in model.classes_ else np.zeros(len(bloco))
+
+        score = np.round(prob_alta * 10, 1)
+        score = np.where((rsi_total[bloco] > 75) & (score > 6), score - 2, score)
+
+        posicoes.append(indices[bloco])
+        scores.append(score)
+
+    if not posicoes:
+        return np.empty(0, dtype=int), np.empty(0)
+    return np.concatenate(posicoes), np.concatenate(scores)
+
+def walk_forward(candles_15m, janela_teste=100, refit_cada=None, warm_start=None, min_score=6, modelo=None):
+    """
+    Backtest walk-forward vetorizado (ver scores_walk_forward).
+
+    Retorna (acertos, total_sinais) com a mesma definição do loop antigo:
+    sinal = decisão COMPRA; acerto = fechamento seguinte maior que o atual.
+    """
+    posicoes, scores = scores_walk_forward(candles_15m, janela_teste, refit_cada, warm_start, modelo)
+    return contar_acertos(candles_15m, posicoes, scores, min_score)
+
+def contar_acertos(candles_15m, posicoes, scores, min_score=6):
+    closes = np.array([c[4] for c in candles_15m], dtype=float)
+    compra = scores >= min_score
+    subiu = closes[posicoes + 1] > closes[posicoes]
+    return int((compra & subiu).sum()), int(compra.sum())
+
+def calcular_calibracao(symbol, candles_15m, janela_teste=100, candles_1m=None, perfil=None):
+    """
+    Parte de CPU da calibração (sem rede): roda o walk-forward e calcula o score.
+    Retorna (config, score_final, segundos gastos).
+
+    Com 'candles_1m' (cobrindo a janela de teste), os scores do walk-forward
+    alimentam o simulador da estratégia completa (compra, stop loss e trailing
+    de todos os PERFIS com alguns min_score) e o score final passa a ser o
+    lucro (%) da melhor configuração do 'perfil' (ou de qualquer perfil).
+    """
+    inicio = time.perf_counter()
+
+    # Testamos a IA em janelas deslizantes (Backtest Walk-Forward)
+    # Ignoramos os primeiros 400 candles (usados para treino inicial) e testamos nos últimos 100
+    start_index = len(candles_15m) - janela_teste
+
+    if start_index < 50:
+        return {}, 0.0, time.perf_counter() - inicio # Dados insuficientes mesmo com 500
+
+    # O bot ao vivo usa o mesmo backend que foi calibrado (config['modelo'])
+    modelo = brain.MODELO_PADRAO
+    posicoes, scores = scores_walk_forward(candles_15m, janela_teste=janela_teste, modelo=modelo, symbol=symbol)
+
+    if candles_1m:
+        por_minuto = simulador.scores_por_minuto(candles_1m, candles_15m, posicoes, scores)
+        resultados = simulador.simular_grade(candles_1m, por_minuto, simulador.grade_perfis(MIN_SCORES_CALIBRACAO), workers=1)
+        melhor = simulador.melhor_config(resultados, perfil) or simulador.melhor_config(resultados)
+
+        print(f"   > {symbol}: PnL {melhor['pnl_pct']:+.2f}% | DD {melhor['max_drawdown_pct']:.2f}% | "
+              f"{melhor['trades']} trades ({melhor['perfil']}, score >= {melhor['min_score']})")
+
+        config = {
+            'min_score': melhor['min_score'], 'perfil': melhor['perfil'], 'modelo': modelo,
+            'pnl_pct': melhor['pnl_pct'], 'max_drawdown_pct': melhor['max_drawdown_pct'], 'trades': melhor['trades']
+        }
+        return config, melhor['pnl_pct'], time.perf_counter() - inicio
+
+    acertos, total_sinais = contar_acertos(candles_15m, posicoes, scores)
+
+    # Cálculo do "Win Rate" (Taxa de Acerto) da IA
+    win_rate = (acertos / total_sinais * 100) if total_sinais > 0 else 0
+
+    # Se a IA acertou mais de 50% das vezes, consideramos o ativo "Operável"
+    score_final = win_rate if total_sinais >= 3 else 0
+
+    print(f"   > {symbol}: Win Rate {win_rate:.1f}% ({total_sinais} sinais)")
+
+    return {'min_score': 6, 'modelo': modelo}, score_final, time.perf_counter() - inicio
+
+async def baixar_periodo(exchange, symbol, timeframe, since, limite_por_pagina=1000):
+    """Todos os candles desde 'since' (ms), paginando o fetch_ohlcv"""
+    candles = []
+    while True:
+        pagina = await exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=limite_por_pagina)
+        pagina = [c for c in pagina if not candles or c[0] > candles[-1][0]]
+        if not pagina:
+            return candles
+        candles.extend(pagina)
+        since = candles[-1][0] + 1
 
 async def otimizar_estrategia(exchange, symbol):
     """
@@ -10,49 +197,75 @@ async def otimizar_estrategia(exchange, symbol):
     try:
         # --- AQUI ESTÁ A CORREÇÃO CRÍTICA ---
         # Aumentamos o limite para 500 para a IA ter dados suficientes para treinar
-        candles_1m = await exchange.fetch_ohlcv(symbol, timeframe='1m', limit=500)
         candles_15m = await exchange.fetch_ohlcv(symbol, timeframe='15m', limit=500)
-        
-        # Simulação rápida: Vamos pegar os últimos 50 candles e ver se a IA teria acertado
-        acertos = 0
-        total_sinais = 0
-        
-        # Testamos a IA em janelas deslizantes (Backtest Walk-Forward)
-        # Ignoramos os primeiros 400 candles (usados para treino inicial) e testamos nos últimos 100
-        janela_teste = 100
-        start_index = len(candles_15m) - janela_teste
-        
-        if start_index < 50:
-            return {}, 0.0 # Dados insuficientes mesmo com 500
-            
-        # Simula o passado recente
-        for i in range(start_index, len(candles_15m)-1):
-            # Recorta os dados até o momento 'i' (simulando tempo real)
-            fatia_15m = candles_15m[:i+1]
-            fatia_1m = candles_1m[:i*15+1] # Aproximação grosseira para 1m
-            
-            # Pergunta para o cérebro
-            analise = brain.analisar_multitimeframe(fatia_1m, fatia_15m)
-            
-            if analise['decisao'] == "COMPRA":
-                total_sinais += 1
-                # Verifica se no candle seguinte o preço subiu
-                preco_compra = fatia_15m[-1][4] # Fechamento atual
-                preco_futuro = candles_15m[i+1][4] # Fechamento seguinte
-                
-                if preco_futuro > preco_compra:
-                    acertos += 1
-
-        # Cálculo do "Win Rate" (Taxa de Acerto) da IA
-        win_rate = (acertos / total_sinais * 100) if total_sinais > 0 else 0
-        
-        # Se a IA acertou mais de 50% das vezes, consideramos o ativo "Operável"
-        score_final = win_rate if total_sinais >= 3 else 0
-        
-        print(f"   > {symbol}: Win Rate {win_rate:.1f}% ({total_sinais} sinais)")
-        
-        return {'min_score': 6}, score_final
+        config, score_final, _ = calcular_calibracao(symbol, candles_15m)
+        return config, score_final
 
     except Exception as e:
         print(f"Erro Backtest {symbol}: {e}")
-        return {}, 0.0
\ No newline at end of file
+        return {}, 0.0
+
+async def calibrar_candidatos(exchange, symbols, workers=None, downloads_simultaneos=None, perfil=None, reamostrar=False):
+    """
+    Calibra todos os candidatos em paralelo: os downloads de OHLCV rodam juntos
+    (limitados por um semáforo, o rate limit do ccxt continua valendo) e cada
+    backtest vai para um pool de processos assim que seus candles chegam.
+    Com CALIBRACAO_SIMULADOR, baixa também o 1m da janela de teste e escolhe
+    a configuração do 'perfil' pelo simulador.
+    Com 'reamostrar' (exchange = CandleStore com buffer de 1m longo), só o 1m
+    é baixado: o 15m é derivado dele por timestamp e o buffer já fica pronto
+    para o estrategista.
+    Retorna [(symbol, config, score)] na ordem de 'symbols'.
+    """
+    if workers is None:
+        workers = CALIBRACAO_WORKERS
+    if downloads_simultaneos is None:
+        downloads_simultaneos = CALIBRACAO_DOWNLOADS
+    semaforo = asyncio.Semaphore(max(1, downloads_simultaneos))
+    loop = asyncio.get_running_loop()
+    total = len(symbols)
+    concluidos = 0
+
+    pool = ProcessPoolExecutor(
+        max_workers=max(1, workers),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=iniciar_worker
+    )
+
+    async def calibrar(symbol):
+        nonlocal concluidos
+        try:
+            inicio = time.perf_counter()
+            async with semaforo:
+                if reamostrar:
+                    candles_1m = await exchange.fetch_ohlcv(symbol, timeframe='1m')
+                    candles_15m = reamostragem.reamostrar(candles_1m, '15m')[-500:]
+                else:
+                    candles_15m = await exchange.fetch_ohlcv(symbol, timeframe='15m', limit=500)
+                    candles_1m = None
+                if not CALIBRACAO_SIMULADOR or len(candles_15m) <= 100:
+                    candles_1m = None
+                elif candles_1m:
+                    # Só a janela de teste vai para o simulador
+                    inicio_teste = np.searchsorted([c[0] for c in candles_1m], candles_15m[-100][0])
+                    candles_1m = candles_1m[inicio_teste:]
+                else:
+                    candles_1m = await baixar_periodo(exchange, symbol, '1m', candles_15m[-100][0])
+            tempo_download = time.perf_counter() - inicio
+
+            config, score, tempo_backtest = await loop.run_in_executor(
+                pool, calcular_calibracao, symbol, candles_15m, 100, candles_1m, perfil
+            )
+        except Exception as e:
+            print(f"Erro Backtest {symbol}: {e}")
+            logging.error(f"Erro Backtest {symbol}: {e}")
+            config, score, tempo_download, tempo_backtest = {}, 0.0, 0.0, 0.0
+
+        concluidos += 1
+        print(f"   [{concluidos}/{total}] {symbol}: download {tempo_download:.1f}s | backtest {tempo_backtest:.1f}s")
+        return symbol, config, score
+
+    try:
+        return await asyncio.gather(*(calibrar(sym) for sym in symbols))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -1,9 +1,121 @@
+import os
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 from ta.momentum import RSIIndicator
 from ta.trend import MACD
 from ta.volatility import AverageTrueRange, BollingerBands
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
+from threadpoolctl import ThreadpoolController
+from modules.features import FeatureStore
+from modules.reamostragem import ultimo_fechado
+import modules.metricas as metricas
+
+# Features usadas pelo modelo (mesmas colunas geradas por preparar_dados)
+FEATURES = ['RSI', 'ATR', 'BBP', 'MACD_line', 'MACD_signal', 'MACD_hist']
+
+# Indicadores por (symbol, timeframe, candle), compartilhados entre o
+# estrategista ao vivo e a calibração (criado no primeiro uso, por processo)
+FEATURE_STORE = None
+
+# Cache de modelos treinados: symbol -> (timestamp do último candle fechado, backend, modelo)
+# Em ordem de uso (LRU); o mais antigo é descartado ao passar do limite
+MAX_MODELOS_CACHE = int(os.getenv('MAX_MODELOS_CACHE', 64))
+CACHE_MODELOS = OrderedDict()
+
+# Threads usadas pelo RandomForest (-1 = todos os núcleos). Os workers do
+# pool de análise (modules/executor.py) forçam 1 para não disputar núcleos.
+N_JOBS_MODELO = int(os.getenv('ML_N_JOBS', -1))
+
+# Backend do modelo quando a config do ativo não escolhe um (config['modelo'])
+MODELO_PADRAO = os.getenv('ML_MODELO', 'floresta')
+
+class ModeloOnline:
+    """
+    Regressão logística treinada por SGD, atualizada com partial_fit: a cada
+    candle fechado só as linhas novas passam pelo modelo (custo O(novas)).
+    As features são padronizadas por um StandardScaler também incremental.
+    """
+
+    def __init__(self, epocas_iniciais=5):
+        self.epocas_iniciais = epocas_iniciais
+        self.scaler = StandardScaler()
+        self.sgd = SGDClassifier(loss='log_loss', alpha=1e-3, random_state=42)
+
+    @property
+    def classes_(self):
+        return self.sgd.classes_
+
+    def fit(self, X, y):
+        self.scaler.fit(X)
+        Xs = self.scaler.transform(X)
+        for _ in range(self.epocas_iniciais):
+            self.sgd.partial_fit(Xs, y, classes=[0, 1])
+        return self
+
+    def partial_fit(self, X, y):
+        self.scaler.partial_fit(X)
+        self.sgd.partial_fit(self.scaler.transform(X), y, classes=[0, 1])
+        return self
+
+    def predict_proba(self, X):
+        return self.sgd.predict_proba(self.scaler.transform(X))
+
+# Backends de modelo. 'incremental': com um modelo anterior, só as linhas
+# novas são aprendidas (partial_fit) em vez de re-treinar a janela toda.
+MODELOS = {
+    # Original: 100 árvores, todos os núcleos (ou ML_N_JOBS)
+    "floresta": {
+        "criar": lambda: RandomForestClassifier(n_estimators=100, min_samples_split=5, random_state=42, n_jobs=N_JOBS_MODELO),
+        "incremental": False,
+    },
+    # Floresta menor e rasa, sempre em 1 thread
+    "floresta_leve": {
+        "criar": lambda: RandomForestClassifier(n_estimators=15, max_depth=6, min_samples_split=5, random_state=42, n_jobs=1),
+        "incremental": False,
+    },
+    # Gradient boosting por histograma (features binadas, poucas iterações)
+    "hgb": {
+        "criar": lambda: HistGradientBoostingClassifier(max_iter=20, max_leaf_nodes=15, learning_rate=0.1, early_stopping=False, random_state=42),
+        "incremental": False,
+    },
+    # Logística online: re-treino completo só na primeira vez
+    "online": {
+        "criar": ModeloOnline,
+        "incremental": True,
+    },
+}
+
+NOMES_MODELOS = {"floresta": "Random Forest AI", "floresta_leve": "Random Forest Leve", "hgb": "Gradient Boosting AI", "online": "Online AI"}
+
+CONTROLE_THREADS = None
+
+def criar_modelo(nome=None):
+    return MODELOS[nome or MODELO_PADRAO]["criar"]()
+
+def treinar_modelo(nome, X, y, anterior=None, X_novos=None, y_novos=None):
+    """
+    Treina o backend 'nome'. Backends incrementais com um modelo 'anterior'
+    só aprendem as linhas novas (X_novos, y_novos); os demais treinam do zero.
+    O treino respeita N_JOBS_MODELO também no OpenMP, para o hgb não ocupar
+    todos os núcleos dentro dos workers.
+    """
+    global CONTROLE_THREADS
+    nome = nome or MODELO_PADRAO
+    if CONTROLE_THREADS is None:
+        # Inspecionar as bibliotecas nativas custa ms: faz uma vez só
+        CONTROLE_THREADS = ThreadpoolController()
+    limite = N_JOBS_MODELO if N_JOBS_MODELO > 0 else None
+    with CONTROLE_THREADS.limit(limits=limite, user_api='openmp'):
+        if anterior is not None and MODELOS[nome]["incremental"]:
+            if X_novos is not None and len(X_novos):
+                anterior.partial_fit(X_novos, y_novos)
+            return anterior
+        model = criar_modelo(nome)
+        model.fit(X, y)
+        return model
 
 def preparar_dados(candles):
     """
@@ -42,9 +154,36 @@ def preparar_dados(candles):
     df.dropna(inplace=True)
     return df
 
-def treinar_e_prever(df):
+def preparar_dados_incremental(symbol, candles, timeframe='15m'):
     """
-    Treina um modelo Random Forest com os dados recentes e prevê a direção do próximo candle.
+    Versão em streaming de preparar_dados: os indicadores saem do FeatureStore,
+    que só calcula os candles que ainda não conhece (ver modules/features.py).
+    """
+    global FEATURE_STORE
+    if FEATURE_STORE is None:
+        FEATURE_STORE = FeatureStore()
+    return FEATURE_STORE.dataframe(symbol, timeframe, candles)
+
+def _modelo_em_cache(symbol, chave, nome):
+    item = CACHE_MODELOS.get(symbol)
+    if item is None or item[0] != chave or item[1] != nome:
+        return None
+    CACHE_MODELOS.move_to_end(symbol)
+    return item[2]
+
+def _guardar_modelo(symbol, chave, nome, model):
+    CACHE_MODELOS[symbol] = (chave, nome, model)
+    CACHE_MODELOS.move_to_end(symbol)
+    while len(CACHE_MODELOS) > MAX_MODELOS_CACHE:
+        CACHE_MODELOS.popitem(last=False)
+
+def treinar_e_prever(df, symbol=None, modelo=None):
+    """
+    Treina um modelo (backend 'modelo' de MODELOS, padrão MODELO_PADRAO) com os dados
+    recentes e prevê a direção do próximo candle.
+    Com 'symbol' informado, o modelo fica em cache até o próximo candle fechar: entre
+    fechamentos só o predict_proba roda sobre o candle em formação. Backends
+    incrementais partem do modelo anterior e só aprendem os candles que fecharam.
     """
     try:
         # --- Definição do Alvo (Target) ---
@@ -58,41 +197,81 @@ def treinar_e_prever(df):
         dados_treino = df.iloc[:-1].copy()
 
         # Features: Usamos apenas os indicadores calculados
-        features = ['RSI', 'ATR', 'BBP', 'MACD_line', 'MACD_signal', 'MACD_hist'] 
+        features = FEATURES
         
         # Verifica se temos dados suficientes para treino
         if len(dados_treino) < 50:
             return 0.5, "Dados insuficientes"
 
-        X = dados_treino[features]
-        y = dados_treino['Target']
-        
-        # --- Treinamento ---
-        model = RandomForestClassifier(n_estimators=100, min_samples_split=5, random_state=42, n_jobs=-1)
-        model.fit(X, y)
+        # O modelo só muda quando fecha um candle novo (timestamp do último fechado)
+        nome = modelo or MODELO_PADRAO
+        chave = dados_treino['timestamp'].iloc[-1] if 'timestamp' in dados_treino else None
+        model = _modelo_em_cache(symbol, chave, nome) if symbol and chave is not None else None
+
+        if model is None:
+            X = dados_treino[features].to_numpy()
+            y = dados_treino['Target'].to_numpy()
+
+            # Incremental: continua do modelo anterior com as linhas fechadas depois dele
+            anterior = CACHE_MODELOS.get(symbol) if symbol and MODELOS[nome]["incremental"] else None
+            if anterior is not None and anterior[1] == nome and anterior[0] in set(dados_treino['timestamp']):
+                novas = (dados_treino['timestamp'] > anterior[0]).to_numpy()
+                model = treinar_modelo(nome, X, y, anterior[2], X[novas], y[novas])
+            else:
+                # --- Treinamento ---
+                model = treinar_modelo(nome, X, y)
+
+            if symbol and chave is not None:
+                _guardar_modelo(symbol, chave, nome, model)
         
         # --- Previsão ---
         # Probabilidade de ser classe 1 (Alta)
-        probabilidade_alta = model.predict_proba(candle_atual[features])[0][1]
+        prob = model.predict_proba(candle_atual[features].to_numpy())[0]
+        probabilidade_alta = prob[list(model.classes_).index(1)] if 1 in model.classes_ else 0.0
         
-        return probabilidade_alta, "Random Forest AI"
+        return probabilidade_alta, NOMES_MODELOS.get(nome, nome)
 
     except Exception as e:
         print(f"Erro ML: {e}")
         return 0.5, "Erro ML"
 
-def analisar_multitimeframe(candles_1m, candles_15m, config=None):
+def tendencia_superior(superiores, instante, symbol=None):
+    """
+    Tendência (sinal do histograma MACD) no último candle de cada timeframe
+    maior já fechado em 'instante' (ms), ex: "1h ALTA | 4h BAIXA". None se
+    nenhum tiver histórico.
+    """
+    tendencias = []
+    for tf, candles in superiores.items():
+        if not candles:
+            continue
+        posicao = ultimo_fechado([c[0] for c in candles], tf, [instante])[0]
+        df = preparar_dados_incremental(symbol, candles, tf) if symbol else preparar_dados(candles)
+        # O índice do DataFrame é a posição na lista de candles
+        if posicao in df.index:
+            tendencias.append(f"{tf} {'ALTA' if df.at[posicao, 'MACD_hist'] > 0 else 'BAIXA'}")
+    return " | ".join(tendencias) or None
+
+def analisar_multitimeframe(candles_1m, candles_15m, config=None, symbol=None, superiores=None):
     """
     Substitui a lógica antiga de If/Else por uma análise baseada em Probabilidade (Machine Learning).
+    Com 'symbol' informado, os indicadores são atualizados de forma incremental.
+    'superiores' ({timeframe: candles}, derivados do 1m) entra só como contexto
+    (tendencia_macro), sem mudar o score.
     """
     if config is None:
         config = {'min_score': 6}
 
     # Usamos o timeframe de 15m para a IA (menos ruído)
-    df_15m = preparar_dados(candles_15m)
+    with metricas.medir("bot_preparar_dados_segundos", 'modo="incremental"' if symbol else 'modo="completo"'):
+        if symbol:
+            df_15m = preparar_dados_incremental(symbol, candles_15m)
+        else:
+            df_15m = preparar_dados(candles_15m)
     
     # Chama o cérebro de ML
-    probabilidade, motivo_ia = treinar_e_prever(df_15m)
+    with metricas.medir("bot_treinar_e_prever_segundos"):
+        probabilidade, motivo_ia = treinar_e_prever(df_15m, symbol=symbol, modelo=config.get('modelo'))
     
     # Converte probabilidade (0.0 a 1.0) para Score (0 a 10)
     score = round(probabilidade * 10, 1)
@@ -107,6 +286,12 @@ def analisar_multitimeframe(candles_1m, candles_15m, config=None):
         score -= 2
         motivos.append("Penalidade: RSI Esticado (>75)")
         
+    tendencia_macro = "IA-Driven"
+    if superiores:
+        # Decisão tomada na abertura do 15m em formação: só 1h/4h fechados até ali
+        tendencia_macro = tendencia_superior(superiores, candles_15m[-1][0], symbol) or tendencia_macro
+        motivos.append(f"Tendência: {tendencia_macro}")
+
     # Decisão Final
     min_score = config.get('min_score', 6)
     decisao = "COMPRA" if score >= min_score else "AGUARDAR"
@@ -115,6 +300,6 @@ def analisar_multitimeframe(candles_1m, candles_15m, config=None):
         "score": score,
         "decisao": decisao,
         "rsi": round(rsi_atual, 2),
-        "tendencia_macro": "IA-Driven",
+        "tendencia_macro": tendencia_macro,
         "motivos": motivos
     }
\ No newline at end of file
@@ -0,0 +1,277 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+import modules.metricas as metricas
+
+# Arquivo separado do trades.db para não disputar lock com trades/estado
+CANDLES_DB = os.getenv('CANDLES_DB', 'candles.db')
+# Quantos candles por (symbol, timeframe) ficam guardados em disco
+RETENCAO_CANDLES = int(os.getenv('RETENCAO_CANDLES', 5000))
+
+# Máximo de candles por chamada REST da Binance (acima disso, pagina)
+LIMITE_POR_PEDIDO = 1000
+# Intervalo do write-behind dos klines fechados do websocket (segundos)
+INTERVALO_ESCRITA_CANDLES = 1.0
+
+UNIDADES_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+
+def duracao_ms(timeframe):
+    """'15m' -> 900000"""
+    return int(timeframe[:-1]) * UNIDADES_MS[timeframe[-1]]
+
+class CandleStore:
+    """
+    Cache local de OHLCV: SQLite em disco + um ring buffer em memória por
+    (symbol, timeframe).
+
+    Tem a mesma assinatura de exchange.fetch_ohlcv, então pode ser passado no
+    lugar da exchange para o estrategista e para a calibração. Na primeira
+    leitura de uma série carrega o que já existe no disco; depois disso só
+    pede à exchange os candles a partir do último timestamp conhecido (o
+    candle em formação e os que fecharam desde a chamada anterior).
+    Timeframes que ninguém pede nunca são baixados.
+
+    Séries alimentadas pelo websocket (atualizar_kline) ficam "sincronizadas"
+    enquanto os klines chegam em sequência; nesse estado a leitura sai direto
+    da memória, sem REST. Um buraco na sequência volta a série para o REST,
+    que faz o backfill a partir do último candle conhecido.
+
+    Pedidos com 'since' anterior ao início do buffer passam direto para a
+    exchange (e vão para o disco), sem mexer no buffer.
+
+    'tamanhos' muda o tamanho do buffer de timeframes específicos (ex: um 1m
+    longo para derivar 15m/1h/4h com fetch_reamostrado); downloads maiores
+    que LIMITE_POR_PEDIDO são paginados.
+
+    Klines fechados vão para o disco por write-behind (escritor_adiado): a
+    virada de minuto de todos os pares vira um único commit numa thread.
+    """
+
+    def __init__(self, exchange, caminho=CANDLES_DB, tamanho=500, tamanhos=None):
+        self.exchange = exchange
+        self.tamanho = tamanho
+        self.tamanhos = tamanhos or {}
+        self.buffers = {}
+        self.sincronizado = {}
+        self.reamostrados = {}  # (symbol, timeframe) -> (candles fechados, abertura do em formação)
+        # Klines fechados esperando o escritor_adiado: (symbol, timeframe, ts) -> candle
+        self.pendentes = {}
+        self._lock_pendentes = threading.Lock()
+        # A conexão é usada pelo loop (REST) e pela thread do write-behind
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(caminho, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS candles (
+                symbol TEXT,
+                timeframe TEXT,
+                timestamp INTEGER,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume REAL,
+                PRIMARY KEY (symbol, timeframe, timestamp)
+            ) WITHOUT ROWID
+        ''')
+        self.conn.commit()
+
+    def tamanho_de(self, timeframe):
+        return self.tamanhos.get(timeframe, self.tamanho)
+
+    def _carregar_do_disco(self, symbol, timeframe):
+        tamanho = self.tamanho_de(timeframe)
+        with self._lock:
+            # Aproveita a abertura da série para aplicar a retenção
+            self.conn.execute('''
+                DELETE FROM candles WHERE symbol=? AND timeframe=? AND timestamp < (
+                    SELECT timestamp FROM candles WHERE symbol=? AND timeframe=?
+                    ORDER BY timestamp DESC LIMIT 1 OFFSET ?
+                )
+            ''', (symbol, timeframe, symbol, timeframe, max(RETENCAO_CANDLES, tamanho) - 1))
+            self.conn.commit()
+
+            rows = self.conn.execute('''
+                SELECT timestamp, open, high, low, close, volume FROM candles
+                WHERE symbol=? AND timeframe=? ORDER BY timestamp DESC LIMIT ?
+            ''', (symbol, timeframe, tamanho)).fetchall()
+            return deque((list(r) for r in reversed(rows)), maxlen=tamanho)
+
+    def _gravar(self, symbol, timeframe, candles):
+        self._gravar_linhas([(symbol, timeframe, *c[:6]) for c in candles])
+
+    def _gravar_linhas(self, linhas):
+        with self._lock:
+            self.conn.executemany("INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?)", linhas)
+            self.conn.commit()
+
+    def descarregar_pendentes(self):
+        """Grava numa transação os klines fechados acumulados pelo websocket"""
+        with self._lock_pendentes:
+            if not self.pendentes:
+                return
+            linhas = [(*chave[:2], *candle[:6]) for chave, candle in self.pendentes.items()]
+            self.pendentes = {}
+        self._gravar_linhas(linhas)
+
+    async def escritor_adiado(self, intervalo=INTERVALO_ESCRITA_CANDLES):
+        """Tarefa de fundo: descarrega os klines fechados fora do event loop a cada intervalo"""
+        while True:
+            await asyncio.sleep(intervalo)
+            if self.pendentes:
+                try:
+                    await asyncio.to_thread(self.descarregar_pendentes)
+                except Exception as e:
+                    print(f"⚠️ Erro ao gravar candles pendentes: {e}")
+
+    def _mesclar(self, buffer, candles):
+        """Acrescenta candles novos e substitui o último se ele foi revisado"""
+        for candle in candles:
+            if buffer and candle[0] < buffer[-1][0]:
+                continue
+            if buffer and candle[0] == buffer[-1][0]:
+                buffer[-1] = list(candle)
+            else:
+                buffer.append(list(candle))
+
+    def atualizar_kline(self, symbol, timeframe, candle, fechado):
+        """
+        Aplica um kline do websocket ao buffer em memória (custo O(1)).
+        Candles fechados entram no write-behind do disco (escritor_adiado).
+        """
+        chave = (symbol, timeframe)
+        buffer = self.buffers.get(chave)
+        if not buffer:
+            # Ainda sem histórico: o primeiro fetch_ohlcv faz o backfill via REST
+            return
+
+        ultimo_ts = buffer[-1][0]
+        if candle[0] < ultimo_ts:
+            return
+        if candle[0] > ultimo_ts + duracao_ms(timeframe):
+            # Buraco (ex: reconexão): deixa o REST completar o que faltou
+            self.sincronizado[chave] = False
+            return
+
+        self._mesclar(buffer, [candle])
+        self.sincronizado[chave] = True
+        if fechado:
+            with self._lock_pendentes:
+                self.pendentes[(symbol, timeframe, candle[0])] = candle
+
+    def dessincronizar(self, symbols=None):
+        """Chamado quando o websocket cai: as próximas leituras voltam ao REST"""
+        if symbols is None:
+            self.sincronizado.clear()
+            return
+        for chave in list(self.sincronizado):
+            if chave[0] in symbols:
+                self.sincronizado[chave] = False
+
+    async def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None):
+        chave = (symbol, timeframe)
+        buffer = self.buffers.get(chave)
+        if buffer is None:
+            buffer = self.buffers[chave] = self._carregar_do_disco(symbol, timeframe)
+
+        if since is not None and (not buffer or since < buffer[0][0]):
+            # Histórico mais antigo que o buffer (ex: 1m do simulador da
+            # calibração): vai direto à exchange e só guarda em disco
+            metricas.contar("bot_candles_leituras_total", rotulos='origem="rest"')
+            with metricas.medir("bot_fetch_ohlcv_segundos", f'timeframe="{timeframe}"'):
+                novos = await self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=limit)
+            if novos:
+                self._gravar(symbol, timeframe, novos)
+            return novos
+
+        tamanho = self.tamanho_de(timeframe)
+        limit = min(limit or tamanho, tamanho)
+
+        if self.sincronizado.get(chave) and buffer:
+            metricas.contar("bot_candles_leituras_total", rotulos='origem="memoria"')
+            return self._recortar(buffer, since, limit)
+        metricas.contar("bot_candles_leituras_total", rotulos='origem="rest"')
+
+        agora_ms = int(time.time() * 1000)
+        ultimo_ts = buffer[-1][0] if buffer else None
+        atrasados = (agora_ms - ultimo_ts) // duracao_ms(timeframe) if ultimo_ts else None
+
+        with metricas.medir("bot_fetch_ohlcv_segundos", f'timeframe="{timeframe}"'):
+            if ultimo_ts is None or atrasados >= tamanho:
+                # Sem histórico útil: baixa a janela inteira e recomeça o buffer
+                if tamanho > LIMITE_POR_PEDIDO:
+                    novos = await self._baixar_paginado(symbol, timeframe, agora_ms - (tamanho - 1) * duracao_ms(timeframe))
+                else:
+                    novos = await self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=tamanho)
+                buffer.clear()
+            elif atrasados + 2 > LIMITE_POR_PEDIDO:
+                novos = await self._baixar_paginado(symbol, timeframe, ultimo_ts)
+            else:
+                # Incremental: só o candle em formação e os que fecharam depois dele
+                novos = await self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=ultimo_ts, limit=atrasados + 2)
+
+        if novos:
+            self._mesclar(buffer, novos)
+            self._gravar(symbol, timeframe, novos)
+
+        return self._recortar(buffer, since, limit)
+
+    async def _baixar_paginado(self, symbol, timeframe, since):
+        candles = []
+        while True:
+            pagina = await self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since, limit=LIMITE_POR_PEDIDO)
+            pagina = [c for c in pagina if not candles or c[0] > candles[-1][0]]
+            if not pagina:
+                return candles
+            candles.extend(pagina)
+            if len(pagina) < LIMITE_POR_PEDIDO:
+                return candles
+            since = candles[-1][0] + 1
+
+    async def fetch_reamostrado(self, symbol, timeframes, limit=None):
+        """
+        {timeframe: candles} derivados do buffer de 1m (modules/reamostragem.py),
+        sem baixar nem assinar os timeframes maiores. 'limit' corta cada série.
+
+        Os candles maiores já fechados ficam guardados: a cada chamada só o
+        trecho do 1m a partir do candle em formação é reagregado.
+        """
+        from modules.reamostragem import reamostrar  # reamostragem importa este módulo
+        await self.fetch_ohlcv(symbol, timeframe='1m', limit=1)  # sincroniza o buffer
+        buffer = self.buffers[(symbol, '1m')]
+        series = {}
+        for tf in timeframes:
+            chave = (symbol, tf)
+            fechados, em_formacao = self.reamostrados.get(chave, ([], None))
+            if em_formacao is not None and buffer and buffer[0][0] <= em_formacao:
+                cauda = []
+                for candle in reversed(buffer):
+                    if candle[0] < em_formacao:
+                        break
+                    cauda.append(candle)
+                barras = fechados + reamostrar(cauda[::-1], tf, descartar_inicio=False)
+            else:
+                barras = reamostrar(list(buffer), tf)
+            if barras:
+                maximo = self.tamanho_de('1m') * duracao_ms('1m') // duracao_ms(tf) + 1
+                self.reamostrados[chave] = (barras[-maximo:-1], barras[-1][0])
+            series[tf] = barras[-limit:] if limit else barras
+        return series
+
+    def _recortar(self, buffer, since, limit):
+        # Só copia os últimos 'limit' (o 'since' também corta um sufixo)
+        candles = [list(c) for c in islice(buffer, max(0, len(buffer) - limit), None)]
+        if since is not None:
+            candles = [c for c in candles if c[0] >= since]
+        return candles[-limit:]
+
+    def fechar(self):
+        self.descarregar_pendentes()
+        with self._lock:
+            self.conn.close()
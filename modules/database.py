@@ -1,9 +1,35 @@
+import asyncio
+import atexit
+import itertools
+import json
 import sqlite3
-import pandas as pd
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
+
+import modules.metricas as metricas
 
 DB_NAME = "trades.db"
 
+# Conexão única e persistente do bot (as instruções SQL ficam em cache nela)
+_CONEXAO = None
+_LOCK = threading.RLock()
+# Conexão só de leitura do canal de comandos (ver versao_banco)
+_CONEXAO_COMANDOS = None
+
+# Write-behind: últimas atualizações de memoria_bot ainda não gravadas, por ativo.
+# Tem lock próprio para o caminho do tick nunca esperar por uma escrita em disco.
+_ESTADOS_PENDENTES = {}
+_LOCK_PENDENTES = threading.Lock()
+INTERVALO_ESCRITA = 1.0
+# Ordem das atualizações de estado (ver salvar_estado)
+_SEQUENCIA = itertools.count(1)
+
+SQL_SALVAR_ESTADO = '''
+    INSERT OR REPLACE INTO memoria_bot (symbol, saldo, posicao, preco_compra, qtd_btc, preco_maximo)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
 def get_connection():
     """Retorna conexão com modo WAL ativado para permitir leitura/escrita simultâneas"""
     conn = sqlite3.connect(DB_NAME)
@@ -11,9 +37,68 @@ def get_connection():
     conn.execute("PRAGMA journal_mode=WAL;")
     return conn
 
+def conexao():
+    """Conexão de longa duração usada pelo bot (aberta uma vez, compartilhada entre threads com lock)"""
+    global _CONEXAO
+    if _CONEXAO is None:
+        _CONEXAO = sqlite3.connect(DB_NAME, check_same_thread=False, cached_statements=256)
+        _CONEXAO.execute("PRAGMA journal_mode=WAL;")
+    return _CONEXAO
+
+def _executar(sql, params=(), muitos=False):
+    """Executa uma escrita na conexão persistente e confirma (durável)"""
+    with metricas.medir("bot_sqlite_escrita_segundos", 'op="executar"'), _LOCK:
+        conn = conexao()
+        if muitos:
+            conn.executemany(sql, params)
+        else:
+            conn.execute(sql, params)
+        conn.commit()
+
+def total_pendentes():
+    """Quantos ativos têm estado esperando o write-behind (métrica)"""
+    return len(_ESTADOS_PENDENTES)
+
+def descarregar_pendentes():
+    """Grava de uma vez (uma transação) as atualizações de estado acumuladas"""
+    with metricas.medir("bot_sqlite_escrita_segundos", 'op="lote_estado"'), _LOCK:
+        with _LOCK_PENDENTES:
+            if not _ESTADOS_PENDENTES:
+                return
+            lote = [params for _, params in _ESTADOS_PENDENTES.values()]
+            _ESTADOS_PENDENTES.clear()
+        conn = conexao()
+        conn.executemany(SQL_SALVAR_ESTADO, lote)
+        conn.commit()
+
+async def escritor_adiado(intervalo=INTERVALO_ESCRITA):
+    """Tarefa de fundo: descarrega o write-behind fora do event loop a cada intervalo"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(intervalo)
+        if _ESTADOS_PENDENTES:
+            try:
+                await loop.run_in_executor(None, descarregar_pendentes)
+            except Exception as e:
+                print(f"⚠️ Erro ao gravar estados pendentes: {e}")
+
+def fechar_conexao():
+    """Descarrega o que estiver pendente e fecha a conexão persistente"""
+    global _CONEXAO, _CONEXAO_COMANDOS
+    descarregar_pendentes()
+    with _LOCK:
+        if _CONEXAO is not None:
+            _CONEXAO.close()
+            _CONEXAO = None
+        if _CONEXAO_COMANDOS is not None:
+            _CONEXAO_COMANDOS.close()
+            _CONEXAO_COMANDOS = None
+
+atexit.register(fechar_conexao)
+
 def criar_tabelas():
     """Cria a estrutura de tabelas compatível com múltiplos ativos"""
-    conn = get_connection()
+    conn = conexao()
     cursor = conn.cursor()
     
     # 1. Histórico de Trades (Geral)
@@ -25,9 +110,12 @@ def criar_tabelas():
             preco REAL,
             quantidade REAL,
             lucro REAL,
-            data_hora TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            data_hora TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            saldo REAL -- saldo do ativo depois da operação
         )
     ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_symbol_data ON trades (symbol, data_hora)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_symbol_tipo_id ON trades (symbol, tipo, id)")
     
     # 2. Memória do Bot (Estado Independente por Ativo)
     cursor.execute('''
@@ -52,12 +140,99 @@ def criar_tabelas():
         )
     ''')
     
+    # 4. Histórico da IA (append-only): bruto nas últimas 24h...
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS historico_ia (
+            symbol TEXT,
+            ts INTEGER, -- epoch em segundos
+            rsi REAL,
+            potencial REAL,
+            decisao TEXT
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_historico_ia_symbol_ts ON historico_ia (symbol, ts)")
+
+    # ... e agregado em blocos de 15 minutos depois disso
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS historico_ia_15m (
+            symbol TEXT,
+            bloco INTEGER, -- início do bloco (epoch em segundos)
+            amostras INTEGER,
+            rsi_medio REAL,
+            potencial_medio REAL,
+            potencial_min REAL,
+            potencial_max REAL,
+            ultima_decisao TEXT,
+            PRIMARY KEY (symbol, bloco)
+        ) WITHOUT ROWID
+    ''')
+
+    # 5. Curva de capital materializada (uma linha por VENDA, por ativo e no total)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS curva_equity (
+            symbol TEXT,
+            seq INTEGER, -- 1, 2, 3... por ativo (permite amostrar sem varrer)
+            ts INTEGER,  -- epoch em segundos
+            lucro REAL,
+            acumulado REAL,
+            pico REAL,
+            PRIMARY KEY (symbol, seq)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_curva_equity_symbol_ts ON curva_equity (symbol, ts)")
+
+    # 6. Estatísticas de performance acumuladas (atualizadas a cada VENDA)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS estatisticas (
+            symbol TEXT PRIMARY KEY,
+            trades INTEGER,
+            wins INTEGER,
+            losses INTEGER,
+            lucro_bruto REAL,  -- soma dos lucros positivos
+            perda_bruta REAL,  -- soma dos prejuízos (positiva)
+            media REAL,        -- média do resultado por trade (Welford)
+            m2 REAL,           -- soma dos quadrados dos desvios (Welford)
+            acumulado REAL,
+            pico REAL,
+            max_drawdown REAL
+        )
+    ''')
+
+    # 7. Resumo diário por ativo (base dos relatórios diário, semanal e mensal)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS resumo_diario (
+            symbol TEXT,
+            dia TEXT, -- YYYY-MM-DD (horário local, igual ao data_hora dos trades)
+            compras INTEGER,
+            vendas INTEGER,
+            wins INTEGER,
+            losses INTEGER,
+            lucro REAL,
+            lucro_bruto REAL,
+            perda_bruta REAL,
+            melhor REAL,
+            pior REAL,
+            PRIMARY KEY (symbol, dia)
+        ) WITHOUT ROWID
+    ''')
+
+    # 8. Última calibração (reinício a quente: a elite vale por CALIBRACAO_TTL)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS calibracao (
+            symbol TEXT PRIMARY KEY,
+            config TEXT,       -- JSON da config calibrada
+            score REAL,
+            elite INTEGER,     -- posição no ranking (1 = melhor), NULL fora da elite
+            calibrado_em REAL  -- epoch
+        )
+    ''')
+    
     conn.commit()
-    conn.close()
+    migrar_schema()
 
 def criar_tabela_configs():
     """Cria tabela para configurações globais e API Keys"""
-    conn = get_connection()
+    conn = conexao()
     cursor = conn.cursor()
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS config_global (
@@ -69,42 +244,305 @@ def criar_tabela_configs():
     configs_padrao = [
         ('perfil_risco', 'moderado'),
         ('bot_rodando', 'true'),
-        ('modo_producao', 'false'),
-        ('comando_venda_total', 'false')
+        ('modo_producao', 'false')
     ]
     cursor.executemany("INSERT OR IGNORE INTO config_global VALUES (?, ?)", configs_padrao)
-    conn.commit()
-    conn.close()
 
-def salvar_trade(symbol, tipo, preco, quantidade, lucro):
-    """Regista uma operação de compra ou venda no histórico"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    data_hora = datetime.now().isoformat()
-    cursor.execute("INSERT INTO trades (symbol, tipo, preco, quantidade, lucro, data_hora) VALUES (?, ?, ?, ?, ?, ?)", 
-                   (symbol, tipo, preco, quantidade, lucro, data_hora))
+    # Canal de comandos API -> bot (cada comando é confirmado pelo bot na própria linha)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS comandos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo TEXT,          -- venda_total, bot_rodando, recarregar_configs
+            valor TEXT,
+            criado_em REAL,     -- epoch em segundos
+            status TEXT DEFAULT 'pendente', -- pendente, executado, erro, expirado
+            confirmado_em REAL,
+            resultado TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_comandos_status ON comandos (status, id)")
     conn.commit()
-    conn.close()
 
-def salvar_estado(symbol, saldo, posicao, preco_compra, qtd_btc, preco_maximo):
-    """Salva ou atualiza o estado de um robô específico usando o símbolo"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT OR REPLACE INTO memoria_bot (symbol, saldo, posicao, preco_compra, qtd_btc, preco_maximo)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (symbol, saldo, int(posicao), preco_compra, qtd_btc, preco_maximo))
-    conn.commit()
-    conn.close()
+CURVA_TOTAL = "TOTAL"
+
+def _anexar_curva_equity(conn, symbol, ts, lucro):
+    """Acrescenta um ponto à curva de capital em O(1) (lê só o último ponto do ativo)"""
+    ultimo = conn.execute(
+        "SELECT seq, acumulado, pico FROM curva_equity WHERE symbol=? ORDER BY seq DESC LIMIT 1", (symbol,)
+    ).fetchone()
+    seq, acumulado, pico = ultimo if ultimo else (0, 0.0, 0.0)
+    acumulado += lucro
+    conn.execute(
+        "INSERT INTO curva_equity (symbol, seq, ts, lucro, acumulado, pico) VALUES (?, ?, ?, ?, ?, ?)",
+        (symbol, seq + 1, ts, lucro, acumulado, max(pico, acumulado))
+    )
+
+SQL_RESUMO_DIARIO = '''
+    INSERT INTO resumo_diario (symbol, dia, compras, vendas, wins, losses, lucro, lucro_bruto, perda_bruta, melhor, pior)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (symbol, dia) DO UPDATE SET
+        compras = compras + excluded.compras,
+        vendas = vendas + excluded.vendas,
+        wins = wins + excluded.wins,
+        losses = losses + excluded.losses,
+        lucro = lucro + excluded.lucro,
+        lucro_bruto = lucro_bruto + excluded.lucro_bruto,
+        perda_bruta = perda_bruta + excluded.perda_bruta,
+        melhor = MAX(COALESCE(melhor, excluded.melhor), COALESCE(excluded.melhor, melhor)),
+        pior = MIN(COALESCE(pior, excluded.pior), COALESCE(excluded.pior, pior))
+'''
+
+def _acumular_resumo_diario(conn, symbol, dia, tipo, lucro):
+    """Soma uma operação na linha (symbol, dia) do resumo diário"""
+    if tipo == "VENDA":
+        lucro = lucro or 0.0
+        params = (symbol, dia, 0, 1, int(lucro > 0), int(lucro < 0), lucro, max(lucro, 0.0), max(-lucro, 0.0), lucro, lucro)
+    else:
+        params = (symbol, dia, 1, 0, 0, 0, 0.0, 0.0, 0.0, None, None)
+    conn.execute(SQL_RESUMO_DIARIO, params)
+
+def salvar_trade(symbol, tipo, preco, quantidade, lucro, saldo=None):
+    """Regista uma operação de compra ou venda no histórico (vendas também entram na curva de capital)"""
+    agora = datetime.now()
+    with metricas.medir("bot_sqlite_escrita_segundos", 'op="salvar_trade"'), _LOCK:
+        conn = conexao()
+        conn.execute("INSERT INTO trades (symbol, tipo, preco, quantidade, lucro, data_hora, saldo) VALUES (?, ?, ?, ?, ?, ?, ?)", 
+                     (symbol, tipo, preco, quantidade, lucro, agora.isoformat(), saldo))
+        _acumular_resumo_diario(conn, symbol, agora.strftime('%Y-%m-%d'), tipo, lucro)
+        if tipo == "VENDA":
+            ts = int(agora.timestamp())
+            _anexar_curva_equity(conn, symbol, ts, lucro)
+            _anexar_curva_equity(conn, CURVA_TOTAL, ts, lucro)
+            _atualizar_estatisticas(conn, symbol, lucro)
+            _atualizar_estatisticas(conn, CURVA_TOTAL, lucro)
+        conn.commit()
+
+def reconstruir_curva_equity():
+    """Refaz a curva de capital inteira a partir da tabela trades (migração de bancos antigos)"""
+    with _LOCK:
+        conn = conexao()
+        conn.execute("DELETE FROM curva_equity")
+        vendas = conn.execute(
+            "SELECT symbol, data_hora, COALESCE(lucro, 0) FROM trades WHERE tipo='VENDA' ORDER BY id"
+        ).fetchall()
+        for symbol, data_hora, lucro in vendas:
+            try:
+                ts = int(datetime.fromisoformat(str(data_hora)).timestamp())
+            except ValueError:
+                ts = int(time.time())
+            _anexar_curva_equity(conn, symbol, ts, lucro)
+            _anexar_curva_equity(conn, CURVA_TOTAL, ts, lucro)
+        conn.commit()
+
+def _atualizar_estatisticas(conn, symbol, lucro):
+    """Incorpora o resultado de uma VENDA às estatísticas do ativo em O(1)"""
+    row = conn.execute(
+        "SELECT trades, wins, losses, lucro_bruto, perda_bruta, media, m2, acumulado, pico, max_drawdown "
+        "FROM estatisticas WHERE symbol=?", (symbol,)
+    ).fetchone()
+    n, wins, losses, lucro_bruto, perda_bruta, media, m2, acumulado, pico, max_dd = row or (0, 0, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+
+    lucro = lucro or 0.0
+    n += 1
+    if lucro > 0:
+        wins += 1
+        lucro_bruto += lucro
+    elif lucro < 0:
+        losses += 1
+        perda_bruta -= lucro
+
+    # Welford: média e variância sem guardar a série
+    delta = lucro - media
+    media += delta / n
+    m2 += delta * (lucro - media)
+
+    acumulado += lucro
+    pico = max(pico, acumulado)
+    max_dd = max(max_dd, pico - acumulado)
+
+    conn.execute(
+        "INSERT OR REPLACE INTO estatisticas VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (symbol, n, wins, losses, lucro_bruto, perda_bruta, media, m2, acumulado, pico, max_dd)
+    )
+
+def reconstruir_estatisticas():
+    """Refaz as estatísticas de todos os ativos a partir da tabela trades (migração de bancos antigos)"""
+    with _LOCK:
+        conn = conexao()
+        conn.execute("DELETE FROM estatisticas")
+        vendas = conn.execute("SELECT symbol, COALESCE(lucro, 0) FROM trades WHERE tipo='VENDA' ORDER BY id").fetchall()
+        for symbol, lucro in vendas:
+            _atualizar_estatisticas(conn, symbol, lucro)
+            _atualizar_estatisticas(conn, CURVA_TOTAL, lucro)
+        conn.commit()
+
+def reconstruir_resumo_diario():
+    """Refaz o resumo diário a partir da tabela trades com uma única agregação (migração)"""
+    with _LOCK:
+        conn = conexao()
+        conn.execute("DELETE FROM resumo_diario")
+        conn.execute('''
+            INSERT INTO resumo_diario (symbol, dia, compras, vendas, wins, losses, lucro, lucro_bruto, perda_bruta, melhor, pior)
+            SELECT
+                symbol,
+                substr(data_hora, 1, 10),
+                COUNT(CASE WHEN tipo='COMPRA' THEN 1 END),
+                COUNT(CASE WHEN tipo='VENDA' THEN 1 END),
+                COUNT(CASE WHEN tipo='VENDA' AND lucro > 0 THEN 1 END),
+                COUNT(CASE WHEN tipo='VENDA' AND lucro < 0 THEN 1 END),
+                COALESCE(SUM(CASE WHEN tipo='VENDA' THEN lucro END), 0.0),
+                COALESCE(SUM(CASE WHEN tipo='VENDA' AND lucro > 0 THEN lucro END), 0.0),
+                COALESCE(-SUM(CASE WHEN tipo='VENDA' AND lucro < 0 THEN lucro END), 0.0),
+                MAX(CASE WHEN tipo='VENDA' THEN COALESCE(lucro, 0.0) END),
+                MIN(CASE WHEN tipo='VENDA' THEN COALESCE(lucro, 0.0) END)
+            FROM trades
+            GROUP BY symbol, substr(data_hora, 1, 10)
+        ''')
+        conn.commit()
+
+def _migracao_saldo_trades():
+    """Bancos antigos não tinham a coluna saldo em trades (usada por obter_ultimo_saldo)"""
+    with _LOCK:
+        conn = conexao()
+        colunas = [c[1] for c in conn.execute("PRAGMA table_info(trades)")]
+        if "saldo" not in colunas:
+            conn.execute("ALTER TABLE trades ADD COLUMN saldo REAL")
+            conn.commit()
+
+def _migracao_remover_comando_venda():
+    """A venda total virou comando (tabela comandos): a flag antiga em config_global não é mais lida"""
+    with _LOCK:
+        conn = conexao()
+        # Banco novo: config_global só é criada depois, em criar_tabela_configs
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='config_global'").fetchone():
+            conn.execute("DELETE FROM config_global WHERE chave='comando_venda_total'")
+            conn.commit()
+
+# Migrações de bancos antigos, em ordem. O número aplicado fica no PRAGMA user_version.
+MIGRACOES = [
+    (1, reconstruir_curva_equity),
+    (2, reconstruir_estatisticas),
+    (3, _migracao_saldo_trades),
+    (4, reconstruir_resumo_diario),
+    (5, _migracao_remover_comando_venda),
+]
+
+def migrar_schema():
+    """Aplica as migrações pendentes (cada uma só roda uma vez por arquivo de banco)"""
+    conn = conexao()
+    versao = conn.execute("PRAGMA user_version").fetchone()[0]
+    for numero, migracao in MIGRACOES:
+        if numero <= versao:
+            continue
+        print(f"🛠️ Migrando banco para a versão {numero}...")
+        migracao()
+        with _LOCK:
+            conn.execute(f"PRAGMA user_version = {numero}")
+
+def consultar_estatisticas(symbol, conn=None):
+    """Estatísticas de performance prontas (uma linha), ou None se o ativo nunca vendeu"""
+    def consultar(c):
+        return c.execute(
+            "SELECT trades, wins, losses, lucro_bruto, perda_bruta, media, m2, acumulado, pico, max_drawdown "
+            "FROM estatisticas WHERE symbol=?", (symbol,)
+        ).fetchone()
+
+    if conn is not None:
+        row = consultar(conn)
+    else:
+        with _LOCK:
+            row = consultar(conexao())
+    if row is None:
+        return None
+
+    n, wins, losses, lucro_bruto, perda_bruta, media, m2, acumulado, pico, max_dd = row
+    desvio = (m2 / (n - 1)) ** 0.5 if n > 1 else 0.0
+    return {
+        "total_trades": n,
+        "wins": wins,
+        "losses": losses,
+        "win_rate": round(wins / n * 100, 2) if n else 0.0,
+        "lucro_total": acumulado,
+        "lucro_medio": media,
+        "desvio_padrao": desvio,
+        # Sem prejuízo ainda: profit factor indefinido (None em vez de infinito no JSON)
+        "profit_factor": lucro_bruto / perda_bruta if perda_bruta > 0 else None,
+        # Sharpe por trade (média / desvio dos resultados), sem anualizar
+        "sharpe_ratio": media / desvio if desvio > 0 else 0.0,
+        "max_drawdown": max_dd,
+        "drawdown_atual": pico - acumulado,
+    }
+
+def consultar_curva_equity(symbol, inicio=None, fim=None, pontos=500, conn=None):
+    """
+    Curva de capital entre 'inicio' e 'fim' (epoch em segundos) com no máximo
+    'pontos' pontos. Localiza a faixa de seq pelo índice (symbol, ts) e busca
+    só os seq igualmente espaçados, então o custo não depende do total de trades.
+    """
+    def consultar(c):
+        faixa = c.execute('''
+            SELECT
+                (SELECT seq FROM curva_equity WHERE symbol=? AND ts >= ? ORDER BY ts, seq LIMIT 1),
+                (SELECT seq FROM curva_equity WHERE symbol=? AND ts <= ? ORDER BY ts DESC, seq DESC LIMIT 1)
+        ''', (symbol, inicio if inicio is not None else 0, symbol, fim if fim is not None else 2**62)).fetchone()
+        primeiro, ultimo = faixa
+        if primeiro is None or ultimo is None or ultimo < primeiro:
+            return []
+
+        total = ultimo - primeiro + 1
+        if total <= pontos:
+            seqs = list(range(primeiro, ultimo + 1))
+        else:
+            passo = (total - 1) / (pontos - 1)
+            seqs = sorted({primeiro + round(i * passo) for i in range(pontos)})
+
+        rows = c.execute(
+            f"SELECT ts, acumulado, pico FROM curva_equity WHERE symbol=? AND seq IN ({','.join('?' * len(seqs))}) ORDER BY seq",
+            (symbol, *seqs)
+        ).fetchall()
+        return [{"time": ts, "value": acumulado, "pico": pico} for ts, acumulado, pico in rows]
+
+    if conn is not None:
+        return consultar(conn)
+    with _LOCK:
+        return consultar(conexao())
+
+def marca_estado():
+    """Número de ordem de uma atualização de estado (tirado no event loop, ao decidir)"""
+    return next(_SEQUENCIA)
+
+def salvar_estado(symbol, saldo, posicao, preco_compra, qtd_btc, preco_maximo, adiado=False, ordem=None):
+    """
+    Salva ou atualiza o estado de um robô específico usando o símbolo.
+    Com adiado=True (ex: só o preço máximo mudou) a escrita entra no write-behind:
+    atualizações seguidas do mesmo ativo viram uma só e são gravadas pelo
+    escritor_adiado. Sem adiado, grava na hora (transições de posição).
+
+    'ordem' (marca_estado) é o momento em que o estado foi decidido; quem grava
+    numa thread deve tirá-la antes do to_thread. A escrita imediata só descarta
+    pendências anteriores a ela: um preço máximo que chegou enquanto a chamada
+    esperava a thread é mais novo e continua na fila.
+    """
+    params = (symbol, saldo, int(posicao), preco_compra, qtd_btc, preco_maximo)
+    if ordem is None:
+        ordem = marca_estado()
+    if adiado:
+        with _LOCK_PENDENTES:
+            _ESTADOS_PENDENTES[symbol] = (ordem, params)
+        return
+    with _LOCK:
+        with _LOCK_PENDENTES:
+            pendente = _ESTADOS_PENDENTES.get(symbol)
+            if pendente is not None and pendente[0] < ordem:
+                del _ESTADOS_PENDENTES[symbol]
+        _executar(SQL_SALVAR_ESTADO, params)
 
 def carregar_estado(symbol):
     """Recupera a memória de um ativo específico para retoma após reinicialização"""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT saldo, posicao, preco_compra, qtd_btc, preco_maximo FROM memoria_bot WHERE symbol=?", (symbol,))
-        row = cursor.fetchone()
-        conn.close()
+        descarregar_pendentes()
+        with _LOCK:
+            row = conexao().execute("SELECT saldo, posicao, preco_compra, qtd_btc, preco_maximo FROM memoria_bot WHERE symbol=?", (symbol,)).fetchone()
         
         if row:
             return {
@@ -119,84 +557,245 @@ def carregar_estado(symbol):
         print(f"Erro ao carregar estado de {symbol}: {e}")
         return None
 
+def simbolos_posicionados():
+    """Ativos com posição aberta na memória (retomados no reinício antes de qualquer calibração)"""
+    descarregar_pendentes()
+    with _LOCK:
+        rows = conexao().execute("SELECT symbol FROM memoria_bot WHERE posicao=1").fetchall()
+    return [row[0] for row in rows]
+
+def salvar_calibracao(resultados, elite):
+    """
+    Substitui a última calibração: 'resultados' = [(symbol, config, score)] de
+    todos os candidatos e 'elite' = símbolos escolhidos, do melhor ao pior.
+    """
+    agora = time.time()
+    ranking = {sym: i + 1 for i, sym in enumerate(elite)}
+    with _LOCK:
+        conn = conexao()
+        conn.execute("DELETE FROM calibracao")
+        conn.executemany(
+            "INSERT INTO calibracao (symbol, config, score, elite, calibrado_em) VALUES (?, ?, ?, ?, ?)",
+            [(sym, json.dumps(config, default=float), float(score), ranking.get(sym), agora) for sym, config, score in resultados]
+        )
+        conn.commit()
+
+def carregar_calibracao(validade=None):
+    """
+    Elite da última calibração: ([(symbol, config, score)] na ordem do
+    ranking, calibrado_em). Lista vazia se não houver calibração ou se ela
+    tiver mais de 'validade' segundos.
+    """
+    with _LOCK:
+        rows = conexao().execute(
+            "SELECT symbol, config, score, calibrado_em FROM calibracao WHERE elite IS NOT NULL ORDER BY elite"
+        ).fetchall()
+    if not rows:
+        return [], None
+    calibrado_em = rows[0][3]
+    if validade is not None and time.time() - calibrado_em > validade:
+        return [], calibrado_em
+    return [(sym, json.loads(config), score) for sym, config, score, _ in rows], calibrado_em
+
 def atualizar_status_ia(symbol, rsi, score, decisao):
-    """Atualiza os indicadores e a decisão da IA para exibição no Dashboard"""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT OR REPLACE INTO status_ia (symbol, rsi, potencial, decisao, timestamp)
-        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
-    ''', (symbol, rsi, score, decisao))
-    conn.commit()
-    conn.close()
+    """Atualiza os indicadores e a decisão da IA para exibição no Dashboard e registra no histórico"""
+    with metricas.medir("bot_sqlite_escrita_segundos", 'op="status_ia"'), _LOCK:
+        conn = conexao()
+        conn.execute('''
+            INSERT OR REPLACE INTO status_ia (symbol, rsi, potencial, decisao, timestamp)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ''', (symbol, rsi, score, decisao))
+        conn.execute(
+            "INSERT INTO historico_ia (symbol, ts, rsi, potencial, decisao) VALUES (?, ?, ?, ?, ?)",
+            (symbol, int(time.time()), rsi, score, decisao)
+        )
+        conn.commit()
+
+RETENCAO_BRUTA_IA = 24 * 3600
+BLOCO_IA = 15 * 60
+
+def compactar_historico_ia(agora=None):
+    """
+    Política de retenção do histórico da IA: linhas brutas com mais de 24h
+    viram um registro por bloco de 15 minutos (média/mín/máx do score) e são
+    apagadas. Blocos já existentes são mesclados com média ponderada.
+    """
+    limite = int(agora if agora is not None else time.time()) - RETENCAO_BRUTA_IA
+    # Só compacta blocos completos
+    limite -= limite % BLOCO_IA
+    with _LOCK:
+        conn = conexao()
+        conn.execute('''
+            INSERT INTO historico_ia_15m
+                (symbol, bloco, amostras, rsi_medio, potencial_medio, potencial_min, potencial_max, ultima_decisao)
+            SELECT symbol, (ts / ?) * ?, COUNT(*), AVG(rsi), AVG(potencial), MIN(potencial), MAX(potencial),
+                   -- Faixa do bloco em vez de ts / BLOCO: o índice (symbol, ts) resolve a busca
+                   (SELECT h2.decisao FROM historico_ia h2
+                    WHERE h2.symbol = h.symbol AND h2.ts >= (h.ts / ?) * ? AND h2.ts < (h.ts / ?) * ? + ? AND h2.ts < ?
+                    ORDER BY h2.ts DESC LIMIT 1)
+            FROM historico_ia h
+            WHERE ts < ?
+            GROUP BY symbol, ts / ?
+            ON CONFLICT (symbol, bloco) DO UPDATE SET
+                rsi_medio = (rsi_medio * amostras + excluded.rsi_medio * excluded.amostras) / (amostras + excluded.amostras),
+                potencial_medio = (potencial_medio * amostras + excluded.potencial_medio * excluded.amostras) / (amostras + excluded.amostras),
+                potencial_min = MIN(potencial_min, excluded.potencial_min),
+                potencial_max = MAX(potencial_max, excluded.potencial_max),
+                ultima_decisao = excluded.ultima_decisao,
+                amostras = amostras + excluded.amostras
+        ''', (BLOCO_IA, BLOCO_IA, BLOCO_IA, BLOCO_IA, BLOCO_IA, BLOCO_IA, BLOCO_IA, limite, limite, BLOCO_IA))
+        apagadas = conn.execute("DELETE FROM historico_ia WHERE ts < ?", (limite,)).rowcount
+        conn.commit()
+    return apagadas
+
+def consultar_historico_ia(symbol, inicio, fim, conn=None):
+    """
+    Timeline do score de um ativo entre 'inicio' e 'fim' (epoch em segundos).
+    Junta os blocos de 15 min (dados antigos) com as linhas brutas (últimas 24h);
+    as duas consultas usam o índice (symbol, ts/bloco).
+    """
+    sql = '''
+        SELECT bloco AS ts, potencial_medio AS potencial, rsi_medio AS rsi, ultima_decisao AS decisao,
+               potencial_min, potencial_max, amostras, '15m' AS resolucao
+        FROM historico_ia_15m WHERE symbol = ? AND bloco BETWEEN ? AND ?
+        UNION ALL
+        SELECT ts, potencial, rsi, decisao, potencial, potencial, 1, 'bruto'
+        FROM historico_ia WHERE symbol = ? AND ts BETWEEN ? AND ?
+        ORDER BY ts
+    '''
+    params = (symbol, inicio, fim, symbol, inicio, fim)
+    if conn is None:
+        with _LOCK:
+            cursor = conexao().execute(sql, params)
+            rows = cursor.fetchall()
+    else:
+        cursor = conn.execute(sql, params)
+        rows = cursor.fetchall()
+    colunas = [c[0] for c in cursor.description]
+    return [dict(zip(colunas, row)) for row in rows]
 
 def carregar_configs_globais():
     """Busca todas as configurações da tabela config_global e retorna um dict"""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT chave, valor FROM config_global")
-        rows = cursor.fetchall()
-        conn.close()
+        with _LOCK:
+            rows = conexao().execute("SELECT chave, valor FROM config_global").fetchall()
         return {row[0]: row[1] for row in rows}
     except Exception as e:
         print(f"⚠️ Erro ao carregar configs do banco: {e}")
         return {}
     
-def resetar_comando_venda():
-    """Desliga a flag de panic sell no banco após a execução"""
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE config_global SET valor='false' WHERE chave='comando_venda_total'")
-        conn.commit()
-        conn.close()
-        print("✅ Comando de Panic Sell resetado com sucesso.")
-    except Exception as e:
-        print(f"⚠️ Erro ao resetar panic sell: {e}")
+# --- Canal de comandos ---
+# Comandos mais velhos que isso ao serem lidos (ex: bot estava desligado) não são executados
+VALIDADE_COMANDO = 60.0
+
+def registrar_comando(conn, tipo, valor=None):
+    """Enfileira um comando para o bot (usado pela API, na conexão dela). Retorna o id."""
+    cursor = conn.execute(
+        "INSERT INTO comandos (tipo, valor, criado_em) VALUES (?, ?, ?)", (tipo, valor, time.time())
+    )
+    conn.commit()
+    return cursor.lastrowid
+
+def consultar_comando(conn, comando_id):
+    cursor = conn.execute("SELECT * FROM comandos WHERE id=?", (comando_id,))
+    row = cursor.fetchone()
+    return dict(zip([c[0] for c in cursor.description], row)) if row else None
+
+def _conexao_comandos():
+    # Conexão própria: checar o data_version não pode esperar pelo _LOCK das escritas
+    global _CONEXAO_COMANDOS
+    if _CONEXAO_COMANDOS is None:
+        _CONEXAO_COMANDOS = sqlite3.connect(DB_NAME, check_same_thread=False)
+    return _CONEXAO_COMANDOS
+
+def versao_banco():
+    """PRAGMA data_version: muda quando outra conexão (ex: a API) faz commit. Custo de microssegundos."""
+    return _conexao_comandos().execute("PRAGMA data_version").fetchone()[0]
+
+def comandos_pendentes():
+    """Comandos ainda não tratados, em ordem de chegada. Os vencidos já saem marcados como expirados."""
+    conn = _conexao_comandos()
+    rows = conn.execute(
+        "SELECT id, tipo, valor, criado_em FROM comandos WHERE status='pendente' ORDER BY id"
+    ).fetchall()
+    limite = time.time() - VALIDADE_COMANDO
+    vencidos = [(time.time(), r[0]) for r in rows if r[3] < limite]
+    if vencidos:
+        _executar("UPDATE comandos SET status='expirado', confirmado_em=? WHERE id=?", vencidos, muitos=True)
+    return [{"id": r[0], "tipo": r[1], "valor": r[2], "criado_em": r[3]} for r in rows if r[3] >= limite]
+
+def confirmar_comando(comando_id, status="executado", resultado=None):
+    """Ack do bot: grava quando e como o comando foi tratado (a API/dashboard lê daqui)"""
+    _executar(
+        "UPDATE comandos SET status=?, confirmado_em=?, resultado=? WHERE id=?",
+        (status, time.time(), resultado, comando_id)
+    )
 
 def obter_ultimo_saldo(symbol):
     """Busca o saldo final da última operação deste ativo ou retorna 100.0"""
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        # Tenta pegar o saldo da memória
-        cursor.execute("SELECT saldo FROM memoria_bot WHERE symbol=?", (symbol,))
-        row = cursor.fetchone()
+        descarregar_pendentes()
+        with _LOCK:
+            cursor = conexao().cursor()
+            # Tenta pegar o saldo da memória
+            cursor.execute("SELECT saldo FROM memoria_bot WHERE symbol=?", (symbol,))
+            row = cursor.fetchone()
         
-        if row:
-            return float(row[0])
+            if row:
+                return float(row[0])
         
-        # Se não tiver memória, tenta pegar do último trade de VENDA
-        cursor.execute("SELECT saldo FROM trades WHERE symbol=? AND tipo='VENDA' ORDER BY id DESC LIMIT 1", (symbol,))
-        row_trade = cursor.fetchone()
+            # Se não tiver memória, tenta pegar do último trade de VENDA (idx_trades_symbol_tipo_id)
+            cursor.execute(
+                "SELECT saldo FROM trades WHERE symbol=? AND tipo='VENDA' AND saldo IS NOT NULL ORDER BY id DESC LIMIT 1",
+                (symbol,)
+            )
+            row_trade = cursor.fetchone()
         
-        if row_trade:
-            return float(row_trade[0])
+            if row_trade:
+                return float(row_trade[0])
             
-        return 100.0 # Saldo inicial padrão se nunca operou
+            return 100.0 # Saldo inicial padrão se nunca operou
     except Exception as e:
         return 100.0
 
-def obter_resumo_diario():
-    """Calcula o lucro total e estatísticas de trades do dia atual"""
+def obter_resumo(inicio, fim):
+    """
+    Lucro, número de trades e wins por ativo entre os dias 'inicio' e 'fim'
+    (YYYY-MM-DD, inclusivos). Lê só o resumo_diario: uma linha por ativo por dia.
+    """
     try:
-        conn = get_connection()
-        hoje = datetime.now().strftime('%Y-%m-%d')
-        
         query = """
             SELECT 
                 symbol,
                 SUM(lucro) as lucro_total,
-                COUNT(*) as total_trades,
-                COUNT(CASE WHEN lucro > 0 THEN 1 END) as wins
-            FROM trades 
-            WHERE data_hora LIKE ? AND tipo='VENDA'
+                SUM(vendas) as total_trades,
+                SUM(wins) as wins,
+                SUM(losses) as losses,
+                MAX(melhor) as melhor_trade,
+                MIN(pior) as pior_trade
+            FROM resumo_diario 
+            WHERE dia BETWEEN ? AND ? AND vendas > 0
             GROUP BY symbol
         """
-        df = pd.read_sql_query(query, conn, params=(f"{hoje}%",))
-        conn.close()
+        import pandas as pd  # só os relatórios usam; fora do caminho de inicialização
+        with _LOCK:
+            df = pd.read_sql_query(query, conexao(), params=(inicio, fim))
         return df
     except Exception as e:
         print(f"Erro ao gerar resumo no banco: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def obter_resumo_diario(dia=None):
+    """Calcula o lucro total e estatísticas de trades do dia atual"""
+    dia = (dia or datetime.now()).strftime('%Y-%m-%d')
+    return obter_resumo(dia, dia)
+
+def obter_resumo_semanal(dia=None):
+    """Resumo dos últimos 7 dias (incluindo o dia informado)"""
+    dia = dia or datetime.now()
+    return obter_resumo((dia - timedelta(days=6)).strftime('%Y-%m-%d'), dia.strftime('%Y-%m-%d'))
+
+def obter_resumo_mensal(dia=None):
+    """Resumo do mês corrente até o dia informado"""
+    dia = dia or datetime.now()
+    return obter_resumo(dia.strftime('%Y-%m-01'), dia.strftime('%Y-%m-%d'))
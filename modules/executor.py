@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import modules.metricas as metricas
+
+# O brain (pandas, sklearn, ta) só é importado na primeira análise de cada
+# processo: o bot principal chega ao primeiro tick sem pagar esse custo.
+
+def iniciar_worker():
+    """Cada worker usa um único núcleo no RandomForest (evita oversubscription)"""
+    import modules.brain as brain
+    brain.N_JOBS_MODELO = 1
+
+def _analisar(symbol, candles_1m, candles_15m, config, superiores=None):
+    import modules.brain as brain
+    return brain.analisar_multitimeframe(candles_1m, candles_15m, config=config, symbol=symbol, superiores=superiores)
+
+def _analisar_no_worker(symbol, candles_1m, candles_15m, config, superiores=None):
+    # As métricas medidas no worker voltam junto com a análise
+    return _analisar(symbol, candles_1m, candles_15m, config, superiores), metricas.coletar_e_zerar()
+
+class PoolAnalise:
+    """
+    Executa brain.analisar_multitimeframe fora do event loop, em processos separados.
+
+    Cada ativo é sempre enviado ao mesmo worker (afinidade por hash do símbolo),
+    assim as séries do FeatureStore e o cache de modelos daquele ativo continuam
+    quentes dentro do processo. Com workers=0 a análise roda no próprio loop.
+
+    Um worker que morre (OOM, crash nativo) ou estoura o timeout é trocado por
+    um novo: o processo preso é encerrado em vez de enfileirar as próximas
+    análises do ativo atrás do job que não termina.
+    """
+
+    def __init__(self, workers=2, timeout=30.0):
+        self.timeout = timeout
+        self.workers = [self._novo_worker() for _ in range(max(0, workers))]
+
+    def _novo_worker(self):
+        contexto = multiprocessing.get_context('spawn')
+        return ProcessPoolExecutor(max_workers=1, mp_context=contexto, initializer=iniciar_worker)
+
+    def _indice_de(self, symbol):
+        return zlib.crc32(symbol.encode()) % len(self.workers)
+
+    def _reciclar(self, indice):
+        """Substitui o worker 'indice' e encerra o processo antigo (mesmo no meio de um job)"""
+        antigo = self.workers[indice]
+        self.workers[indice] = self._novo_worker()
+        # O ProcessPoolExecutor não expõe como matar um job em andamento
+        processos = list((antigo._processes or {}).values())
+        antigo.shutdown(wait=False, cancel_futures=True)
+        for processo in processos:
+            processo.terminate()
+        metricas.contar("bot_workers_reciclados_total")
+
+    async def analisar(self, symbol, candles_1m, candles_15m, config=None, superiores=None):
+        """Retorna a análise do ativo ou None se estourar o timeout ou o worker morrer"""
+        if not self.workers:
+            return _analisar(symbol, candles_1m, candles_15m, config, superiores)
+
+        loop = asyncio.get_running_loop()
+        indice = self._indice_de(symbol)
+        worker = self.workers[indice]
+        try:
+            futuro = loop.run_in_executor(worker, _analisar_no_worker, symbol, candles_1m, candles_15m, config, superiores)
+            analise, medidas = await asyncio.wait_for(futuro, timeout=self.timeout)
+            metricas.mesclar(medidas)
+            return analise
+        except asyncio.TimeoutError:
+            logging.error(f"Timeout na análise de {symbol} ({self.timeout}s): reiniciando o worker {indice}")
+        except BrokenProcessPool:
+            logging.error(f"Worker {indice} morreu durante a análise de {symbol}: reiniciando")
+        # Outra análise pode já ter trocado este worker enquanto esperávamos
+        if self.workers[indice] is worker:
+            self._reciclar(indice)
+        return None
+
+    def fechar(self):
+        for worker in self.workers:
+            worker.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,164 @@
+import logging
+import os
+import pickle
+import re
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from modules.indicadores import COLUNAS, calcular_linha, estado_inicial
+
+# Diretório compartilhado entre os processos (calibração e workers da IA).
+# Vazio = store só em memória, por processo.
+FEATURES_DIR = os.getenv('FEATURES_DIR', 'features')
+# Linhas guardadas por série e séries mantidas em memória (LRU)
+MAX_LINHAS_FEATURES = int(os.getenv('MAX_LINHAS_FEATURES', 5000))
+MAX_SERIES_FEATURES = int(os.getenv('MAX_SERIES_FEATURES', 64))
+
+# Colunas de indicadores na ordem das linhas de calcular_linha
+INDICADORES = COLUNAS[6:]
+NAN = np.float32('nan')
+
+class SerieFeatures:
+    """
+    Indicadores de uma série (symbol, timeframe) por timestamp de candle, em
+    arrays compactos: timestamps int64 e uma matriz float32 (linhas x
+    INDICADORES). Só guarda candles fechados; o estado recursivo dos
+    indicadores (float64) continua de onde o último candle parou.
+    """
+
+    def __init__(self, capacidade=MAX_LINHAS_FEATURES):
+        self.capacidade = capacidade
+        self.ts = np.empty(capacidade, dtype=np.int64)
+        self.valores = np.empty((capacidade, len(INDICADORES)), dtype=np.float32)
+        self.n = 0
+        self.estado = estado_inicial()
+
+    @property
+    def ultimo_ts(self):
+        return int(self.ts[self.n - 1]) if self.n else None
+
+    def resetar(self):
+        self.n = 0
+        self.estado = estado_inicial()
+
+    def consolidar(self, candle):
+        linha, self.estado = calcular_linha(candle, self.estado)
+        if self.n == self.capacidade:
+            # Cheio: descarta o quarto mais antigo de uma vez (custo amortizado O(1))
+            manter = self.capacidade - self.capacidade // 4
+            self.ts[:manter] = self.ts[self.n - manter:self.n]
+            self.valores[:manter] = self.valores[self.n - manter:self.n]
+            self.n = manter
+        self.ts[self.n] = candle[0]
+        self.valores[self.n] = linha[6:]
+        self.n += 1
+
+class FeatureStore:
+    """
+    Indicadores calculados uma única vez por (symbol, timeframe, timestamp do
+    candle), servindo a calibração (backtest) e o estrategista ao vivo.
+
+    A cada pedido só os candles fechados ainda desconhecidos são calculados
+    (O(1) cada); o último da lista é tratado como em formação e calculado à
+    parte, sem entrar na série. Sem sobreposição com o que já existe (buraco
+    ou lista começando antes da série) a série é recalculada do zero.
+
+    Com um diretório, cada série é gravada (pickle, troca atômica) quando
+    ganha candles novos e carregada na primeira vez que um processo a pede:
+    os workers do estrategista e as próximas calibrações reaproveitam o que
+    já foi calculado.
+    """
+
+    def __init__(self, diretorio=FEATURES_DIR, capacidade=MAX_LINHAS_FEATURES, max_series=MAX_SERIES_FEATURES):
+        self.diretorio = diretorio
+        self.capacidade = capacidade
+        self.max_series = max_series
+        self.series = OrderedDict()
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+
+    def _caminho(self, symbol, timeframe):
+        return os.path.join(self.diretorio, f"{re.sub(r'[^A-Za-z0-9]', '_', symbol)}_{timeframe}.pkl")
+
+    def _carregar(self, symbol, timeframe):
+        if self.diretorio:
+            try:
+                with open(self._caminho(symbol, timeframe), "rb") as arquivo:
+                    serie = pickle.load(arquivo)
+                if serie.capacidade == self.capacidade:
+                    return serie
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logging.error(f"Erro ao carregar features de {symbol} {timeframe}: {e}")
+        return SerieFeatures(self.capacidade)
+
+    def _gravar(self, symbol, timeframe, serie):
+        caminho = self._caminho(symbol, timeframe)
+        temporario = f"{caminho}.{os.getpid()}.tmp"
+        try:
+            with open(temporario, "wb") as arquivo:
+                pickle.dump(serie, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporario, caminho)
+        except Exception as e:
+            logging.error(f"Erro ao gravar features de {symbol} {timeframe}: {e}")
+
+    def _serie(self, symbol, timeframe):
+        chave = (symbol, timeframe)
+        serie = self.series.get(chave)
+        if serie is None:
+            serie = self.series[chave] = self._carregar(symbol, timeframe)
+            while len(self.series) > self.max_series:
+                self.series.popitem(last=False)
+        self.series.move_to_end(chave)
+        return serie
+
+    def matriz(self, symbol, timeframe, candles):
+        """
+        Matriz float32 (len(candles) x INDICADORES) alinhada aos candles, com
+        NaN onde o indicador ainda não existe (aquecimento).
+        """
+        saida = np.full((len(candles), len(INDICADORES)), NAN, dtype=np.float32)
+        if not candles:
+            return saida
+        serie = self._serie(symbol, timeframe)
+
+        ultimo = serie.ultimo_ts
+        if ultimo is None or candles[0][0] > ultimo or candles[0][0] < serie.ts[0]:
+            serie.resetar()
+            novos = candles
+        else:
+            # Os candles conhecidos são contíguos: os novos ficam no fim da lista
+            ts_lista = np.fromiter((c[0] for c in candles), dtype=np.int64, count=len(candles))
+            novos = candles[int(np.searchsorted(ts_lista, ultimo, side='right')):]
+
+        if len(novos) > 1:
+            for candle in novos[:-1]:
+                serie.consolidar(candle)
+            if self.diretorio:
+                self._gravar(symbol, timeframe, serie)
+
+        # Linhas já na série (busca binária pelos timestamps)
+        ts = np.fromiter((c[0] for c in candles), dtype=np.int64, count=len(candles))
+        conhecidos = serie.ts[:serie.n]
+        pos = np.minimum(np.searchsorted(conhecidos, ts), serie.n - 1) if serie.n else np.zeros(len(ts), dtype=np.int64)
+        achou = (conhecidos[pos] == ts) if serie.n else np.zeros(len(ts), dtype=bool)
+        saida[achou] = serie.valores[pos[achou]]
+
+        # Candle em formação: calculado a partir do estado, sem consolidar
+        if novos:
+            saida[-1] = calcular_linha(novos[-1], serie.estado)[0][6:]
+        return saida
+
+    def dataframe(self, symbol, timeframe, candles):
+        """
+        Mesmo DataFrame de brain.preparar_dados (colunas dos candles + indicadores,
+        sem as linhas de aquecimento e com o índice = posição na lista de candles).
+        """
+        valores = self.matriz(symbol, timeframe, candles)
+        df = pd.DataFrame(candles, columns=COLUNAS[:6])
+        for i, coluna in enumerate(INDICADORES):
+            df[coluna] = valores[:, i]
+        return df[~np.isnan(valores).any(axis=1)]
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import logging
+import os
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+# Diretório das gravações (vazio = gravador desligado)
+GRAVAR_TICKS = os.getenv('GRAVAR_TICKS', '')
+# Comprime (zlib) os arquivos de dias já fechados (anteriores a ontem, para não
+# disputar com registros atrasados da virada). Dias comprimidos não são
+# mapeados em memória: o leitor descomprime para um array comum.
+COMPACTAR_DIAS_FECHADOS = os.getenv('GRAVAR_TICKS_COMPACTAR', 'false') == 'true'
+INTERVALO_DESCARGA = 1.0
+
+# Registros de largura fixa (little-endian, sem padding): cada arquivo é um
+# array NumPy puro, então o leitor usa np.memmap sem copiar nada.
+DTYPE_TICK = np.dtype([
+    ('ts', '<i8'),        # event time da Binance (ms)
+    ('symbol', '<u2'),    # índice em simbolos.json
+    ('preco', '<f8'),
+])
+DTYPE_KLINE = np.dtype([
+    ('ts', '<i8'),        # event time (ms)
+    ('abertura', '<i8'),  # início do candle (ms)
+    ('symbol', '<u2'),
+    ('minutos', '<u2'),   # timeframe em minutos (1, 15, 60...)
+    ('fechado', 'u1'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+DTYPES = {"ticks": DTYPE_TICK, "klines": DTYPE_KLINE}
+MINUTOS_TIMEFRAME = {'m': 1, 'h': 60, 'd': 1440, 'w': 10080}
+
+def dia_utc(ts_ms):
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+
+def caminho_arquivo(diretorio, dia, tipo):
+    return os.path.join(diretorio, f"{dia}.{tipo}")
+
+def carregar_simbolos(diretorio):
+    caminho = os.path.join(diretorio, "simbolos.json")
+    if not os.path.exists(caminho):
+        return []
+    with open(caminho) as arquivo:
+        return json.load(arquivo)
+
+class GravadorTicks:
+    """
+    Grava todo tick (miniTicker) e kline recebido em logs binários append-only,
+    um par de arquivos por dia (UTC): AAAA-MM-DD.ticks e AAAA-MM-DD.klines.
+
+    No caminho do tick, registrar() só acrescenta uma tupla com os campos crus
+    da mensagem numa lista em memória. A conversão (ids, floats, NumPy) e a
+    escrita em disco acontecem a cada INTERVALO_DESCARGA segundos, numa
+    thread (descarregar_periodicamente).
+    """
+
+    def __init__(self, diretorio, compactar=COMPACTAR_DIAS_FECHADOS):
+        self.diretorio = diretorio
+        self.compactar = compactar
+        os.makedirs(diretorio, exist_ok=True)
+        self.simbolos = carregar_simbolos(diretorio)
+        self.ids = {sym: i for i, sym in enumerate(self.simbolos)}
+        self.ticks = []
+        self.klines = []
+        self.dia_atual = None  # dia (UTC) mais recente já gravado
+
+    def _id(self, symbol):
+        i = self.ids.get(symbol)
+        if i is None:
+            # Raro (ativo novo): regrava o mapa de símbolos inteiro de forma atômica
+            i = self.ids[symbol] = len(self.simbolos)
+            self.simbolos.append(symbol)
+            temporario = os.path.join(self.diretorio, "simbolos.json.tmp")
+            with open(temporario, "w") as arquivo:
+                json.dump(self.simbolos, arquivo)
+            os.replace(temporario, os.path.join(self.diretorio, "simbolos.json"))
+        return i
+
+    def registrar(self, symbol, msg):
+        """Chamado para cada mensagem já decodificada do websocket (só um append)"""
+        if msg.get('e') == 'kline':
+            self.klines.append((msg['E'], symbol, msg['k']))
+        else:
+            self.ticks.append((msg['E'], symbol, msg['c']))
+
+    def _converter(self, tipo, registros):
+        if tipo == "ticks":
+            # O NumPy converte o preço (texto) direto para float64
+            return np.array([(ts, self._id(sym), preco) for ts, sym, preco in registros], dtype=DTYPE_TICK)
+        return np.array([
+            (ts, k['t'], self._id(sym), int(k['i'][:-1]) * MINUTOS_TIMEFRAME[k['i'][-1]], k['x'],
+             k['o'], k['h'], k['l'], k['c'], k['v'])
+            for ts, sym, k in registros
+        ], dtype=DTYPE_KLINE)
+
+    def _trocar_lotes(self):
+        # Feito no event loop: o registrar() nunca escreve numa lista já entregue à thread
+        lotes = {"ticks": self.ticks, "klines": self.klines}
+        self.ticks, self.klines = [], []
+        return lotes
+
+    def _gravar(self, lotes):
+        dias = set()
+        for tipo, registros in lotes.items():
+            if not registros:
+                continue
+            dados = self._converter(tipo, registros)
+            primeiro, ultimo = dia_utc(dados['ts'][0]), dia_utc(dados['ts'][-1])
+            if primeiro == ultimo:
+                self._anexar(primeiro, tipo, dados)
+                dias.add(primeiro)
+            else:
+                # O lote atravessou a meia-noite: separa por dia
+                por_dia = np.array([dia_utc(ts) for ts in dados['ts']])
+                for dia in dict.fromkeys(por_dia):
+                    self._anexar(dia, tipo, dados[por_dia == dia])
+                    dias.add(dia)
+
+        # Rotação: um dia novo apareceu, compacta os que já fecharam
+        if dias and max(dias) != self.dia_atual:
+            self.dia_atual = max(dias)
+            if self.compactar:
+                self._compactar_fechados()
+
+    def _anexar(self, dia, tipo, dados):
+        with open(caminho_arquivo(self.diretorio, dia, tipo), "ab") as arquivo:
+            dados.tofile(arquivo)
+
+    def _compactar_fechados(self):
+        ontem = (datetime.strptime(self.dia_atual, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+        for dia in dias_gravados(self.diretorio):
+            if dia >= ontem:
+                continue
+            for tipo in DTYPES:
+                caminho = caminho_arquivo(self.diretorio, dia, tipo)
+                if not os.path.exists(caminho) or os.path.exists(caminho + ".z"):
+                    continue
+                with open(caminho, "rb") as bruto, open(caminho + ".z", "wb") as compactado:
+                    compactado.write(zlib.compress(bruto.read(), 6))
+                os.remove(caminho)
+
+    async def descarregar_periodicamente(self, intervalo=INTERVALO_DESCARGA):
+        """Tarefa de fundo: converte e grava os registros acumulados numa thread"""
+        while True:
+            await asyncio.sleep(intervalo)
+            try:
+                await asyncio.to_thread(self._gravar, self._trocar_lotes())
+            except Exception as e:
+                logging.error(f"Erro ao gravar ticks: {e}")
+
+    def fechar(self):
+        """Grava o que ainda estiver em memória (chamar com o loop já parado)"""
+        self._gravar(self._trocar_lotes())
+
+# --- Leitura ---
+
+def ler_dia(diretorio, dia, tipo="ticks"):
+    """
+    Array estruturado (DTYPE_TICK ou DTYPE_KLINE) com os registros do dia.
+    Arquivo bruto: np.memmap somente leitura, sem cópia. Dia compactado:
+    descomprime para memória. Um registro incompleto no fim (queda no meio de
+    uma escrita) é ignorado.
+    """
+    dtype = DTYPES[tipo]
+    caminho = caminho_arquivo(diretorio, dia, tipo)
+    if os.path.exists(caminho):
+        total = os.path.getsize(caminho) // dtype.itemsize
+        if total == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(caminho, dtype=dtype, mode="r", shape=(total,))
+    if os.path.exists(caminho + ".z"):
+        with open(caminho + ".z", "rb") as arquivo:
+            bruto = zlib.decompress(arquivo.read())
+        return np.frombuffer(bruto[:len(bruto) // dtype.itemsize * dtype.itemsize], dtype=dtype)
+    return np.empty(0, dtype=dtype)
+
+def dias_gravados(diretorio):
+    dias = set()
+    for nome in os.listdir(diretorio) if os.path.isdir(diretorio) else []:
+        partes = nome.split(".")
+        if len(partes) >= 2 and partes[1] in DTYPES:
+            dias.add(partes[0])
+    return sorted(dias)
+
+def ler_periodo(diretorio, tipo="ticks", inicio=None, fim=None):
+    """Lista de arrays por dia entre 'inicio' e 'fim' (AAAA-MM-DD, inclusivos), sem concatenar"""
+    return [
+        ler_dia(diretorio, dia, tipo) for dia in dias_gravados(diretorio)
+        if (inicio is None or dia >= inicio) and (fim is None or dia <= fim)
+    ]
+
+def candles_gravados(diretorio, symbol, timeframe="15m", inicio=None, fim=None):
+    """
+    Candles fechados de um ativo no formato do ccxt ([ts, o, h, l, c, v]),
+    prontos para o walk_forward do backtest.
+    """
+    simbolos = carregar_simbolos(diretorio)
+    if symbol not in simbolos:
+        return []
+    sid = simbolos.index(symbol)
+    minutos = int(timeframe[:-1]) * MINUTOS_TIMEFRAME[timeframe[-1]]
+
+    candles = {}
+    for dia in ler_periodo(diretorio, "klines", inicio, fim):
+        filtro = (dia['symbol'] == sid) & (dia['minutos'] == minutos) & (dia['fechado'] == 1)
+        for k in dia[filtro]:
+            candles[int(k['abertura'])] = [int(k['abertura']), float(k['open']), float(k['high']),
+                                           float(k['low']), float(k['close']), float(k['volume'])]
+    return [candles[t] for t in sorted(candles)]
@@ -0,0 +1,104 @@
+import math
+from collections import deque
+
+# Mesmas janelas usadas em brain.preparar_dados (padrões da biblioteca 'ta')
+JANELA_RSI = 14
+MACD_RAPIDA = 12
+MACD_LENTA = 26
+MACD_SINAL = 9
+JANELA_ATR = 14
+JANELA_BB = 20
+DESVIO_BB = 2
+
+COLUNAS = ['timestamp', 'open', 'high', 'low', 'close', 'volume',
+           'RSI', 'MACD_line', 'MACD_signal', 'MACD_hist', 'ATR', 'BBP']
+
+NAN = float('nan')
+
+
+def _ema_passo(anterior, valor, alpha):
+    """Um passo de EMA com adjust=False (mesma recursão do pandas.ewm)"""
+    if anterior is None:
+        return valor
+    return anterior + alpha * (valor - anterior)
+
+
+def estado_inicial():
+    """Estado recursivo dos indicadores antes do primeiro candle"""
+    return {
+        "n": 0,
+        "close_ant": None,
+        "rsi_up": None, "rsi_dn": None,
+        "ema_rapida": None, "ema_lenta": None,
+        "ema_sinal": None, "n_macd": 0,
+        "atr": None, "tr_soma": 0.0,
+        "janela_bb": deque(maxlen=JANELA_BB),
+    }
+
+
+def calcular_linha(candle, estado):
+    """
+    Calcula a linha de features de um candle a partir do estado consolidado.
+    Retorna (linha, novo_estado) sem alterar o estado recebido.
+    """
+    ts, o, h, l, c, v = candle[:6]
+    o, h, l, c = float(o), float(h), float(l), float(c)
+    v = float(v) if v is not None else NAN
+    novo = dict(estado)
+    n = estado["n"] + 1
+    novo["n"] = n
+    close_ant = estado["close_ant"]
+
+    # 1. RSI (EMA de Wilder sobre ganhos/perdas; o 1º candle entra como variação 0, igual ao 'ta')
+    rsi = NAN
+    diff = c - close_ant if close_ant is not None else 0.0
+    alpha = 1.0 / JANELA_RSI
+    novo["rsi_up"] = _ema_passo(estado["rsi_up"], diff if diff > 0 else 0.0, alpha)
+    novo["rsi_dn"] = _ema_passo(estado["rsi_dn"], -diff if diff < 0 else 0.0, alpha)
+    if n >= JANELA_RSI:
+        up, dn = novo["rsi_up"], novo["rsi_dn"]
+        rsi = 100.0 if dn == 0 else 100.0 - (100.0 / (1.0 + up / dn))
+
+    # 2. MACD (EMAs de 12/26 e sinal de 9 sobre a linha MACD)
+    novo["ema_rapida"] = _ema_passo(estado["ema_rapida"], c, 2.0 / (MACD_RAPIDA + 1))
+    novo["ema_lenta"] = _ema_passo(estado["ema_lenta"], c, 2.0 / (MACD_LENTA + 1))
+    macd_line = macd_signal = macd_hist = NAN
+    if n >= MACD_LENTA:
+        macd_line = novo["ema_rapida"] - novo["ema_lenta"]
+        novo["ema_sinal"] = _ema_passo(estado["ema_sinal"], macd_line, 2.0 / (MACD_SINAL + 1))
+        novo["n_macd"] = estado["n_macd"] + 1
+        if novo["n_macd"] >= MACD_SINAL:
+            macd_signal = novo["ema_sinal"]
+            macd_hist = macd_line - macd_signal
+
+    # 3. ATR (média simples dos 14 primeiros TR e depois suavização de Wilder)
+    if close_ant is None:
+        tr = h - l
+    else:
+        tr = max(h - l, abs(h - close_ant), abs(l - close_ant))
+    atr = 0.0
+    if estado["atr"] is None:
+        novo["tr_soma"] = estado["tr_soma"] + tr
+        if n == JANELA_ATR:
+            novo["atr"] = novo["tr_soma"] / JANELA_ATR
+            atr = novo["atr"]
+    else:
+        novo["atr"] = (estado["atr"] * (JANELA_ATR - 1) + tr) / JANELA_ATR
+        atr = novo["atr"]
+
+    # 4. Bollinger %B (janela fixa de 20 fechamentos, desvio populacional)
+    janela = deque(estado["janela_bb"], maxlen=JANELA_BB)
+    janela.append(c)
+    novo["janela_bb"] = janela
+    bbp = NAN
+    if len(janela) == JANELA_BB:
+        media = math.fsum(janela) / JANELA_BB
+        desvio = math.sqrt(math.fsum((x - media) ** 2 for x in janela) / JANELA_BB)
+        banda_baixa = media - DESVIO_BB * desvio
+        banda_alta = media + DESVIO_BB * desvio
+        if banda_alta != banda_baixa:
+            bbp = (c - banda_baixa) / (banda_alta - banda_baixa)
+
+    novo["close_ant"] = c
+    linha = (ts, o, h, l, c, v, rsi, macd_line, macd_signal, macd_hist, atr, bbp)
+    return linha, novo
@@ -0,0 +1,226 @@
+import asyncio
+import bisect
+import logging
+import os
+import time
+
+# Métricas simples do processo do bot (lidas pelo log e por quem importar)
+METRICAS = {
+    "loop_lag_medio_ms": 0.0,
+    "loop_lag_max_ms": 0.0,
+    "loop_lag_total_ms": 0.0,
+}
+
+# --- Instrumentação no formato Prometheus ---
+# Desligada por padrão: sem METRICAS_PORTA cada ponto instrumentado custa só um
+# "if HABILITADO". Os workers da IA herdam a variável e devolvem o que mediram
+# junto com a análise (ver coletar_e_zerar / mesclar).
+METRICAS_PORTA = int(os.getenv('METRICAS_PORTA', 0))
+HABILITADO = METRICAS_PORTA > 0
+
+# Limites dos buckets dos histogramas, em segundos
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTADORES = {}   # (nome, rótulos) -> valor
+HISTOGRAMAS = {}  # (nome, rótulos) -> [contagens por bucket (+Inf no fim), soma, total]
+MEDIDORES = {}    # nome -> função chamada na hora da coleta (ex: tamanho de fila)
+DESCRICOES = {}   # nome -> texto do # HELP
+
+def descrever(nome, texto):
+    DESCRICOES[nome] = texto
+
+def contar(nome, valor=1, rotulos=""):
+    if HABILITADO:
+        chave = (nome, rotulos)
+        CONTADORES[chave] = CONTADORES.get(chave, 0) + valor
+
+def observar(nome, segundos, rotulos=""):
+    if not HABILITADO:
+        return
+    chave = (nome, rotulos)
+    histograma = HISTOGRAMAS.get(chave)
+    if histograma is None:
+        histograma = HISTOGRAMAS[chave] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+    histograma[0][bisect.bisect_left(BUCKETS, segundos)] += 1
+    histograma[1] += segundos
+    histograma[2] += 1
+
+def registrar_medidor(nome, funcao, texto=None):
+    """Gauge lido na coleta (ex: tamanho de uma fila), sem custo no caminho quente"""
+    MEDIDORES[nome] = funcao
+    if texto:
+        descrever(nome, texto)
+
+class _Cronometro:
+    __slots__ = ("nome", "rotulos", "inicio")
+
+    def __init__(self, nome, rotulos):
+        self.nome, self.rotulos = nome, rotulos
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *erro):
+        observar(self.nome, time.perf_counter() - self.inicio, self.rotulos)
+        return False
+
+class _CronometroNulo:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        return False
+
+_NULO = _CronometroNulo()
+
+def medir(nome, rotulos=""):
+    """Uso: with medir("bot_x_segundos"): ... (não faz nada se desabilitado)"""
+    return _Cronometro(nome, rotulos) if HABILITADO else _NULO
+
+def coletar_e_zerar():
+    """Entrega o que este processo (worker) mediu desde a última chamada"""
+    if not HABILITADO:
+        return None
+    dados = (dict(CONTADORES), {k: [list(v[0]), v[1], v[2]] for k, v in HISTOGRAMAS.items()})
+    CONTADORES.clear()
+    HISTOGRAMAS.clear()
+    return dados
+
+def mesclar(dados):
+    """Soma no processo principal as medidas vindas de um worker"""
+    if not dados or not HABILITADO:
+        return
+    contadores, histogramas = dados
+    for (nome, rotulos), valor in contadores.items():
+        contar(nome, valor, rotulos)
+    for chave, (contagens, soma, total) in histogramas.items():
+        atual = HISTOGRAMAS.setdefault(chave, [[0] * (len(BUCKETS) + 1), 0.0, 0])
+        atual[0] = [a + b for a, b in zip(atual[0], contagens)]
+        atual[1] += soma
+        atual[2] += total
+
+def _rotulos(*partes):
+    partes = [p for p in partes if p]
+    return "{" + ",".join(partes) + "}" if partes else ""
+
+def _le(limite):
+    return f'le="{limite}"'
+
+def texto_prometheus():
+    """Renderiza tudo no formato de exposição de texto do Prometheus"""
+    linhas = []
+    vistos = set()
+
+    def cabecalho(nome, tipo):
+        if nome not in vistos:
+            vistos.add(nome)
+            if nome in DESCRICOES:
+                linhas.append(f"# HELP {nome} {DESCRICOES[nome]}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+
+    for (nome, rotulos), valor in sorted(CONTADORES.items()):
+        cabecalho(nome, "counter")
+        linhas.append(f"{nome}{_rotulos(rotulos)} {valor}")
+
+    for (nome, rotulos), (contagens, soma, total) in sorted(HISTOGRAMAS.items()):
+        cabecalho(nome, "histogram")
+        acumulado = 0
+        for limite, contagem in zip(BUCKETS, contagens):
+            acumulado += contagem
+            linhas.append(f"{nome}_bucket{_rotulos(rotulos, _le(limite))} {acumulado}")
+        linhas.append(f"{nome}_bucket{_rotulos(rotulos, _le('+Inf'))} {total}")
+        linhas.append(f"{nome}_sum{_rotulos(rotulos)} {soma}")
+        linhas.append(f"{nome}_count{_rotulos(rotulos)} {total}")
+
+    for chave, valor in METRICAS.items():
+        # loop_lag_total_ms só cresce: é um contador
+        cabecalho(f"bot_{chave}", "counter" if "_total" in chave else "gauge")
+        linhas.append(f"bot_{chave} {valor}")
+
+    for nome, funcao in sorted(MEDIDORES.items()):
+        try:
+            valor = funcao()
+        except Exception as e:
+            logging.error(f"Erro ao coletar a métrica {nome}: {e}")
+            continue
+        cabecalho(nome, "gauge")
+        linhas.append(f"{nome} {valor}")
+
+    return "\n".join(linhas) + "\n"
+
+async def servidor_metricas(porta=None):
+    """HTTP mínimo dentro do bot: GET /metrics devolve texto_prometheus()"""
+    async def atender(leitor, escritor):
+        try:
+            pedido = await leitor.readline()
+            while (await leitor.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # descarta os headers
+            if pedido.split(b" ")[1:2] == [b"/metrics"]:
+                corpo, status = texto_prometheus().encode(), "200 OK"
+            else:
+                corpo, status = b"use /metrics\n", "404 Not Found"
+            escritor.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(corpo)}\r\nConnection: close\r\n\r\n".encode() + corpo
+            )
+            await escritor.drain()
+        except Exception as e:
+            logging.error(f"Erro no servidor de métricas: {e}")
+        finally:
+            escritor.close()
+
+    servidor = await asyncio.start_server(atender, "0.0.0.0", porta or METRICAS_PORTA)
+    async with servidor:
+        await servidor.serve_forever()
+
+def instrumentar_exchange(exchange):
+    """Mede o tempo que o ccxt segura cada chamada REST no rate limiter (enableRateLimit)"""
+    if not HABILITADO:
+        return exchange
+    throttle = exchange.throttle
+
+    async def throttle_medido(cost=None):
+        with medir("bot_rate_limit_espera_segundos"):
+            return await throttle(cost)
+
+    exchange.throttle = throttle_medido
+    return exchange
+
+descrever("bot_ws_mensagem_segundos", "Tempo de processamento de cada mensagem do websocket")
+descrever("bot_loop_lag_segundos", "Atraso do event loop medido pelo monitor_loop")
+descrever("bot_fetch_ohlcv_segundos", "Latência do fetch_ohlcv na exchange (REST)")
+descrever("bot_rate_limit_espera_segundos", "Espera no rate limiter do ccxt antes de cada chamada REST")
+descrever("bot_preparar_dados_segundos", "Duração do cálculo de indicadores (brain)")
+descrever("bot_treinar_e_prever_segundos", "Duração do treino/previsão do modelo (brain)")
+descrever("bot_sqlite_escrita_segundos", "Latência das escritas no SQLite, por operação")
+descrever("bot_workers_reciclados_total", "Workers da IA trocados após timeout ou morte do processo")
+
+async def monitor_loop(intervalo=0.1, janela=60):
+    """
+    Mede o travamento do event loop: agenda um sleep curto e compara o tempo
+    real de retorno com o esperado. A diferença é o tempo em que o loop ficou
+    ocupado com código síncrono (ex: treino de IA) sem atender os ticks.
+    A cada 'janela' segundos registra média e pico no bot.log.
+    """
+    amostras = []
+    inicio_janela = time.perf_counter()
+    while True:
+        antes = time.perf_counter()
+        await asyncio.sleep(intervalo)
+        lag_ms = max(0.0, (time.perf_counter() - antes - intervalo) * 1000)
+        amostras.append(lag_ms)
+        METRICAS["loop_lag_total_ms"] += lag_ms
+        observar("bot_loop_lag_segundos", lag_ms / 1000)
+
+        if time.perf_counter() - inicio_janela >= janela:
+            METRICAS["loop_lag_medio_ms"] = sum(amostras) / len(amostras)
+            METRICAS["loop_lag_max_ms"] = max(amostras)
+            logging.info(
+                f"Loop lag: médio {METRICAS['loop_lag_medio_ms']:.1f} ms | "
+                f"máx {METRICAS['loop_lag_max_ms']:.1f} ms"
+            )
+            amostras = []
+            inicio_janela = time.perf_counter()
@@ -1,39 +1,167 @@
 import requests
 import os
 import json
+import asyncio
+import logging
 from datetime import datetime
 
+# --- Fila de notificações (não bloqueia o loop de trading) ---
+TAMANHO_FILA = int(os.getenv('NOTIFICACOES_FILA', 200))
+JANELA_AGRUPAMENTO = 1.0  # segundos esperando mais mensagens para mandar num só post
+MAX_EMBEDS = 10           # limite de embeds por mensagem no Discord
+MAX_TENTATIVAS = 4
+LIMITE_DESCRICAO = 4000
+
+_FILA = None
+
+def _fila():
+    global _FILA
+    if _FILA is None:
+        _FILA = asyncio.Queue(maxsize=TAMANHO_FILA)
+    return _FILA
+
+def tamanho_fila():
+    return _FILA.qsize() if _FILA is not None else 0
+
+def _mencao(marcar_usuario):
+    # Define quem será marcado (Seu ID específico ou @everyone se não tiver ID)
+    if not marcar_usuario:
+        return ""
+    user_id = os.getenv('DISCORD_USER_ID') # Opcional: ID específico do usuário
+    return f"<@{user_id}>" if user_id else "@everyone"
+
+def _embed(titulo, mensagem, cor):
+    return {
+        "title": titulo,
+        "description": mensagem,
+        "color": cor,
+        "footer": {"text": f"TraderBot Pro V5.3 • Elite Ranking Ativo • {datetime.now().strftime('%H:%M:%S')}"}
+    }
+
+def _postar(webhook_url, payload):
+    """POST síncrono no webhook. Retorna o objeto de resposta do requests."""
+    headers = {'Content-Type': 'application/json'}
+    return requests.post(webhook_url, data=json.dumps(payload), headers=headers, timeout=5)
+
 def enviar_discord(titulo, mensagem, cor=0x00ff00, marcar_usuario=True):
     """
     Envia notificação rica (Embed) para o Discord via Webhook.
     Se marcar_usuario=True, adiciona o ID do usuário para gerar notificação push.
+    Chamada síncrona: dentro do bot use notificar(), que só enfileira.
     """
     webhook_url = os.getenv('DISCORD_WEBHOOK')
-    user_id = os.getenv('DISCORD_USER_ID') # Opcional: ID específico do usuário
-    
+
     if not webhook_url:
         return
 
-    # Define quem será marcado (Seu ID específico ou @everyone se não tiver ID)
-    mencao = ""
-    if marcar_usuario:
-        if user_id:
-            mencao = f"<@{user_id}>" 
-        else:
-            mencao = "@everyone"
-
     try:
         payload = {
-            "content": mencao, # A marcação vai aqui fora do embed
-            "embeds": [{
-                "title": titulo,
-                "description": mensagem,
-                "color": cor,
-                "footer": {"text": f"TraderBot Pro V5.3 • Elite Ranking Ativo • {datetime.now().strftime('%H:%M:%S')}"}
-            }]
+            "content": _mencao(marcar_usuario), # A marcação vai aqui fora do embed
+            "embeds": [_embed(titulo, mensagem, cor)]
         }
-        
-        headers = {'Content-Type': 'application/json'}
-        requests.post(webhook_url, data=json.dumps(payload), headers=headers, timeout=5)
+        _postar(webhook_url, payload)
     except Exception as e:
-        print(f"Erro Discord: {e}")
\ No newline at end of file
+        print(f"Erro Discord: {e}")
+
+def notificar(titulo, mensagem, cor=0x00ff00, marcar_usuario=True):
+    """
+    Enfileira uma notificação para o despachante (retorna na hora).
+    Com a fila cheia, descarta a mais antiga para manter as mais recentes.
+    """
+    if not os.getenv('DISCORD_WEBHOOK'):
+        return
+    fila = _fila()
+    item = (titulo, mensagem, cor, marcar_usuario)
+    try:
+        fila.put_nowait(item)
+    except asyncio.QueueFull:
+        fila.get_nowait()
+        fila.task_done()
+        fila.put_nowait(item)
+        logging.error("Fila de notificações cheia: mensagem mais antiga descartada")
+
+def montar_payload(itens):
+    """
+    Junta uma rajada de notificações em um único post: até MAX_EMBEDS vão como
+    embeds separados; acima disso viram um embed só com uma linha por evento
+    (ex: panic sell de 20 ativos).
+    """
+    marcar = any(item[3] for item in itens)
+    if len(itens) <= MAX_EMBEDS:
+        embeds = [_embed(titulo, mensagem, cor) for titulo, mensagem, cor, _ in itens]
+    else:
+        linhas = [f"**{titulo}** — {mensagem.replace(chr(10), ' | ')}" for titulo, mensagem, _, _ in itens]
+        descricao = "\n".join(linhas)
+        if len(descricao) > LIMITE_DESCRICAO:
+            descricao = descricao[:LIMITE_DESCRICAO - 3] + "..."
+        embeds = [_embed(f"📦 {len(itens)} notificações", descricao, itens[-1][2])]
+    return {"content": _mencao(marcar), "embeds": embeds}
+
+async def _enviar_com_retentativa(payload):
+    """Respeita o rate limit do Discord (429 + retry_after) e re-tenta erros 5xx/rede"""
+    espera = 1.0
+    for tentativa in range(1, MAX_TENTATIVAS + 1):
+        webhook_url = os.getenv('DISCORD_WEBHOOK')
+        if not webhook_url:
+            return False
+        try:
+            resposta = await asyncio.to_thread(_postar, webhook_url, payload)
+            if resposta.status_code == 429:
+                try:
+                    retry_after = float(resposta.json().get('retry_after', espera))
+                except ValueError:
+                    retry_after = float(resposta.headers.get('Retry-After', espera))
+                await asyncio.sleep(retry_after)
+                continue
+            if resposta.status_code < 500:
+                return resposta.status_code < 400
+        except Exception as e:
+            print(f"Erro Discord (tentativa {tentativa}): {e}")
+        await asyncio.sleep(espera)
+        espera *= 2
+    logging.error("Notificação descartada após esgotar as tentativas")
+    return False
+
+async def despachante():
+    """Tarefa de fundo: consome a fila, agrupa rajadas e envia ao Discord"""
+    fila = _fila()
+    while True:
+        itens = [await fila.get()]
+        # Janela curta para juntar rajadas num único post
+        await asyncio.sleep(JANELA_AGRUPAMENTO)
+        while not fila.empty():
+            itens.append(fila.get_nowait())
+        try:
+            await _enviar_com_retentativa(montar_payload(itens))
+        finally:
+            for _ in itens:
+                fila.task_done()
+
+def enviar_relatorio(titulo, resumo):
+    """Monta o embed de um relatório (diário, semanal ou mensal) a partir do DataFrame de obter_resumo"""
+    if resumo is None or resumo.empty:
+        notificar(titulo, "Nenhuma venda no período.", 0x808080, marcar_usuario=False)
+        return
+
+    lucro_total = resumo['lucro_total'].sum()
+    total_trades = int(resumo['total_trades'].sum())
+    wins = int(resumo['wins'].sum())
+    linhas = [
+        f"{'🟢' if row.lucro_total >= 0 else '🔴'} **{row.symbol}**: R$ {row.lucro_total:.2f} ({int(row.wins)}/{int(row.total_trades)} wins)"
+        for row in resumo.sort_values('lucro_total', ascending=False).itertuples()
+    ]
+    mensagem = (
+        f"Lucro: **R$ {lucro_total:.2f}**\n"
+        f"Trades: {total_trades} • Win rate: {wins / total_trades * 100:.1f}%\n\n"
+        + "\n".join(linhas)
+    )
+    notificar(titulo, mensagem[:LIMITE_DESCRICAO], 0x00ff00 if lucro_total >= 0 else 0xff0000)
+
+def enviar_relatorio_diario(resumo):
+    enviar_relatorio(f"📊 Relatório do dia {datetime.now().strftime('%d/%m/%Y')}", resumo)
+
+def enviar_relatorio_semanal(resumo):
+    enviar_relatorio("📅 Relatório semanal (últimos 7 dias)", resumo)
+
+def enviar_relatorio_mensal(resumo):
+    enviar_relatorio(f"🗓️ Relatório mensal ({datetime.now().strftime('%m/%Y')})", resumo)
@@ -0,0 +1,30 @@
+# Regras de risco usadas pelo bot (main.py) e pelo simulador do backtest.
+# Ficam num módulo próprio para o backtest não precisar importar o main.
+
+# --- DEFINIÇÃO DE PERFIS DE RISCO ---
+PERFIS = {
+    "conservador": {
+        "STOP_LOSS": 1.0,
+        "TRAILING_DROP": 0.2,
+        "LUCRO_MINIMO": 0.1,
+        "SCORE_MINIMO": 8,
+        "RSI_COMPRA": 30
+    },
+    "moderado": {
+        "STOP_LOSS": 1.5,
+        "TRAILING_DROP": 0.5,
+        "LUCRO_MINIMO": 0.2,
+        "SCORE_MINIMO": 6,
+        "RSI_COMPRA": 35
+    },
+    "agressivo": {
+        "STOP_LOSS": 3.0,
+        "TRAILING_DROP": 1.0,
+        "LUCRO_MINIMO": 0.4,
+        "SCORE_MINIMO": 5,
+        "RSI_COMPRA": 45
+    }
+}
+
+# Taxa total (%) descontada na venda
+TAXA_TOTAL = 0.2
@@ -0,0 +1,51 @@
+import numpy as np
+
+from modules.candles import duracao_ms
+
+def reamostrar(candles, timeframe, origem='1m', descartar_inicio=True):
+    """
+    Agrega candles de 'origem' (formato do ccxt) em 'timeframe' pelo
+    timestamp: cada candle cai no bloco floor(ts / duração). Mesma regra da
+    Binance: open do primeiro, high/low extremos, close do último, volume somado.
+
+    O primeiro bloco é descartado se a série começar no meio dele (open
+    errado), a menos que 'descartar_inicio' seja False. O último pode estar
+    incompleto: é o candle em formação, como no fetch_ohlcv. Minutos faltando
+    no meio (sem negociação) não quebram nada.
+    """
+    if len(candles) == 0:
+        return []
+    duracao = duracao_ms(timeframe)
+    dados = np.asarray(candles, dtype=float)
+    ts = dados[:, 0].astype(np.int64)
+    blocos = ts // duracao
+    # Início de cada bloco nos candles de origem (a série vem ordenada)
+    inicios = np.flatnonzero(np.r_[True, blocos[1:] != blocos[:-1]])
+    if descartar_inicio and ts[0] != blocos[0] * duracao and duracao > duracao_ms(origem):
+        inicios = inicios[1:]
+        if not len(inicios):
+            return []
+    fins = np.r_[inicios[1:], len(ts)] - 1
+
+    abertura = blocos[inicios] * duracao
+    saida = np.column_stack([
+        abertura.astype(float),
+        dados[inicios, 1],
+        np.maximum.reduceat(dados[inicios[0]:, 2], inicios - inicios[0]),
+        np.minimum.reduceat(dados[inicios[0]:, 3], inicios - inicios[0]),
+        dados[fins, 4],
+        np.add.reduceat(dados[inicios[0]:, 5], inicios - inicios[0]),
+    ])
+    barras = saida.tolist()
+    for barra in barras:
+        barra[0] = int(barra[0])
+    return barras
+
+def ultimo_fechado(aberturas, timeframe, instantes):
+    """
+    Para cada instante (ms), a posição do último candle de 'timeframe' já
+    fechado naquele momento (busca binária nas aberturas); -1 se nenhum.
+    Alinha séries de timeframes diferentes sem olhar o futuro.
+    """
+    fechamentos = np.asarray(aberturas, dtype=np.int64) + duracao_ms(timeframe)
+    return np.searchsorted(fechamentos, np.asarray(instantes, dtype=np.int64), side='right') - 1
@@ -0,0 +1,205 @@
+import hashlib
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from modules.perfis import PERFIS, TAXA_TOTAL
+
+# Resultados já simulados: (hash dos dados, parâmetros) -> métricas
+MAX_SIMULACOES_CACHE = int(os.getenv('MAX_SIMULACOES_CACHE', 20000))
+CACHE_SIMULACOES = OrderedDict()
+# Trabalho mínimo (candles x configs) por processo: abaixo disso a grade roda
+# no próprio processo, porque subir processos spawn custa mais que simular
+MIN_CELULAS_POR_PROCESSO = 20_000_000
+SALDO_INICIAL = 100.0
+
+def config_de_perfil(nome, min_score=None):
+    """Parâmetros de simulação de um perfil de PERFIS (min_score opcional, padrão SCORE_MINIMO)"""
+    regra = PERFIS[nome]
+    return {
+        "perfil": nome,
+        "stop_loss": regra["STOP_LOSS"],
+        "trailing_drop": regra["TRAILING_DROP"],
+        "lucro_minimo": regra["LUCRO_MINIMO"],
+        # O bot só compra com o score acima dos dois limites (config da IA e perfil)
+        "min_score": max(regra["SCORE_MINIMO"], min_score if min_score is not None else regra["SCORE_MINIMO"]),
+    }
+
+def grade_perfis(min_scores=(5, 6, 7, 8)):
+    """Todos os perfis de PERFIS combinados com os min_score pedidos (sem repetir)"""
+    grade = {}
+    for nome in PERFIS:
+        for min_score in min_scores:
+            config = config_de_perfil(nome, min_score)
+            grade[_chave_config(config)] = config
+    return list(grade.values())
+
+def grade_personalizada(stop_loss, trailing_drop, lucro_minimo, min_score):
+    """Produto cartesiano de listas de parâmetros"""
+    return [
+        {"perfil": "personalizado", "stop_loss": sl, "trailing_drop": td, "lucro_minimo": lm, "min_score": ms}
+        for sl in stop_loss for td in trailing_drop for lm in lucro_minimo for ms in min_score
+    ]
+
+def scores_por_minuto(candles_1m, candles_15m, posicoes, scores):
+    """
+    Espalha o score de cada candle de 15m pelos candles de 1m seguintes: o
+    score calculado no fechamento do candle 'p' vale até o próximo fechamento.
+    Minutos sem score ficam NaN (não compram).
+    """
+    ts_1m = np.array([c[0] for c in candles_1m], dtype=np.int64)
+    abertura_15m = np.array([c[0] for c in candles_15m], dtype=np.int64)
+    por_minuto = np.full(len(ts_1m), np.nan)
+    if len(abertura_15m) < 2:
+        return por_minuto
+    duracao = abertura_15m[1] - abertura_15m[0]
+    for p, score in zip(posicoes, scores):
+        fechamento = abertura_15m[p] + duracao
+        inicio, fim = np.searchsorted(ts_1m, [fechamento, fechamento + duracao])
+        por_minuto[inicio:fim] = score
+    return por_minuto
+
+def _simular(ohlc, scores, configs, taxa=TAXA_TOTAL):
+    """
+    Máquina de estados do bot (compra pelo score, stop loss, trailing stop com
+    lucro mínimo e taxa) percorrendo os candles de 1m uma vez, com todas as
+    configurações avançando juntas em arrays NumPy (uma posição por config).
+
+    Dentro de cada candle: compra na abertura se o score do minuto passar do
+    limite; stop loss e trailing pelo mínimo do candle (com o topo anterior);
+    o topo sobe com a máxima; trailing de novo no fechamento com o topo novo.
+    """
+    k = len(configs)
+    stop = np.array([c["stop_loss"] for c in configs], dtype=float)
+    trailing = np.array([c["trailing_drop"] for c in configs], dtype=float)
+    lucro_min = np.array([c["lucro_minimo"] for c in configs], dtype=float)
+    limiar = np.array([c["min_score"] for c in configs], dtype=float)
+    fator_taxa = 1 - taxa / 100
+
+    posicionado = np.zeros(k, dtype=bool)
+    preco_compra = np.zeros(k)
+    maximo = np.zeros(k)
+    qtd = np.zeros(k)
+    saldo = np.full(k, SALDO_INICIAL)
+    pico = np.full(k, SALDO_INICIAL)
+    max_dd = np.zeros(k)
+    trades = np.zeros(k, dtype=np.int64)
+    wins = np.zeros(k, dtype=np.int64)
+
+    for (o, h, l, c), score in zip(ohlc, scores):
+        # Entrada (score NaN nunca passa do limiar)
+        entra = ~posicionado & (score >= limiar)
+        if entra.any():
+            preco_compra[entra] = o
+            maximo[entra] = o
+            qtd[entra] = saldo[entra] / o
+            posicionado |= entra
+
+        if posicionado.any():
+            # Stop loss no mínimo do candle (gap abaixo do stop sai na abertura)
+            nivel_stop = preco_compra * (1 - stop / 100)
+            sai = posicionado & (l <= nivel_stop)
+            preco_saida = np.where(sai, np.minimum(o, nivel_stop), 0.0)
+
+            # Trailing pelo mínimo, com o topo anterior ao candle
+            nivel_trailing = maximo * (1 - trailing / 100)
+            lucro_nivel = (nivel_trailing / np.where(posicionado, preco_compra, 1.0) - 1) * 100
+            sai_trailing = posicionado & ~sai & (l <= nivel_trailing) & ((lucro_nivel - taxa) > lucro_min)
+            preco_saida = np.where(sai_trailing, np.minimum(o, nivel_trailing), preco_saida)
+            sai |= sai_trailing
+
+            # Topo sobe com a máxima; trailing de novo no fechamento
+            maximo = np.where(posicionado & ~sai, np.maximum(maximo, h), maximo)
+            lucro_fechamento = (c / np.where(posicionado, preco_compra, 1.0) - 1) * 100
+            recuo = (c / np.where(posicionado, maximo, 1.0) - 1) * 100
+            sai_fechamento = posicionado & ~sai & ((lucro_fechamento - taxa) > lucro_min) & (recuo <= -trailing)
+            preco_saida = np.where(sai_fechamento, c, preco_saida)
+            sai |= sai_fechamento
+
+            if sai.any():
+                saldo[sai] = qtd[sai] * preco_saida[sai] * fator_taxa
+                trades += sai
+                wins += sai & (preco_saida > preco_compra)
+                posicionado &= ~sai
+
+        patrimonio = np.where(posicionado, qtd * c * fator_taxa, saldo)
+        pico = np.maximum(pico, patrimonio)
+        max_dd = np.maximum(max_dd, (pico - patrimonio) / pico * 100)
+
+    final = np.where(posicionado, qtd * ohlc[-1][3] * fator_taxa, saldo) if len(ohlc) else saldo
+    return [
+        {
+            "pnl_pct": float(final[i] / SALDO_INICIAL * 100 - 100),
+            "max_drawdown_pct": float(max_dd[i]),
+            "trades": int(trades[i]),
+            "wins": int(wins[i]),
+            "posicionado_no_fim": bool(posicionado[i]),
+        }
+        for i in range(k)
+    ]
+
+def hash_dados(candles_1m, scores):
+    h = hashlib.sha1()
+    h.update(np.asarray(candles_1m, dtype=float).tobytes())
+    h.update(np.asarray(scores, dtype=float).tobytes())
+    return h.hexdigest()
+
+def _chave_config(config):
+    return tuple(sorted((k, v) for k, v in config.items() if k != "perfil"))
+
+def _dividir(lista, partes):
+    tamanho = -(-len(lista) // partes)
+    return [lista[i:i + tamanho] for i in range(0, len(lista), tamanho)]
+
+def simular_grade(candles_1m, scores, configs, workers=None, taxa=TAXA_TOTAL):
+    """
+    Simula cada configuração sobre o caminho de 1m e devolve, na ordem de
+    'configs', um dict com a config e pnl_pct, max_drawdown_pct, trades e wins.
+
+    Resultados ficam em cache por (hash dos candles + scores, parâmetros), então
+    grades que se sobrepõem só simulam o que é novo. Grades grandes são
+    divididas entre processos (workers, padrão: todos os núcleos).
+    """
+    base = (hash_dados(candles_1m, scores), taxa)
+    chaves = [(base, _chave_config(c)) for c in configs]
+    prontos = {}
+    faltando = {}
+    for chave, config in zip(chaves, configs):
+        if chave in CACHE_SIMULACOES:
+            CACHE_SIMULACOES.move_to_end(chave)
+            prontos[chave] = CACHE_SIMULACOES[chave]
+        else:
+            faltando.setdefault(chave, config)
+
+    if faltando:
+        ohlc = np.asarray([c[1:5] for c in candles_1m], dtype=float)
+        scores = np.asarray(scores, dtype=float)
+        novos = list(faltando.values())
+        if workers is None:
+            workers = os.cpu_count() or 1
+        partes = min(workers, len(ohlc) * len(novos) // MIN_CELULAS_POR_PROCESSO)
+
+        if partes > 1:
+            contexto = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=partes, mp_context=contexto) as pool:
+                blocos = _dividir(novos, partes)
+                resultados = [r for rs in pool.map(_simular, [ohlc] * len(blocos), [scores] * len(blocos), blocos, [taxa] * len(blocos)) for r in rs]
+        else:
+            resultados = _simular(ohlc, scores, novos, taxa)
+
+        for chave, resultado in zip(faltando, resultados):
+            prontos[chave] = CACHE_SIMULACOES[chave] = resultado
+        while len(CACHE_SIMULACOES) > MAX_SIMULACOES_CACHE:
+            CACHE_SIMULACOES.popitem(last=False)
+
+    return [{**config, **prontos[chave]} for chave, config in zip(chaves, configs)]
+
+def melhor_config(resultados, perfil=None):
+    """Maior PnL (empate: menor drawdown); com 'perfil', só entre as configs dele"""
+    candidatos = [r for r in resultados if perfil is None or r.get("perfil") == perfil]
+    if not candidatos:
+        return None
+    return max(candidatos, key=lambda r: (r["pnl_pct"], -r["max_drawdown_pct"]))
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import websockets
+
+WS_URL = os.getenv('BINANCE_WS_URL', 'wss://stream.binance.com:9443/ws')
+# A Binance aceita até 1024 streams por conexão; deixamos folga por padrão
+MAX_STREAMS_POR_CONEXAO = int(os.getenv('MAX_STREAMS_POR_CONEXAO', 600))
+# Quantos streams vão em cada mensagem SUBSCRIBE
+STREAMS_POR_SUBSCRIBE = 200
+BACKOFF_INICIAL = 1.0
+BACKOFF_MAXIMO = 60.0
+
+def simbolo_raw(symbol):
+    """'BTC/BRL' -> 'BTCBRL' (formato do campo 's' das mensagens da Binance)"""
+    return symbol.replace('/', '')
+
+def montar_indice(symbols):
+    """Índice pré-calculado raw -> symbol, para rotear cada tick em O(1)"""
+    return {simbolo_raw(sym): sym for sym in symbols}
+
+def nomes_streams(symbols, canais):
+    return [f"{simbolo_raw(sym).lower()}@{canal}" for sym in symbols for canal in canais]
+
+def dividir_em_shards(symbols, canais, max_streams=None):
+    """
+    Divide os ativos em shards que respeitam o limite de streams por conexão.
+    Todos os canais de um mesmo ativo ficam no mesmo shard.
+    """
+    if max_streams is None:
+        max_streams = MAX_STREAMS_POR_CONEXAO
+    por_shard = max(1, max_streams // max(1, len(canais)))
+    return [symbols[i:i + por_shard] for i in range(0, len(symbols), por_shard)]
+
+async def rodar_shard(streams, ao_receber, ao_cair=None, url=None, nome="shard"):
+    """
+    Mantém uma conexão websocket para um shard: conecta, assina os streams e
+    entrega cada mensagem crua para 'ao_receber'. Se cair, reconecta sozinho
+    com backoff exponencial (com jitter), sem afetar os outros shards.
+    """
+    url = url or WS_URL
+    backoff = BACKOFF_INICIAL
+    while True:
+        try:
+            async with websockets.connect(url) as ws:
+                for i in range(0, len(streams), STREAMS_POR_SUBSCRIBE):
+                    await ws.send(json.dumps({
+                        "method": "SUBSCRIBE",
+                        "params": streams[i:i + STREAMS_POR_SUBSCRIBE],
+                        "id": i // STREAMS_POR_SUBSCRIBE + 1
+                    }))
+                backoff = BACKOFF_INICIAL
+                async for data in ws:
+                    await ao_receber(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Websocket {nome} caiu: {e}. Reconectando em {backoff:.0f}s")
+
+        if ao_cair:
+            ao_cair()
+        await asyncio.sleep(backoff * random.uniform(0.8, 1.2))
+        backoff = min(backoff * 2, BACKOFF_MAXIMO)
@@ -0,0 +1,53 @@
+import numpy as np
+
+from modules.brain import FEATURES, preparar_dados
+from modules.features import INDICADORES, FeatureStore
+
+def gerar_candles(n, semente=3):
+    rng = np.random.default_rng(semente)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    abertura = np.r_[100, close[:-1]]
+    high = np.maximum(abertura, close) * (1 + rng.uniform(0, 0.003, n))
+    low = np.minimum(abertura, close) * (1 - rng.uniform(0, 0.003, n))
+    return [[i * 900_000, abertura[i], high[i], low[i], close[i], float(rng.uniform(1, 10))] for i in range(n)]
+
+def comparar(df, referencia):
+    assert list(df.index) == list(referencia.index)
+    # A série guarda float32
+    np.testing.assert_allclose(df[FEATURES].to_numpy(float), referencia[FEATURES].to_numpy(float), rtol=1e-5, atol=1e-5)
+
+def test_dataframe_igual_ao_preparar_dados():
+    candles = gerar_candles(500)
+    comparar(FeatureStore(diretorio=None).dataframe("BTC/BRL", "15m", candles), preparar_dados(candles))
+
+def test_incremental_com_candle_em_formacao_revisado():
+    candles = gerar_candles(400)
+    store = FeatureStore(diretorio=None)
+    for i in range(300, 401):
+        # Duas revisões do candle em formação antes de ele fechar
+        em_formacao = list(candles[i - 1])
+        em_formacao[4] *= 1.01
+        store.matriz("BTC/BRL", "15m", candles[:i - 1] + [em_formacao])
+        df = store.dataframe("BTC/BRL", "15m", candles[:i])
+    comparar(df, preparar_dados(candles))
+    assert store.series[("BTC/BRL", "15m")].n == 399
+
+def test_persistencia_entre_processos(tmp_path):
+    candles = gerar_candles(450)
+    FeatureStore(diretorio=str(tmp_path)).matriz("ETH/BRL", "15m", candles[:400])
+
+    outro = FeatureStore(diretorio=str(tmp_path))
+    assert outro._serie("ETH/BRL", "15m").n == 399
+    comparar(outro.dataframe("ETH/BRL", "15m", candles), preparar_dados(candles))
+
+def test_lista_sem_sobreposicao_recomeca_a_serie():
+    candles = gerar_candles(600)
+    store = FeatureStore(diretorio=None)
+    store.matriz("BTC/BRL", "15m", candles[:200])
+    # Buraco entre o que a série conhece e a lista nova
+    comparar(store.dataframe("BTC/BRL", "15m", candles[300:]), preparar_dados(candles[300:]))
+
+def test_aquecimento_fica_nan():
+    matriz = FeatureStore(diretorio=None).matriz("BTC/BRL", "15m", gerar_candles(60))
+    assert matriz.shape == (60, len(INDICADORES)) and matriz.dtype == np.float32
+    assert np.isnan(matriz[0]).any() and not np.isnan(matriz[-1]).any()
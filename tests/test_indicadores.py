@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from modules.brain import FEATURES, preparar_dados
+from modules.indicadores import COLUNAS, calcular_linha, estado_inicial
+
+def gerar_candles(n, semente=1):
+    rng = np.random.default_rng(semente)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    abertura = np.r_[100, close[:-1]]
+    high = np.maximum(abertura, close) * (1 + rng.uniform(0, 0.003, n))
+    low = np.minimum(abertura, close) * (1 - rng.uniform(0, 0.003, n))
+    return [[i * 900_000, abertura[i], high[i], low[i], close[i], float(rng.uniform(1, 10))] for i in range(n)]
+
+def linhas(candles, estado=None):
+    estado = estado or estado_inicial()
+    saida = []
+    for candle in candles:
+        linha, estado = calcular_linha(candle, estado)
+        saida.append(linha)
+    return saida, estado
+
+def test_calcular_linha_igual_ao_ta():
+    candles = gerar_candles(300)
+    df = pd.DataFrame(linhas(candles)[0], columns=COLUNAS).dropna()
+    referencia = preparar_dados(candles)
+    assert list(df.index) == list(referencia.index)
+    np.testing.assert_allclose(df[FEATURES].to_numpy(float), referencia[FEATURES].to_numpy(float), rtol=1e-9, atol=1e-9)
+
+def test_candle_em_formacao_nao_altera_o_estado():
+    candles = gerar_candles(200)
+    _, estado = linhas(candles[:-1])
+    antes = {k: (list(v) if k == "janela_bb" else v) for k, v in estado.items()}
+
+    # Revisões do candle em formação partem sempre do mesmo estado consolidado
+    revisado = list(candles[-1])
+    revisado[4] *= 0.98
+    calcular_linha(revisado, estado)
+    linha, _ = calcular_linha(candles[-1], estado)
+
+    assert {k: (list(v) if k == "janela_bb" else v) for k, v in estado.items()} == antes
+    assert linha == linhas(candles)[0][-1]
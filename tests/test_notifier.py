@@ -0,0 +1,69 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import modules.notifier as notifier
+
+class WebhookFalso(BaseHTTPRequestHandler):
+    """Stand-in do webhook do Discord: responde na ordem de `respostas` e guarda cada POST"""
+
+    def do_POST(self):
+        corpo = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        servidor = self.server
+        servidor.posts.append((time.monotonic(), corpo))
+        status, resposta = servidor.respostas.pop(0) if servidor.respostas else (204, None)
+        dados = json.dumps(resposta).encode() if resposta is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def webhook(monkeypatch):
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), WebhookFalso)
+    servidor.posts, servidor.respostas = [], []
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    monkeypatch.setenv("DISCORD_WEBHOOK", f"http://127.0.0.1:{servidor.server_address[1]}/webhook")
+    monkeypatch.setattr(notifier, "JANELA_AGRUPAMENTO", 0.1)
+    monkeypatch.setattr(notifier, "_FILA", None)
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+def despachar(itens):
+    """Enfileira os itens, roda o despachante até a fila esvaziar e para"""
+    notifier._FILA = None  # a fila fica presa ao loop do asyncio.run anterior
+    async def rodar():
+        for titulo, mensagem in itens:
+            notifier.notificar(titulo, mensagem, marcar_usuario=False)
+        tarefa = asyncio.create_task(notifier.despachante())
+        await asyncio.wait_for(notifier._fila().join(), 10)
+        tarefa.cancel()
+    asyncio.run(rodar())
+
+def test_429_espera_retry_after_e_reenvia(webhook):
+    webhook.respostas = [(429, {"retry_after": 0.5, "global": False})]
+    despachar([("Compra", "BTC/BRL")])
+
+    assert len(webhook.posts) == 2
+    (primeiro, payload), (segundo, reenvio) = webhook.posts
+    assert segundo - primeiro >= 0.5
+    assert reenvio == payload and payload["embeds"][0]["title"] == "Compra"
+
+def test_rajada_vira_um_post(webhook):
+    despachar([("Venda", f"ATIVO{i}/BRL") for i in range(3)])
+    despachar([("Panic", f"ATIVO{i}/BRL") for i in range(notifier.MAX_EMBEDS + 5)])
+
+    assert len(webhook.posts) == 2
+    poucos, muitos = (corpo["embeds"] for _, corpo in webhook.posts)
+    assert [e["description"] for e in poucos] == ["ATIVO0/BRL", "ATIVO1/BRL", "ATIVO2/BRL"]
+    assert len(muitos) == 1 and muitos[0]["title"] == f"📦 {notifier.MAX_EMBEDS + 5} notificações"
+    assert muitos[0]["description"].count("\n") == notifier.MAX_EMBEDS + 4
@@ -0,0 +1,49 @@
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+from modules.candles import duracao_ms
+from modules.reamostragem import reamostrar, ultimo_fechado
+
+def candles_1m(n=3000, semente=11):
+    """1m começando no meio de uma hora e com minutos faltando (sem negociação)"""
+    rng = np.random.default_rng(semente)
+    inicio = 1_700_000_000_000 // 3_600_000 * 3_600_000 + 17 * 60_000
+    minutos = np.sort(rng.choice(np.arange(int(n * 1.1)), n, replace=False))
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    abertura = np.r_[100, close[:-1]]
+    return [
+        [int(inicio + m * 60_000), float(abertura[i]), float(max(abertura[i], close[i]) * 1.001),
+         float(min(abertura[i], close[i]) * 0.999), float(close[i]), float(rng.uniform(1, 5))]
+        for i, m in enumerate(minutos)
+    ]
+
+def agregar_ingenuo(candles, timeframe):
+    duracao = duracao_ms(timeframe)
+    blocos = OrderedDict()
+    for c in candles:
+        blocos.setdefault(c[0] // duracao * duracao, []).append(c)
+    return [
+        [ts, grupo[0][1], max(c[2] for c in grupo), min(c[3] for c in grupo), grupo[-1][4], sum(c[5] for c in grupo)]
+        for ts, grupo in blocos.items()
+    ]
+
+@pytest.mark.parametrize("timeframe", ["15m", "1h", "4h"])
+def test_igual_ao_agrupamento_ingenuo(timeframe):
+    candles = candles_1m()
+    esperado = agregar_ingenuo(candles, timeframe)
+    # A série começa no meio do primeiro bloco: ele é descartado
+    np.testing.assert_allclose(reamostrar(candles, timeframe), esperado[1:], rtol=1e-12)
+    np.testing.assert_allclose(reamostrar(candles, timeframe, descartar_inicio=False), esperado, rtol=1e-12)
+
+def test_timestamps_inteiros_e_serie_vazia():
+    barras = reamostrar(candles_1m(200), "15m")
+    assert all(type(b[0]) is int and b[0] % duracao_ms("15m") == 0 for b in barras)
+    assert reamostrar([], "15m") == []
+
+def test_ultimo_fechado():
+    hora = duracao_ms("1h")
+    aberturas = [0, hora, 2 * hora]
+    # Antes de qualquer fechamento, exatamente no fechamento e no meio do candle seguinte
+    assert list(ultimo_fechado(aberturas, "1h", [hora - 1, hora, 2 * hora + 1, 3 * hora])) == [-1, 0, 1, 2]
@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+import pytest
+
+import modules.simulador as simulador
+
+TAXA = 0.2
+FATOR = 1 - TAXA / 100
+CONFIG = {"stop_loss": 1.0, "trailing_drop": 0.5, "lucro_minimo": 0.3, "min_score": 6}
+NAN = math.nan
+
+def simular(candles, scores, configs=(CONFIG,)):
+    """candles = [(open, high, low, close)] de 1m"""
+    return simulador._simular(np.asarray(candles, dtype=float), np.asarray(scores, dtype=float), list(configs), TAXA)
+
+def test_compra_na_abertura_e_stop_no_nivel():
+    r, = simular([(100, 100.2, 99.9, 100), (100, 100.1, 98.8, 99)], [7, NAN])
+    assert r["trades"] == 1 and r["wins"] == 0 and not r["posicionado_no_fim"]
+    assert r["pnl_pct"] == pytest.approx(99 * FATOR - 100)
+    assert r["max_drawdown_pct"] == pytest.approx(100 - 99 * FATOR)
+
+def test_gap_abaixo_do_stop_sai_na_abertura():
+    r, = simular([(100, 100, 100, 100), (97, 97.5, 96.5, 97)], [7, NAN])
+    assert r["pnl_pct"] == pytest.approx(97 * FATOR - 100)
+
+def test_score_abaixo_do_limiar_ou_nan_nao_compra():
+    r, = simular([(100, 101, 99, 100)] * 3, [5.9, NAN, 5])
+    assert r["trades"] == 0 and r["pnl_pct"] == 0 and r["max_drawdown_pct"] == 0
+
+def test_trailing_no_minimo_usa_o_topo_anterior():
+    candles = [
+        (100, 100, 100, 100),
+        (100, 103, 100.5, 102.8),   # topo vai a 103, recuo no fechamento < 0.5%
+        (102.7, 102.8, 102.0, 102.2),  # mínimo fura 103 * 0.995
+    ]
+    r, = simular(candles, [7, NAN, NAN])
+    assert r["trades"] == 1 and r["wins"] == 1
+    assert r["pnl_pct"] == pytest.approx(103 * 0.995 * FATOR - 100)
+
+def test_trailing_no_fechamento_com_o_topo_novo():
+    # Mínimo acima do trailing do topo anterior (100); o fechamento recua > 0.5% do topo novo
+    r, = simular([(100, 100, 100, 100), (100, 102, 100, 101.4)], [7, NAN])
+    assert r["trades"] == 1
+    assert r["pnl_pct"] == pytest.approx(101.4 * FATOR - 100)
+
+def test_lucro_minimo_segura_o_trailing():
+    # Recuo de 0.6% do topo, mas sem lucro acima de taxa + lucro mínimo: continua posicionado
+    candles = [(100, 100, 100, 100), (100, 100.5, 100, 100.4), (100.4, 100.4, 99.9, 99.9)]
+    r, = simular(candles, [7, NAN, NAN])
+    assert r["trades"] == 0 and r["posicionado_no_fim"]
+    assert r["pnl_pct"] == pytest.approx(99.9 * FATOR - 100)
+
+def test_configs_avancam_independentes():
+    rng = np.random.default_rng(5)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, 600)))
+    abertura = np.r_[100, close[:-1]]
+    candles = np.column_stack([abertura, np.maximum(abertura, close) * 1.001, np.minimum(abertura, close) * 0.999, close])
+    scores = rng.uniform(0, 10, len(candles))
+    configs = simulador.grade_personalizada([0.5, 2.0], [0.3, 1.0], [0.2, 0.8], [6, 8])
+
+    juntos = simular(candles, scores, configs)
+    assert juntos == [simular(candles, scores, [c])[0] for c in configs]
+
+def test_simular_grade_preserva_ordem_e_usa_cache():
+    candles_1m = [[i * 60_000, 100, 100.5, 99.5, 100 + (i % 5) * 0.1, 1.0] for i in range(50)]
+    scores = [7 if i % 10 == 0 else NAN for i in range(50)]
+    configs = [dict(CONFIG, stop_loss=s) for s in (0.5, 1.0, 0.5)]
+
+    simulador.CACHE_SIMULACOES.clear()
+    primeira = simulador.simular_grade(candles_1m, scores, configs, workers=1, taxa=TAXA)
+    assert [r["stop_loss"] for r in primeira] == [0.5, 1.0, 0.5]
+    assert primeira[0] == primeira[2]
+    assert len(simulador.CACHE_SIMULACOES) == 2
+    assert simulador.simular_grade(candles_1m, scores, configs, workers=1, taxa=TAXA) == primeira